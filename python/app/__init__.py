@@ -1,23 +1,40 @@
+import asyncio
 import logging
 import os
+import ssl
 import tempfile
 
 import sys
 
 import shutil
-from google.cloud import secretmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-
-from app.persistence import Base
+from app.pool import TimedAsyncAdaptedQueuePool, TimedQueuePool
 
 SQL_DB = os.getenv('SQL_DB', 'shows')
 SQL_HOST = os.getenv('SQL_HOST', 'localhost')
 SQL_PASS = os.getenv('SQL_PASS', 'postgres')
 SQL_PORT = os.getenv('SQL_PORT', '5432')
 SQL_USER = os.getenv('SQL_USER', 'postgres')
+SQL_POOL_SIZE = int(os.getenv('SQL_POOL_SIZE', '5'))
+SQL_MAX_OVERFLOW = int(os.getenv('SQL_MAX_OVERFLOW', '10'))
+SQL_POOL_TIMEOUT = float(os.getenv('SQL_POOL_TIMEOUT', '30'))
+SQL_POOL_RECYCLE = int(os.getenv('SQL_POOL_RECYCLE', '-1'))
+SQL_POOL_PRE_PING = os.getenv('SQL_POOL_PRE_PING', 'false').lower() == 'true'
+SQL_STATEMENT_TIMEOUT_MS = int(os.getenv('SQL_STATEMENT_TIMEOUT_MS', '0'))
+SQL_POOL_PREWARM = int(os.getenv('SQL_POOL_PREWARM', '0'))
+
+SECRET_VERSION_ID_VARIABLES = [
+    'SQL_PASS_SECRET_VERSION_ID',
+    'SQL_SERVER_CA_CERT_SECRET_VERSION_ID',
+    'SQL_CLIENT_CERT_SECRET_VERSION_ID',
+    'SQL_PRIVATE_KEY_SECRET_VERSION_ID',
+]
 
 SHOWS_TABLE = 'shows'
 LISTED_IN_TABLE = 'listed_in'
@@ -26,13 +43,41 @@ LISTED_IN_TABLE = 'listed_in'
 class Engine:
     __engine = None
     __session = None
+    __async_engine = None
+    __async_session = None
     __cert_dir = None
+    __cert_files = None
+    __secrets = {}
+
+    @classmethod
+    def secret_manager_client(cls):
+        # imported only once secrets are configured, since the client library takes longer to import than the service
+        from google.cloud import secretmanager
+        return secretmanager.SecretManagerServiceClient()
+
+    @classmethod
+    def get_secrets(cls, secret_version_ids: List[str]) -> List[str]:
+        """
+        return the secrets with these version ids, fetching the ones not fetched yet concurrently and keeping them for
+        the life of the process
+        """
+        missing = [i for i in dict.fromkeys(secret_version_ids) if i not in cls.__secrets]
+        if missing:
+            client = cls.secret_manager_client()
+            with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                responses = executor.map(lambda i: client.access_secret_version(name=i), missing)
+                for secret_version_id, response in zip(missing, responses):
+                    cls.__secrets[secret_version_id] = response.payload.data.decode('UTF-8')
+        return [cls.__secrets[i] for i in secret_version_ids]
 
     @classmethod
     def get_secret(cls, secret_version_id: str):
-        client = secretmanager.SecretManagerServiceClient()
-        response = client.access_secret_version(name=secret_version_id)
-        return response.payload.data.decode("UTF-8")
+        return cls.get_secrets([secret_version_id])[0]
+
+    @classmethod
+    def fetch_secrets(cls):
+        # the password and certificates are otherwise fetched one after another as the engine is configured
+        cls.get_secrets([os.getenv(v) for v in SECRET_VERSION_ID_VARIABLES if os.getenv(v)])
 
     @classmethod
     def sql_password(cls):
@@ -53,8 +98,9 @@ class Engine:
         client_cert = os.getenv('SQL_CLIENT_CERT_SECRET_VERSION_ID')
         private_key = os.getenv('SQL_PRIVATE_KEY_SECRET_VERSION_ID')
         if root_cert and client_cert and private_key:
-            if cls.__cert_dir:
-                shutil.rmtree(cls.__cert_dir)
+            if cls.__cert_files:
+                # the sync and async engines share the certificate files
+                return cls.__cert_files
             cls.__cert_dir = tempfile.mkdtemp()
             root_cert_file = os.path.join(cls.__cert_dir, 'root.crt')
             with open(root_cert_file, 'w') as handle:
@@ -66,36 +112,121 @@ class Engine:
             with open(private_key_file, 'w') as handle:
                 handle.write(cls.get_secret(private_key))
             os.chmod(private_key_file, 0o600)
-            return root_cert_file, client_cert_file, private_key_file
+            cls.__cert_files = root_cert_file, client_cert_file, private_key_file
+            return cls.__cert_files
         return None, None, None
 
     @classmethod
     def ssl_mode(cls):
         return os.getenv('SQL_SSL_MODE', 'allow')
 
+    @classmethod
+    def ssl_context(cls, root_cert_file: str, client_cert_file: str, private_key_file: str) -> ssl.SSLContext:
+        # asyncpg takes an SSL context rather than libpq's sslmode and file parameters, so mirror libpq: the server
+        # certificate is verified when a root certificate is provided unless the mode is allow or prefer
+        context = ssl.create_default_context(cafile=root_cert_file)
+        context.load_cert_chain(client_cert_file, private_key_file)
+        context.check_hostname = cls.ssl_mode() == 'verify-full'
+        if cls.ssl_mode() in ['allow', 'prefer']:
+            context.verify_mode = ssl.CERT_NONE
+        return context
+
+    @classmethod
+    def pool_args(cls) -> dict:
+        return {
+            'pool_size': SQL_POOL_SIZE,
+            'max_overflow': SQL_MAX_OVERFLOW,
+            'pool_timeout': SQL_POOL_TIMEOUT,
+            'pool_recycle': SQL_POOL_RECYCLE,
+            'pool_pre_ping': SQL_POOL_PRE_PING,
+        }
+
     @classmethod
     def get_engine(cls):
         if not cls.__engine:
+            cls.fetch_secrets()
             sql_host = cls.sql_host()
             logging.info(f'connecting to database {sql_host}.{SQL_DB}')
             db_connect_string = f'postgresql+psycopg2://{SQL_USER}:{cls.sql_password()}@{sql_host}:{SQL_PORT}/{SQL_DB}'
+            connect_args = {}
+            if SQL_STATEMENT_TIMEOUT_MS:
+                connect_args['options'] = f'-c statement_timeout={SQL_STATEMENT_TIMEOUT_MS}'
             root_cert_file, client_cert_file, private_key_file = cls.sql_certs()
             if root_cert_file and client_cert_file and private_key_file:
                 logging.info('attempting to establish a secure connection')
                 # If the app has been provisioned with certificates and a key, write the certs and key to temp files to
                 # establish a connection. The temporary files will be removed when the code leaves the with block.
-                cls.__engine = create_engine(db_connect_string, connect_args={
+                connect_args.update({
                     'sslmode': cls.ssl_mode(),
                     'sslrootcert': root_cert_file,
                     'sslcert': client_cert_file,
                     'sslkey': private_key_file
                 })
-                logging.info('established a secure connection')
+            cls.__engine = create_engine(
+                db_connect_string, connect_args=connect_args, poolclass=TimedQueuePool, **cls.pool_args())
+            cls.__session = sessionmaker(cls.__engine)
+
+    @classmethod
+    def get_async_engine(cls):
+        if not cls.__async_engine:
+            cls.fetch_secrets()
+            sql_host = cls.sql_host()
+            logging.info(f'connecting to database {sql_host}.{SQL_DB} with asyncpg')
+            sql_password = cls.sql_password()
+            if sql_host.startswith('/'):
+                # asyncpg connects to a unix socket directory passed as the host query parameter
+                db_connect_string = f'postgresql+asyncpg://{SQL_USER}:{sql_password}@/{SQL_DB}?host={sql_host}'
             else:
-                cls.__engine = create_engine(db_connect_string)
-            if not cls.__session:
-                cls.__session = sessionmaker(cls.__engine)
-                Base.metadata.create_all(cls.__engine)
+                db_connect_string = f'postgresql+asyncpg://{SQL_USER}:{sql_password}@{sql_host}:{SQL_PORT}/{SQL_DB}'
+            connect_args = {}
+            if SQL_STATEMENT_TIMEOUT_MS:
+                connect_args['server_settings'] = {'statement_timeout': str(SQL_STATEMENT_TIMEOUT_MS)}
+            root_cert_file, client_cert_file, private_key_file = cls.sql_certs()
+            if root_cert_file and client_cert_file and private_key_file:
+                logging.info('attempting to establish a secure connection')
+                connect_args['ssl'] = cls.ssl_context(root_cert_file, client_cert_file, private_key_file)
+            cls.__async_engine = create_async_engine(
+                db_connect_string, connect_args=connect_args, poolclass=TimedAsyncAdaptedQueuePool, **cls.pool_args())
+            cls.__async_session = sessionmaker(cls.__async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    @classmethod
+    async def start_async_engine(cls):
+        """
+        configure the async engine at startup. Connections are opened as requests need them, except that
+        SQL_POOL_PREWARM of them, up to SQL_POOL_SIZE, are opened concurrently ahead of the first requests
+        """
+        cls.get_async_engine()
+        prewarm = min(SQL_POOL_PREWARM, SQL_POOL_SIZE)
+        if prewarm > 0:
+            connections = await asyncio.gather(*[cls.__async_engine.connect().start() for _ in range(prewarm)])
+            # closing returns the connections to the pool
+            await asyncio.gather(*[c.close() for c in connections])
+            logging.info(f'opened {prewarm} database connections')
+
+    @classmethod
+    def new_async_session(cls) -> AsyncSession:
+        if not cls.__async_session:
+            cls.get_async_engine()
+        return cls.__async_session()
+
+    @classmethod
+    async def dispose_async_engine(cls):
+        if cls.__async_engine:
+            logging.info(f'database connection pool statistics {cls.pool_stats()}')
+            await cls.__async_engine.dispose()
+
+    @classmethod
+    def pool_stats(cls) -> dict:
+        stats = {}
+        if cls.__engine:
+            stats['sync'] = cls.__engine.pool.stats()
+        if cls.__async_engine:
+            stats['async'] = cls.__async_engine.sync_engine.pool.stats()
+        return stats
+
+    @classmethod
+    def engine(cls):
+        return cls.__engine
 
     @classmethod
     def new_session(cls):
@@ -103,8 +234,11 @@ class Engine:
 
     @classmethod
     def shutdown(cls):
+        cls.__secrets = {}
         if cls.__cert_dir:
             shutil.rmtree(cls.__cert_dir)
+            cls.__cert_dir = None
+            cls.__cert_files = None
 
 
 def to_db_value(v) -> str:
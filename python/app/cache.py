@@ -0,0 +1,118 @@
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+SHOW_CACHE_SIZE = int(os.getenv('SHOW_CACHE_SIZE', '1024'))
+SHOW_CACHE_TTL = float(os.getenv('SHOW_CACHE_TTL', '60'))
+
+
+class CacheBackend(ABC):
+    """
+    storage for a Cache. Implement this to share cached shows between workers, e.g. with memcached or redis
+    """
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any):
+        pass
+
+    @abstractmethod
+    def delete(self, key: Hashable):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+class LRUBackend(CacheBackend):
+    """
+    an in-process cache holding at most max_size entries, each for at most ttl seconds
+    """
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+        self.__entries = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.__entries[key]
+            self.expirations += 1
+            return None
+        self.__entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+        self.__entries[key] = (time.monotonic() + self.ttl, value)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        self.__entries.pop(key, None)
+
+    def clear(self):
+        self.__entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self.__entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class Cache:
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        # bumped by every invalidation so reads that started before a write don't cache what they read
+        self.epoch = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, epoch: int):
+        """
+        cache a value read at epoch, unless something has been invalidated since then
+        """
+        if epoch == self.epoch:
+            self.backend.set(key, value)
+
+    def invalidate(self, key: Hashable):
+        self.epoch += 1
+        self.backend.delete(key)
+
+    def clear(self):
+        self.epoch += 1
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, **self.backend.stats()}
+
+
+show_cache = Cache(LRUBackend(SHOW_CACHE_SIZE, SHOW_CACHE_TTL))
@@ -7,8 +7,11 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from app import Engine, init_logging
 from app.rest.routers.alive import alive_router
+from app.rest.routers.metrics import metrics_router
 from app.rest.routers.shows import shows_router
+from app.rest.routers.stats import stats_router
 from app.rest.routers.summary import summary_router
+from app.rest.timing import MetricsMiddleware
 
 tags_metadata = [
     {
@@ -22,15 +25,22 @@ tags_metadata = [
     {
         'name': 'alive',
         'description': 'determine if the service backing this API is healthy'
+    },
+    {
+        'name': 'stats',
+        'description': 'runtime statistics used to tune the service'
     }
 ]
 
 app = FastAPI(
-    on_startup=[init_logging, Engine.get_engine],
-    on_shutdown=[Engine.shutdown],
+    on_startup=[init_logging, Engine.start_async_engine],
+    on_shutdown=[Engine.dispose_async_engine, Engine.shutdown],
     openapi_tags=tags_metadata
 )
 
 app.include_router(alive_router)
 app.include_router(shows_router)
 app.include_router(summary_router)
+app.include_router(stats_router)
+app.include_router(metrics_router)
+app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+import argparse
+import logging
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app import Engine, init_logging
+from app.persistence import counters, migrations
+
+
+def migrate(args):
+    applied = migrations.migrate(Engine.engine())
+    logging.info(f'applied migrations {applied}' if applied else 'the database schema is up to date')
+    return 0
+
+
+def rebuild_counters(args):
+    with Engine.new_session() as session:
+        rebuilt = counters.rebuild(session)
+        session.commit()
+    logging.info(f'rebuilt {rebuilt} summary counters')
+    return 0
+
+
+def check_counters(args):
+    with Engine.new_session() as session:
+        mismatches = counters.check(session)
+    for (kind, key), (stored, actual) in sorted(mismatches.items()):
+        logging.error(f'summary counter {kind}:{key} is {stored}, expected {actual}')
+    if mismatches:
+        logging.error(f'{len(mismatches)} summary counters are inconsistent, run rebuild-counters to repair them')
+        return 1
+    logging.info('summary counters are consistent')
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='manage the database backing the shows service')
+    subparsers = parser.add_subparsers()
+    subparser = subparsers.add_parser('migrate', help='apply database migrations that have not been applied yet')
+    subparser.set_defaults(func=migrate)
+    subparser = subparsers.add_parser('rebuild-counters', help='recompute the summary counters from scratch')
+    subparser.set_defaults(func=rebuild_counters)
+    subparser = subparsers.add_parser(
+        'check-counters', help='compare the summary counters with a full recount of the shows')
+    subparser.set_defaults(func=check_counters)
+
+    args = parser.parse_args()
+    if 'func' not in args:
+        parser.print_usage()
+        return 1
+
+    init_logging()
+    Engine.get_engine()
+    try:
+        return args.func(args)
+    finally:
+        Engine.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
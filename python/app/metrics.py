@@ -0,0 +1,193 @@
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import engine, event
+
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'true').lower() == 'true'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+UNMATCHED_ROUTE = 'unmatched'
+
+
+class RequestTimings:
+    """
+    the statements a request ran and the time it spent on them and on serializing its response
+    """
+    __slots__ = ('start', 'route', 'statements', 'db', 'serialization', 'returned')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.route = None
+        self.statements = 0
+        self.db = 0.0
+        self.serialization = 0.0
+        self.returned = None
+
+    def endpoint_returned(self):
+        self.returned = time.perf_counter()
+
+    def response_started(self):
+        """
+        count the time between the endpoint returning and the response starting, when FastAPI validates and encodes
+        whatever the endpoint returned, as serialization
+        """
+        if self.returned is not None:
+            self.serialization += time.perf_counter() - self.returned
+            self.returned = None
+
+    def server_timing(self) -> str:
+        total = time.perf_counter() - self.start
+        statements = f'{self.statements} statement' if self.statements == 1 else f'{self.statements} statements'
+        return (f'db;dur={self.db * 1000:.3f};desc="{statements}", '
+                f'serialize;dur={self.serialization * 1000:.3f}, total;dur={total * 1000:.3f}')
+
+
+_timings: ContextVar[Optional[RequestTimings]] = ContextVar('request_timings', default=None)
+
+
+def start_request() -> Tuple[RequestTimings, object]:
+    """
+    return the timings of a new request, and the token to reset the current timings with once it's done
+    """
+    timings = RequestTimings()
+    return timings, _timings.set(timings)
+
+
+def end_request(token):
+    _timings.reset(token)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    # SQLAlchemy runs statements in greenlets with a copy of the request's context, so the timings are shared with them
+    return _timings.get()
+
+
+def record_serialization(seconds: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings.serialization += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _timings.get() is not None:
+        conn.info['statement_start'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _timings.get()
+    start = conn.info.pop('statement_start', None)
+    if timings is not None and start is not None:
+        timings.statements += 1
+        timings.db += time.perf_counter() - start
+
+
+# listening on the class times the statements of every engine, including the one behind the async engine
+event.listen(engine.Engine, 'before_cursor_execute', _before_cursor_execute)
+event.listen(engine.Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+class Histogram:
+    """
+    counts of observed values in cumulative buckets, as Prometheus histograms have them
+    """
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> list:
+        counts = []
+        total = 0
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+
+class RouteMetrics:
+    __slots__ = ('duration', 'db', 'serialization', 'statements')
+
+    def __init__(self):
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.db = Histogram(LATENCY_BUCKETS)
+        self.serialization = Histogram(LATENCY_BUCKETS)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+
+
+HISTOGRAMS = [
+    ('duration', 'shows_http_request_duration_seconds',
+     'time from receiving a request to sending the end of its response'),
+    ('db', 'shows_http_request_db_seconds', 'time a request spent running SQL statements'),
+    ('serialization', 'shows_http_request_serialization_seconds', 'time a request spent serializing its response'),
+    ('statements', 'shows_http_request_sql_statements', 'SQL statements run by a request'),
+]
+
+
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class RequestMetrics:
+    """
+    this worker's histograms of request timings and counts of responses, per method and route template
+    """
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self.responses: Dict[Tuple[str, str, int], int] = {}
+
+    def record(self, method: str, timings: RequestTimings, status: int):
+        route = timings.route or UNMATCHED_ROUTE
+        metrics = self.routes.get((method, route))
+        if metrics is None:
+            metrics = self.routes[(method, route)] = RouteMetrics()
+        metrics.duration.observe(time.perf_counter() - timings.start)
+        metrics.db.observe(timings.db)
+        metrics.serialization.observe(timings.serialization)
+        metrics.statements.observe(timings.statements)
+        key = (method, route, status)
+        self.responses[key] = self.responses.get(key, 0) + 1
+
+    def clear(self):
+        self.routes = {}
+        self.responses = {}
+
+    def render(self) -> str:
+        """
+        return the metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for attribute, name, description in HISTOGRAMS:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} histogram')
+            for (method, route), metrics in sorted(self.routes.items()):
+                histogram = getattr(metrics, attribute)
+                labels = f'method="{_label(method)}",route="{_label(route)}"'
+                bounds = [_number(b) for b in histogram.buckets] + ['+Inf']
+                for bound, count in zip(bounds, histogram.cumulative_counts()):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{{labels}}} {_number(histogram.sum)}')
+                lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        lines.append('# HELP shows_http_responses_total responses sent, by status code')
+        lines.append('# TYPE shows_http_responses_total counter')
+        for (method, route, status), count in sorted(self.responses.items()):
+            lines.append(
+                f'shows_http_responses_total{{method="{_label(method)}",route="{_label(route)}",status="{status}"}} '
+                f'{count}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
@@ -1,12 +1,24 @@
 import inspect
-from sqlalchemy import Column, String, ForeignKey, PrimaryKeyConstraint, Integer
-from sqlalchemy.orm import declarative_base, relationship
+from typing import Iterator
+
+from sqlalchemy import BigInteger, Column, Date, String, ForeignKey, PrimaryKeyConstraint, Integer, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import declarative_base, deferred, relationship
 
 Base = declarative_base()
 
 
 class Show(Base):
     __tablename__ = 'shows'
+    __table_args__ = (
+        Index('ix_shows_title_id', 'title', 'id'),
+        Index('ix_shows_type_id', 'type', 'id'),
+        Index('ix_shows_rating_id', 'rating', 'id'),
+        Index('ix_shows_year_id', 'year', 'id'),
+        Index('ix_shows_added_on_id', 'added_on', 'id'),
+        Index('ix_shows_duration_unit_value_id', 'duration_unit', 'duration_value', 'id'),
+        Index('ix_shows_search', 'search', postgresql_using='gin'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     type = Column(String(collation='C'))
@@ -18,29 +30,83 @@ class Show(Base):
     rating = Column(String(collation='C'))
     duration = Column(String(collation='C'))
     description = Column(String(collation='C'))
+    # bumped by every update so clients can make conditional requests against a show
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+    # release_year, date_added and duration parsed by app.persistence.typed for range filters
+    year = Column(Integer)
+    added_on = Column(Date)
+    duration_value = Column(Integer)
+    duration_unit = Column(String(collation='C'))
+    # title, director, cast and description maintained by app.persistence.search for full-text search. Deferred so
+    # hydrating shows doesn't load it
+    search = deferred(Column(TSVECTOR))
+
+
+class Person(Base):
+    __tablename__ = 'person'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(collation='C'), nullable=False, unique=True)
+
+
+class Genre(Base):
+    __tablename__ = 'genre'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(collation='C'), nullable=False, unique=True)
 
 
 class Actor(Base):
     __tablename__ = 'actor'
     __table_args__ = (
-        PrimaryKeyConstraint('id', 'name'),
+        PrimaryKeyConstraint('id', 'person_id'),
+        Index('ix_actor_person_id', 'person_id'),
     )
     id = Column(Integer, ForeignKey('shows.id', ondelete='CASCADE'))
-    name = Column(String)
+    person_id = Column(Integer, ForeignKey('person.id'))
     items = relationship('Show')
 
 
 class ListedIn(Base):
     __tablename__ = 'listed_in'
     __table_args__ = (
-        PrimaryKeyConstraint('id', 'listed_in'),
+        PrimaryKeyConstraint('id', 'genre_id'),
+        Index('ix_listed_in_genre_id', 'genre_id'),
     )
     id = Column(Integer, ForeignKey('shows.id', ondelete='CASCADE'))
-    listed_in = Column(String)
+    genre_id = Column(Integer, ForeignKey('genre.id'))
     items = relationship('Show')
 
 
+class SummaryCounter(Base):
+    __tablename__ = 'summary_counter'
+    __table_args__ = (
+        PrimaryKeyConstraint('kind', 'key'),
+    )
+    kind = Column(String)
+    key = Column(String)
+    total = Column(Integer, nullable=False, default=0)
+
+
+class CatalogVersion(Base):
+    __tablename__ = 'catalog_version'
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
 SQL_COLUMNS = [
     m[0] for m in inspect.getmembers(Show, lambda a:not(inspect.isroutine(a)))
-    if not m[0].startswith('_') and m[0] not in ['metadata', 'registry']
+    if not m[0].startswith('_') and m[0] not in [
+        'metadata', 'registry', 'version', 'year', 'added_on', 'duration_value', 'duration_unit', 'search'
+    ]
 ]
+
+# the most bind parameters one statement can have, which asyncpg enforces from the Postgres protocol's 16 bit count
+MAX_BIND_PARAMETERS = 32767
+
+
+def in_batches(values: list, parameters_per_value: int = 1) -> Iterator[list]:
+    """
+    split values into lists that each fit in one statement binding parameters_per_value parameters for every value
+    """
+    size = MAX_BIND_PARAMETERS // parameters_per_value
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
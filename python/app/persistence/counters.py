@@ -0,0 +1,148 @@
+from sqlalchemy import delete, func, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+from app.persistence import CatalogVersion, Genre, ListedIn, Show, SummaryCounter
+
+TOTAL = 'total'
+TYPE = 'type'
+LISTED_IN = 'listed_in'
+
+
+def deltas(show_type: str, listed_in, change: int = 1) -> dict:
+    """
+    return the counter changes caused by adding (change=1) or removing (change=-1) a show
+    """
+    show_deltas = {(TOTAL, ''): change, (TYPE, show_type or ''): change}
+    for listing in dict.fromkeys(listed_in):
+        show_deltas[(LISTED_IN, listing)] = change
+    return show_deltas
+
+
+def merge(*all_deltas: dict) -> dict:
+    merged = {}
+    for d in all_deltas:
+        for k, v in d.items():
+            merged[k] = merged.get(k, 0) + v
+    return {k: v for k, v in merged.items() if v}
+
+
+def adjust(session, counter_deltas: dict):
+    """
+    apply counter changes in the session's transaction, dropping counters that fall to zero
+    """
+    # update counters in key order so concurrent transactions lock the rows they share in the same order
+    counter_deltas = dict(sorted(merge(counter_deltas).items()))
+    if not counter_deltas:
+        return
+    stmt = insert(SummaryCounter).values([
+        {'kind': kind, 'key': key, 'total': total} for (kind, key), total in counter_deltas.items()
+    ])
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[SummaryCounter.kind, SummaryCounter.key],
+        set_={'total': SummaryCounter.total + stmt.excluded.total}
+    ))
+    decremented = [k for k, v in counter_deltas.items() if v < 0]
+    if decremented:
+        session.execute(
+            delete(SummaryCounter)
+            .where(tuple_(SummaryCounter.kind, SummaryCounter.key).in_(decremented))
+            .where(SummaryCounter.total <= 0)
+        )
+
+
+def bump_catalog_version(session):
+    """
+    advance the catalog version in the session's transaction. Call it after the transaction's other writes so the
+    row lock serializing concurrent writers is held only until the commit
+    """
+    stmt = insert(CatalogVersion).values(id=1, version=1)
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[CatalogVersion.id],
+        set_={'version': CatalogVersion.version + 1}
+    ))
+
+
+def catalog_version(session) -> int:
+    """
+    return the catalog version, which changes whenever any show is created, updated or deleted
+    """
+    return session.query(CatalogVersion.version).filter(CatalogVersion.id == 1).scalar() or 0
+
+
+def _to_summary(counters) -> dict:
+    summary = {'total': 0, 'total_by_listed_in': {}, 'total_by_type': {}}
+    for kind, key, total in counters:
+        if kind == TOTAL:
+            summary['total'] = total
+        elif kind == TYPE:
+            summary['total_by_type'][key] = total
+        elif kind == LISTED_IN:
+            summary['total_by_listed_in'][key] = total
+    return summary
+
+
+def summary(session) -> dict:
+    """
+    return the summary from the stored counters
+    """
+    return _to_summary(
+        session.query(SummaryCounter.kind, SummaryCounter.key, SummaryCounter.total)
+        .filter(SummaryCounter.total > 0)
+        .all()
+    )
+
+
+def recount(session) -> dict:
+    """
+    return the summary computed from the shows tables with GROUP BY aggregation
+    """
+    type_totals = (
+        session.query(func.coalesce(Show.type, ''), func.count(Show.id))
+        .group_by(func.coalesce(Show.type, ''))
+        .all()
+    )
+    listed_in_totals = (
+        session.query(Genre.name, func.count(ListedIn.id))
+        .join(ListedIn, ListedIn.genre_id == Genre.id)
+        .group_by(Genre.id)
+        .all()
+    )
+    return _to_summary([
+        (TOTAL, '', sum(t for _, t in type_totals)),
+        *[(TYPE, k, t) for k, t in type_totals],
+        *[(LISTED_IN, k, t) for k, t in listed_in_totals]
+    ])
+
+
+def _to_counters(summary_totals: dict) -> dict:
+    counters = {(TOTAL, ''): summary_totals['total']}
+    counters.update({(TYPE, k): v for k, v in summary_totals['total_by_type'].items()})
+    counters.update({(LISTED_IN, k): v for k, v in summary_totals['total_by_listed_in'].items()})
+    return {k: v for k, v in counters.items() if v}
+
+
+def rebuild(session) -> int:
+    """
+    recompute every counter from scratch in the session's transaction and return the number of counters stored
+    """
+    session.execute(text(f'LOCK TABLE {SummaryCounter.__tablename__} IN EXCLUSIVE MODE'))
+    session.execute(delete(SummaryCounter))
+    counters = _to_counters(recount(session))
+    if counters:
+        session.execute(insert(SummaryCounter).values([
+            {'kind': kind, 'key': key, 'total': total} for (kind, key), total in counters.items()
+        ]))
+    return len(counters)
+
+
+def check(session) -> dict:
+    """
+    compare the stored counters with a full recount and return the mismatches as {(kind, key): (stored, actual)}
+    """
+    stored = _to_counters(summary(session))
+    actual = _to_counters(recount(session))
+    return {
+        k: (stored.get(k, 0), actual.get(k, 0))
+        for k in set(stored) | set(actual)
+        if stored.get(k, 0) != actual.get(k, 0)
+    }
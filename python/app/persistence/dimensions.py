@@ -0,0 +1,37 @@
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.persistence import in_batches
+
+
+def _find(session, table, names) -> dict:
+    ids = {}
+    for batch in in_batches(sorted(names)):
+        ids.update(session.execute(select(table.c.name, table.c.id).where(table.c.name.in_(batch))).all())
+    return ids
+
+
+def lookup(session, dimension, names: Iterable[str]) -> dict:
+    """
+    return {name: id} for names in the person or genre dimension table, adding the names it does not have yet
+    """
+    names = set(names)
+    if not names:
+        return {}
+    table = dimension.__table__
+    ids = _find(session, table, names)
+    missing = names - ids.keys()
+    if missing:
+        # insert in name order so concurrent transactions adding the same names lock them in the same order
+        for batch in in_batches(sorted(missing)):
+            ids.update(session.execute(
+                insert(table).values([{'name': name} for name in batch]).on_conflict_do_nothing()
+                .returning(table.c.name, table.c.id)
+            ).all())
+        missing = names - ids.keys()
+        if missing:
+            # added by a concurrent transaction after the first lookup
+            ids.update(_find(session, table, missing))
+    return ids
@@ -0,0 +1,31 @@
+import json
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+
+class Explain(Executable, ClauseElement):
+    """
+    EXPLAIN (FORMAT JSON) of a statement, keeping the statement's bound parameters
+    """
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, 'postgresql')
+def _compile_explain(element, compiler, **kw):
+    return f'EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kw)}'
+
+
+def estimated_rows(session, statement) -> int:
+    """
+    return the planner's estimate of the number of rows a statement returns, from table statistics and without running
+    the statement
+    """
+    plan = session.execute(Explain(statement)).scalar()
+    # psycopg2 decodes json and asyncpg returns it as text
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,214 @@
+import logging
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, bindparam, func, inspect, select, text, update
+)
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from app.persistence import Actor, Base, CatalogVersion, Genre, ListedIn, Person, Show, counters, search, typed
+
+schema_version = Table(
+    'schema_version',
+    MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False, server_default=func.now()),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable
+    # optional migrations that fail are logged and skipped, and retried the next time migrations run
+    optional: bool = False
+
+
+def _create_tables(session):
+    Base.metadata.create_all(session.connection())
+
+
+# the junction tables, their dimension tables and the name columns the junction tables had before normalization
+NORMALIZED_TABLES = [
+    (Actor, Person, 'name'),
+    (ListedIn, Genre, 'listed_in'),
+]
+
+
+def _denormalized(session, table: str, name_column: str) -> bool:
+    return name_column in [c['name'] for c in inspect(session.connection()).get_columns(table)]
+
+
+def _rebuild_counters(session):
+    # databases that still store names in the junction tables are counted once they are normalized
+    if not any(_denormalized(session, j.__tablename__, c) for j, _, c in NORMALIZED_TABLES):
+        counters.rebuild(session)
+
+
+def _create_show_indexes(session, names: List[str]):
+    # indexes are created by name so a migration never creates an index on a column a later migration adds
+    for index in Show.__table__.indexes:
+        if index.name in names:
+            index.create(session.connection(), checkfirst=True)
+
+
+SECONDARY_INDEXES = ['ix_shows_title_id', 'ix_shows_type_id', 'ix_shows_rating_id']
+
+
+def _create_secondary_indexes(session):
+    # the cast and listings tables get their indexes when they are created or normalized
+    _create_show_indexes(session, SECONDARY_INDEXES)
+
+
+TRIGRAM_INDEXES = [
+    (Show.__tablename__, 'title'),
+    (Show.__tablename__, 'director'),
+    (Show.__tablename__, 'description'),
+    (Person.__tablename__, 'name'),
+]
+
+
+def _create_trigram_indexes(session):
+    session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    for table, column in TRIGRAM_INDEXES:
+        session.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_{table}_{column}_trgm ON {table} USING gin ({column} gin_trgm_ops)'))
+
+
+def _add_versions(session):
+    Base.metadata.create_all(session.connection(), tables=[CatalogVersion.__table__])
+    session.execute(text(
+        f'ALTER TABLE {Show.__tablename__} ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1'))
+
+
+def _normalize_cast_and_listings(session):
+    Base.metadata.create_all(session.connection(), tables=[Person.__table__, Genre.__table__])
+    for junction, dimension, name_column in NORMALIZED_TABLES:
+        table = junction.__tablename__
+        if not _denormalized(session, table, name_column):
+            continue
+        key = [c.name for c in junction.__table__.c if c.name != 'id'][0]
+        old = f'{table}_denormalized'
+        session.execute(text(f'ALTER TABLE {table} RENAME TO {old}'))
+        session.execute(text(f'ALTER TABLE {old} DROP CONSTRAINT {table}_pkey'))
+        session.execute(text(f'ALTER TABLE {old} DROP CONSTRAINT IF EXISTS {table}_id_fkey'))
+        session.execute(text(f'DROP INDEX IF EXISTS ix_{table}_{name_column}'))
+        session.execute(text(
+            f'INSERT INTO {dimension.__tablename__} (name) '
+            f'SELECT DISTINCT {name_column} FROM {old} ORDER BY {name_column} ON CONFLICT DO NOTHING'))
+        junction.__table__.create(session.connection())
+        session.execute(text(
+            f'INSERT INTO {table} (id, {key}) '
+            f'SELECT o.id, d.id FROM {old} o JOIN {dimension.__tablename__} d ON d.name = o.{name_column}'))
+        session.execute(text(f'DROP TABLE {old}'))
+    counters.rebuild(session)
+
+
+BACKFILL_BATCH_SIZE = 1000
+TYPED_COLUMNS = [
+    ('year', 'integer'),
+    ('added_on', 'date'),
+    ('duration_value', 'integer'),
+    ('duration_unit', 'varchar COLLATE "C"'),
+]
+TYPED_INDEXES = ['ix_shows_year_id', 'ix_shows_added_on_id', 'ix_shows_duration_unit_value_id']
+
+
+def _add_typed_columns(session):
+    for column, column_type in TYPED_COLUMNS:
+        session.execute(text(f'ALTER TABLE {Show.__tablename__} ADD COLUMN IF NOT EXISTS {column} {column_type}'))
+    backfill = (
+        update(Show.__table__)
+        .where(Show.id == bindparam('show_id'))
+        .values({c: bindparam(c) for c, _ in TYPED_COLUMNS})
+    )
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select(Show.id, Show.release_year, Show.date_added, Show.duration)
+            .where(Show.id > last_id)
+            .order_by(Show.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        session.execute(backfill, [
+            {'show_id': i, **typed.typed_values({'release_year': y, 'date_added': d, 'duration': du})}
+            for i, y, d, du in rows
+        ])
+        last_id = rows[-1][0]
+    _create_show_indexes(session, TYPED_INDEXES)
+    # refresh statistics so the planner sees the backfilled columns before autovacuum gets to them
+    session.execute(text(f'ANALYZE {Show.__tablename__}'))
+
+
+def _collate_dimension_names(session):
+    # C collation lets prefix filters on names range scan the unique index whatever the database's collation is
+    for dimension in [Person, Genre]:
+        session.execute(text(f'ALTER TABLE {dimension.__tablename__} ALTER COLUMN name TYPE varchar COLLATE "C"'))
+
+
+SEARCH_INDEXES = ['ix_shows_search']
+
+
+def _add_search(session):
+    session.execute(text(f'ALTER TABLE {Show.__tablename__} ADD COLUMN IF NOT EXISTS search tsvector'))
+    # without statistics the cast subquery of a freshly loaded database can be planned as a scan per show
+    session.execute(text(f'ANALYZE {Actor.__tablename__}, {Person.__tablename__}'))
+    session.execute(update(Show.__table__).values(search=search.document()))
+    _create_show_indexes(session, SEARCH_INDEXES)
+    session.execute(text(f'ANALYZE {Show.__tablename__}'))
+
+
+# indexes on the text release_year and date_added columns, which sorts stopped using for the typed year and added_on
+DROPPED_INDEXES = ['ix_shows_release_year_id', 'ix_shows_date_added_id']
+
+
+def _drop_text_sort_indexes(session):
+    session.execute(text(f'DROP INDEX IF EXISTS {", ".join(DROPPED_INDEXES)}'))
+
+
+MIGRATIONS = [
+    Migration(1, 'create tables', _create_tables),
+    Migration(2, 'populate summary counters', _rebuild_counters),
+    Migration(3, 'secondary indexes on sort and filter columns', _create_secondary_indexes),
+    Migration(4, 'pg_trgm indexes for substring filters', _create_trigram_indexes, optional=True),
+    Migration(5, 'show and catalog versions for conditional requests', _add_versions),
+    Migration(6, 'person and genre dimension tables for cast and listings', _normalize_cast_and_listings),
+    Migration(7, 'typed release year, date added and duration columns', _add_typed_columns),
+    Migration(8, 'C collation on person and genre names for prefix filters', _collate_dimension_names),
+    Migration(9, 'full-text search column', _add_search),
+    Migration(10, 'drop indexes on text release year and date added columns', _drop_text_sort_indexes),
+]
+
+
+def migrate(engine, migrations: List[Migration] = None) -> List[int]:
+    """
+    apply the migrations that have not been applied to the database yet, each in its own transaction, and return the
+    versions applied
+    """
+    applied = []
+    schema_version.create(engine, checkfirst=True)
+    for migration in sorted(migrations or MIGRATIONS, key=lambda m: m.version):
+        with Session(engine) as session:
+            # serialize concurrent migrators and skip migrations another migrator applied while this one waited
+            session.execute(text(f'LOCK TABLE {schema_version.name} IN EXCLUSIVE MODE'))
+            if session.execute(
+                    select(schema_version.c.version).where(schema_version.c.version == migration.version)).first():
+                continue
+            logging.info(f'applying migration {migration.version}: {migration.description}')
+            try:
+                migration.apply(session)
+            except DBAPIError as e:
+                if not migration.optional:
+                    raise
+                logging.warning(f'skipping optional migration {migration.version}: {e.orig}')
+                session.rollback()
+                continue
+            session.execute(schema_version.insert().values(
+                version=migration.version, description=migration.description))
+            session.commit()
+            applied.append(migration.version)
+    return applied
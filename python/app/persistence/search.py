@@ -0,0 +1,54 @@
+from typing import List
+
+from sqlalchemy import func, literal_column, select, update
+
+from app.persistence import Actor, Person, Show
+
+# the text search configuration used for both the search column and queries against it
+CONFIG = literal_column("'english'::regconfig")
+
+
+def _weighted(text, weight: str):
+    # a bound weight is sent as varchar by asyncpg, and setweight only takes a "char"
+    return func.setweight(func.to_tsvector(CONFIG, func.coalesce(text, '')), literal_column(f"'{weight}'::\"char\""))
+
+
+def document(show=Show):
+    """
+    return the search document of a show, its title weighted above its director and cast, which are weighted above its
+    description
+    """
+    cast = (
+        select(func.string_agg(Person.name, ' '))
+        .where(Actor.person_id == Person.id)
+        .where(Actor.id == show.id)
+        .scalar_subquery()
+    )
+    return (
+        _weighted(show.title, 'A')
+        .op('||')(_weighted(func.concat_ws(' ', show.director, cast), 'B'))
+        .op('||')(_weighted(show.description, 'C'))
+    )
+
+
+def refresh(session, show_ids: List[int]):
+    """
+    recompute the search column of shows whose title, director, cast or description changed, in the session's
+    transaction
+    """
+    if show_ids:
+        session.execute(
+            update(Show).where(Show.id.in_(show_ids)).values(search=document())
+            .execution_options(synchronize_session=False)
+        )
+
+
+def tsquery(q: str):
+    """
+    parse a query as web search engines do: words are and-ed, "quoted phrases" match in order, or and -word exclude
+    """
+    return func.websearch_to_tsquery(CONFIG, q)
+
+
+def rank(query, show=Show):
+    return func.ts_rank(show.search, query)
@@ -0,0 +1,79 @@
+import datetime
+import re
+from typing import List, Optional, Tuple
+
+MINUTES = 'min'
+SEASONS = 'season'
+
+_DURATION = re.compile(r'^\s*(\d+)\s*([A-Za-z]*)\s*$')
+_UNITS = {
+    '': MINUTES,
+    'min': MINUTES,
+    'mins': MINUTES,
+    'minute': MINUTES,
+    'minutes': MINUTES,
+    'season': SEASONS,
+    'seasons': SEASONS,
+}
+_DATE_FORMATS = ['%B %d %Y', '%b %d %Y', '%Y-%m-%d']
+# the typed columns ordering shows sorted by release_year, date_added or duration, so they sort by value rather than
+# as text. Durations in minutes sort before durations in seasons
+SORT_COLUMNS = {
+    'release_year': ['year'],
+    'date_added': ['added_on'],
+    'duration': ['duration_unit', 'duration_value'],
+}
+
+
+def year(text: Optional[str]) -> Optional[int]:
+    """
+    return the year in release_year text like "2020"
+    """
+    try:
+        return int(text.strip())
+    except (AttributeError, ValueError):
+        return None
+
+
+def date_added(text: Optional[str]) -> Optional[datetime.date]:
+    """
+    return the date in date_added text like "August 14, 2020"
+    """
+    text = ' '.join((text or '').replace(',', ' ').split())
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    return None
+
+
+def duration(text: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+    """
+    return the value and unit in duration text like "93 min" or "4 Seasons". A value without a unit is minutes
+    """
+    match = _DURATION.match(text or '')
+    if not match or match.group(2).lower() not in _UNITS:
+        return None, None
+    return int(match.group(1)), _UNITS[match.group(2).lower()]
+
+
+def typed_values(values: dict) -> dict:
+    """
+    return the typed columns derived from the release_year, date_added and duration text in values
+    """
+    typed = {}
+    if 'release_year' in values:
+        typed['year'] = year(values['release_year'])
+    if 'date_added' in values:
+        typed['added_on'] = date_added(values['date_added'])
+    if 'duration' in values:
+        typed['duration_value'], typed['duration_unit'] = duration(values['duration'])
+    return typed
+
+
+def sort_columns(key_columns: List[str]) -> List[str]:
+    """
+    return the columns ordering shows sorted by key_columns
+    """
+    return [c for k in key_columns for c in SORT_COLUMNS.get(k, [k])]
@@ -0,0 +1,71 @@
+import logging
+import os
+import time
+
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+SQL_POOL_WAIT_LOG_MS = float(os.getenv('SQL_POOL_WAIT_LOG_MS', '100'))
+
+
+class PoolWaitStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool):
+        self.checkouts += 1
+        self.timeouts += timed_out
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def to_dict(self) -> dict:
+        return {
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'total_wait_ms': round(self.total_wait * 1000, 3),
+            'max_wait_ms': round(self.max_wait * 1000, 3),
+        }
+
+
+class _TimedPoolMixin:
+    """
+    records how long each checkout takes to get a connection, including opening new ones, so the pool can be sized
+    from real data
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            self.wait_stats.record(wait, timed_out)
+            if wait * 1000 >= SQL_POOL_WAIT_LOG_MS:
+                logging.warning(f'waited {wait * 1000:.1f}ms for a database connection: {self.status()}')
+
+    def stats(self) -> dict:
+        return {
+            'size': self.size(),
+            'checked_in': self.checkedin(),
+            'checked_out': self.checkedout(),
+            'overflow': self.overflow(),
+            **self.wait_stats.to_dict(),
+        }
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
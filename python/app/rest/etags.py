@@ -0,0 +1,40 @@
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def show_etag(show_id: int, version: int) -> str:
+    return f'"show-{show_id}-{version}"'
+
+
+def catalog_etag(version: int) -> str:
+    return f'"catalog-{version}"'
+
+
+def _header(request: Optional[Request], name: str) -> Optional[str]:
+    return request.headers.get(name) if request is not None else None
+
+
+def if_none_match(request: Optional[Request]) -> Optional[str]:
+    return _header(request, 'if-none-match')
+
+
+def if_match(request: Optional[Request]) -> Optional[str]:
+    return _header(request, 'if-match')
+
+
+def matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """
+    return true when an If-Match or If-None-Match header value lists the etag or is *. If-None-Match uses weak
+    comparison, which ignores the W/ prefix, and If-Match uses strong comparison
+    """
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(',')]
+    if weak:
+        tags = [t[2:] if t.startswith('W/') else t for t in tags]
+    return '*' in tags or etag in tags
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={'ETag': etag})
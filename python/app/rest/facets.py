@@ -0,0 +1,77 @@
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import distinct, func, select, true
+
+from app import persistence
+from app.rest.filters import Filter, apply_filters
+
+
+def _column(name: str):
+    def facet(q):
+        return q, persistence.Show.__dict__[name], False
+    return facet
+
+
+def _listed_in(q):
+    q = (
+        q.outerjoin(persistence.ListedIn, persistence.ListedIn.id == persistence.Show.id)
+        .outerjoin(persistence.Genre, persistence.Genre.id == persistence.ListedIn.genre_id)
+    )
+    return q, persistence.Genre.name, True
+
+
+def _country(q):
+    # country holds a comma separated list like "United States, India", so each show is counted once per country
+    names = func.unnest(func.string_to_array(persistence.Show.country, ',')).table_valued('name')
+    countries = select(func.trim(names.c.name).label('name')).distinct().lateral('countries')
+    return q.outerjoin(countries, true()), countries.c.name, True
+
+
+# the facets that can be counted, each adding what it needs to the query and returning its value and whether a show
+# can have more than one value. A show never has the same value twice
+FACETS = {
+    'type': _column('type'),
+    'rating': _column('rating'),
+    'country': _country,
+    'listed_in': _listed_in,
+}
+
+
+def parse_facets(facets: Optional[str]) -> List[str]:
+    """
+    parse comma separated facets like type,listed_in
+    """
+    names = list(dict.fromkeys(n.strip() for n in (facets or '').split(',') if n.strip()))
+    invalid = [n for n in names if n not in FACETS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f'invalid facets parameter {facets}')
+    return names
+
+
+def facet_counts(session, filters: List[Filter], facets: List[str]) -> Dict[str, Dict[str, int]]:
+    """
+    count the shows matching the filters per value of each facet with one GROUPING SETS query, most common values
+    first. Shows without a value for a facet aren't counted for it
+    """
+    q = apply_filters(select().select_from(persistence.Show), filters)
+    values = {}
+    multivalued = False
+    for name in facets:
+        q, values[name], multiple = FACETS[name](q)
+        multivalued = multivalued or multiple
+    # the values of one facet repeat a show once per value of the others, so shows are then counted by id
+    total = func.count(distinct(persistence.Show.id)) if multivalued and len(facets) > 1 else func.count()
+    q = q.add_columns(*[func.grouping(v) for v in values.values()], *values.values(), total).group_by(
+        func.grouping_sets(*values.values()))
+
+    facet_counts = {name: {} for name in facets}
+    for row in session.execute(q).all():
+        groupings, row_values, count = row[:len(facets)], row[len(facets):-1], row[-1]
+        # grouping() is 0 for the facet the row counts and 1 for the others
+        name, value = [(n, v) for n, g, v in zip(facets, groupings, row_values) if g == 0][0]
+        if value:
+            facet_counts[name][value] = count
+    return {
+        name: dict(sorted(c.items(), key=lambda item: (-item[1], item[0]))) for name, c in facet_counts.items()
+    }
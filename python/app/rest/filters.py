@@ -0,0 +1,175 @@
+import operator
+import re
+from typing import List, NamedTuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, select
+
+from app import persistence
+from app.persistence import SQL_COLUMNS, typed
+
+_FILTER = re.compile(r'^\s*([A-Za-z_]+)\s*(?:\[\s*([a-z]+)\s*\]\s*=|(>=|<=|>|<|=))(.*)$')
+
+# the symbols accepted alongside named operators, column=value being the original LIKE filter
+SYMBOLS = {
+    '=': 'like',
+    '>=': 'gte',
+    '<=': 'lte',
+    '>': 'gt',
+    '<': 'lt',
+}
+
+RANGE_OPERATORS = {
+    'gte': operator.ge,
+    'lte': operator.le,
+    'gt': operator.gt,
+    'lt': operator.lt,
+}
+
+
+class Filter(NamedTuple):
+    column: str
+    operator: str
+    value: str
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def split_values(value: str) -> List[str]:
+    """
+    split the comma separated value of an in filter into the values it matches
+    """
+    return [v.strip() for v in value.split(',')]
+
+
+def _like(column, value: str):
+    return column.like(value)
+
+
+def _eq(column, value: str):
+    return column == value
+
+
+def _ne(column, value: str):
+    # shows without a value, like a missing director, are not equal to any value
+    return column.is_distinct_from(value)
+
+
+def _in(column, value: str):
+    return column.in_(split_values(value))
+
+
+def _prefix(column, value: str):
+    # a pattern without a leading wildcard is a range scan of a btree index on a C collated column
+    return column.like(f'{_escape(value)}%', escape='\\')
+
+
+def _contains(column, value: str):
+    # served by the optional pg_trgm indexes where they exist
+    return column.like(f'%{_escape(value)}%', escape='\\')
+
+
+TEXT_OPERATORS = {
+    'like': _like,
+    'eq': _eq,
+    'ne': _ne,
+    'in': _in,
+    'prefix': _prefix,
+    'contains': _contains,
+}
+
+
+def _year_range(op, value: str):
+    year = typed.year(value)
+    if year is None:
+        raise ValueError(f'invalid year {value}')
+    return op(persistence.Show.year, year)
+
+
+def _date_added_range(op, value: str):
+    date_added = typed.date_added(value)
+    if date_added is None:
+        raise ValueError(f'invalid date {value}')
+    return op(persistence.Show.added_on, date_added)
+
+
+def _duration_range(op, value: str):
+    duration, unit = typed.duration(value)
+    if duration is None:
+        raise ValueError(f'invalid duration {value}')
+    # a range covers one unit, so the duration index is searched by unit then value
+    return and_(persistence.Show.duration_unit == unit, op(persistence.Show.duration_value, duration))
+
+
+# columns that can be filtered with ranges, compared using the typed columns parsed from their text
+RANGE_COLUMNS = {
+    'release_year': _year_range,
+    'date_added': _date_added_range,
+    'duration': _duration_range,
+}
+
+# columns stored in dimension tables, as the junction table, its key and the dimension
+DIMENSION_COLUMNS = {
+    'cast': (persistence.Actor, persistence.Actor.person_id, persistence.Person),
+    'listed_in': (persistence.ListedIn, persistence.ListedIn.genre_id, persistence.Genre),
+}
+
+
+def _dimension_filter(column: str, op: str, value: str):
+    """
+    return an EXISTS over the show's rows in a dimension, so the name is looked up in the dimension's index and joined
+    to the show through the junction table's primary key. ne is the NOT EXISTS of eq, a show without the value
+    """
+    junction, key, dimension = DIMENSION_COLUMNS[column]
+    exists = (
+        select(junction.id)
+        .join(dimension, dimension.id == key)
+        .where(junction.id == persistence.Show.id)
+        .where(TEXT_OPERATORS['eq' if op == 'ne' else op](dimension.name, value))
+        .exists()
+    )
+    return ~exists if op == 'ne' else exists
+
+
+def _predicate(f: Filter):
+    if f.column in DIMENSION_COLUMNS:
+        return _dimension_filter(f.column, f.operator, f.value)
+    if f.operator in RANGE_OPERATORS:
+        return RANGE_COLUMNS[f.column](RANGE_OPERATORS[f.operator], f.value)
+    return TEXT_OPERATORS[f.operator](persistence.Show.__dict__[f.column], f.value)
+
+
+def _parse_filter(f: str) -> Filter:
+    match = _FILTER.match(f)
+    if not match:
+        raise ValueError(f'invalid filter {f}')
+    column, value = match.group(1), match.group(4).strip()
+    op = match.group(2) or SYMBOLS[match.group(3)]
+    if column not in SQL_COLUMNS and column not in DIMENSION_COLUMNS:
+        raise ValueError(f'invalid filter column {column}')
+    if op not in TEXT_OPERATORS and op not in RANGE_OPERATORS:
+        raise ValueError(f'invalid filter operator {op}')
+    if op in RANGE_OPERATORS and column not in RANGE_COLUMNS:
+        raise ValueError(f'{column} cannot be filtered with {op}')
+    # build the predicate now so an invalid value is a bad request rather than a failed query
+    _predicate(Filter(column, op, value))
+    return Filter(column, op, value)
+
+
+def parse_filters(filter: List[str]) -> List[Filter]:
+    """
+    parse filters like title=The% (LIKE), type[eq]=Movie, cast[in]=a,b or release_year>=2015. See TEXT_OPERATORS and
+    RANGE_OPERATORS for the operators, ranges being limited to release_year, date_added and duration
+    """
+    try:
+        return [_parse_filter(f) for f in filter or []]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f'invalid filters parameter {filter}: {e}')
+
+
+def apply_filters(q, filters: List[Filter]):
+    for f in filters:
+        q = q.filter(_predicate(f))
+    return q
@@ -0,0 +1,136 @@
+import codecs
+import csv
+import io
+import json
+from typing import AsyncIterator, List, Optional, Tuple
+
+import orjson
+
+# the columns of datasource/netflix_titles.csv
+CSV_FIELDS = [
+    'show_id', 'type', 'title', 'director', 'cast', 'country', 'date_added', 'release_year',
+    'rating', 'duration', 'listed_in', 'description'
+]
+LIST_FIELDS = ['cast', 'listed_in']
+
+Record = Tuple[int, Optional[dict], Optional[Exception]]
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            yield line + '\n'
+    buffer += decoder.decode(b'', final=True)
+    if buffer:
+        yield buffer
+
+
+def from_csv_row(header: List[str], row: List[str]) -> dict:
+    if len(row) != len(header):
+        raise ValueError(f'expected {len(header)} fields, found {len(row)}')
+    show = {k: v for k, v in zip(header, row) if k != 'show_id'}
+    for field in LIST_FIELDS:
+        if field in show:
+            show[field] = [v.strip() for v in show[field].split(',') if v.strip()]
+    return show
+
+
+async def csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """
+    yield (line number, show, error) for each record of a csv stream whose first record is a header naming its columns
+    """
+    header = None
+    record = ''
+    line_number = first_line = 0
+    async for line in _lines(chunks):
+        line_number += 1
+        if not record:
+            first_line = line_number
+        record += line
+        if record.count('"') % 2:
+            # a quoted field continues on the next line
+            continue
+        row = next(csv.reader([record]), [])
+        record = ''
+        if not row:
+            continue
+        if header is None:
+            header = [c.strip() for c in row]
+            continue
+        try:
+            yield first_line, from_csv_row(header, row), None
+        except ValueError as e:
+            yield first_line, None, e
+    if record:
+        yield first_line, None, ValueError('unterminated quoted field')
+
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """
+    yield (line number, show, error) for each line of a stream of newline delimited json objects
+    """
+    line_number = 0
+    async for line in _lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            show = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, e
+            continue
+        if isinstance(show, dict):
+            yield line_number, show, None
+        else:
+            yield line_number, None, ValueError('expected a JSON object')
+
+
+RECORD_READERS = {
+    'text/csv': csv_records,
+    'application/x-ndjson': ndjson_records,
+}
+
+
+def to_csv_row(show: dict) -> List[str]:
+    row = [show['id'] if field == 'show_id' else show[field] for field in CSV_FIELDS]
+    return [', '.join(v) if isinstance(v, list) else v for v in row]
+
+
+def _drain(buffer: io.StringIO) -> str:
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text
+
+
+async def csv_chunks(batches: AsyncIterator[List[dict]]) -> AsyncIterator[str]:
+    """
+    yield a header row followed by a chunk of records for each batch of shows, in the format of
+    datasource/netflix_titles.csv read by csv_records
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(CSV_FIELDS)
+    async for shows in batches:
+        writer.writerows(to_csv_row(s) for s in shows)
+        yield _drain(buffer)
+    if buffer.tell():
+        yield _drain(buffer)
+
+
+async def ndjson_chunks(batches: AsyncIterator[List[dict]]) -> AsyncIterator[bytes]:
+    """
+    yield a chunk of newline delimited json objects for each batch of shows
+    """
+    async for shows in batches:
+        yield b''.join(orjson.dumps(s) + b'\n' for s in shows)
+
+
+RECORD_WRITERS = {
+    'text/csv': csv_chunks,
+    'application/x-ndjson': ndjson_chunks,
+}
@@ -1,6 +1,6 @@
 from typing import Optional, List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 
 
 class ShowCreate(BaseModel):
@@ -23,3 +23,26 @@ class Show(ShowCreate):
 
     class Config:
         orm_mode = True
+
+
+class ShowPatch(BaseModel):
+    """
+    the fields of a show to change, fields that are not sent are left unchanged
+    """
+    type: Optional[str] = None
+    title: Optional[str] = None
+    director: Optional[str] = None
+    cast: Optional[List[str]] = None
+    country: Optional[str] = None
+    date_added: Optional[str] = None
+    release_year: Optional[str] = None
+    rating: Optional[str] = None
+    duration: Optional[str] = None
+    listed_in: Optional[List[str]] = None
+    description: Optional[str] = None
+
+    @validator('type', 'title', 'cast', 'listed_in')
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError('may not be null')
+        return value
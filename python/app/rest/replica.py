@@ -0,0 +1,468 @@
+import asyncio
+import bisect
+import functools
+import itertools
+import os
+import re
+import sys
+import time
+from array import array
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from app import Engine, persistence
+from app.persistence import counters, typed
+from app.rest.filters import DIMENSION_COLUMNS, RANGE_OPERATORS, Filter, split_values
+from lib import show_uri
+
+# serve show lists, shows and the summary from a snapshot of the catalog held by each worker rather than the database
+SHOW_REPLICA = os.getenv('SHOW_REPLICA', 'false').lower() == 'true'
+# seconds a snapshot is served without checking the catalog version, 0 to check it on every request
+SHOW_REPLICA_CHECK_INTERVAL = float(os.getenv('SHOW_REPLICA_CHECK_INTERVAL', '0'))
+# sort orders, and shows matching filters, kept by a snapshot for the next requests before they are all dropped
+MAX_KEPT = 16
+
+# the columns of shows loaded into a snapshot besides their cast and listings
+LOADED_COLUMNS = [
+    'id', 'version', 'type', 'title', 'director', 'country', 'date_added', 'release_year', 'rating', 'duration',
+    'description', 'year', 'added_on', 'duration_value', 'duration_unit'
+]
+# columns held as integer codes of a snapshot's values, as the name of the Codes holding them
+CODED_COLUMNS = {
+    'type': 'types',
+    'rating': 'ratings',
+}
+
+
+class ShowRecord:
+    """
+    a show in a snapshot. type and rating are codes of the snapshot's types and ratings, cast is the sorted names of the
+    show's cast and listed_in the codes of its genres in name order
+    """
+    __slots__ = LOADED_COLUMNS + ['cast', 'listed_in']
+
+    def __init__(
+            self, id, version, type, title, director, country, date_added, release_year, rating, duration, description,
+            year, added_on, duration_value, duration_unit, cast, listed_in):
+        self.id = id
+        self.version = version
+        self.type = type
+        self.title = title
+        self.director = director
+        self.country = country
+        self.date_added = date_added
+        self.release_year = release_year
+        self.rating = rating
+        self.duration = duration
+        self.description = description
+        self.year = year
+        self.added_on = added_on
+        self.duration_value = duration_value
+        self.duration_unit = duration_unit
+        self.cast = cast
+        self.listed_in = listed_in
+
+
+class Codes:
+    """
+    integer codes for the values of a column with few distinct values, such as type, rating and listed_in
+    """
+    def __init__(self):
+        self.values = []
+        self.__codes = {}
+
+    def code(self, value) -> int:
+        code = self.__codes.get(value)
+        if code is None:
+            code = self.__codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def matching(self, match: Callable[[Optional[str]], bool]) -> set:
+        return {code for code, value in enumerate(self.values) if match(value)}
+
+
+def _like(pattern: str) -> Callable[[str], bool]:
+    """
+    return a test of LIKE pattern, with % matching any characters, _ any character and \\ escaping them
+    """
+    regex = []
+    escaped = False
+    for c in pattern:
+        if escaped or c not in '\\%_':
+            regex.append(re.escape(c))
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        else:
+            regex.append('.*' if c == '%' else '.')
+    compiled = re.compile(''.join(regex), re.DOTALL)
+    return lambda value: compiled.fullmatch(value) is not None
+
+
+def _text_match(op: str, value: str) -> Callable[[Optional[str]], bool]:
+    """
+    return a test of a column value for a text filter that matches what the filter's SQL does, where no value, a null,
+    matches only ne
+    """
+    if op == 'eq':
+        return lambda v: v == value
+    if op == 'ne':
+        return lambda v: v != value
+    if op == 'in':
+        values = set(split_values(value))
+        return lambda v: v in values
+    if op == 'prefix':
+        return lambda v: v is not None and v.startswith(value)
+    if op == 'contains':
+        return lambda v: v is not None and value in v
+    like = _like(value)
+    return lambda v: v is not None and like(v)
+
+
+def _year_range(op, value: str):
+    year = typed.year(value)
+    return lambda show: show.year is not None and op(show.year, year)
+
+
+def _date_added_range(op, value: str):
+    added_on = typed.date_added(value)
+    return lambda show: show.added_on is not None and op(show.added_on, added_on)
+
+
+def _duration_range(op, value: str):
+    duration, unit = typed.duration(value)
+    return lambda show: show.duration_unit == unit and show.duration_value is not None and op(
+        show.duration_value, duration)
+
+
+# tests of the typed columns for the columns that can be filtered with ranges, as app.rest.filters.RANGE_COLUMNS
+RANGE_COLUMNS = {
+    'release_year': _year_range,
+    'date_added': _date_added_range,
+    'duration': _duration_range,
+}
+
+
+def _sort_value(value) -> tuple:
+    # shows without a value sort last, as they do in ascending Postgres orders
+    return (True, '') if value is None else (False, value)
+
+
+def _both(first, second):
+    return lambda show: first(show) and second(show)
+
+
+def _keep(kept: dict, key, value):
+    if len(kept) >= MAX_KEPT:
+        kept.clear()
+    kept[key] = value
+    return value
+
+
+def _follows(values: list, after: list) -> bool:
+    """
+    return whether values follow after in an ascending order where nulls sort last and equal each other, as
+    app.rest.routers.shows._seek selects them
+    """
+    for value, previous in zip(values, after):
+        if value == previous:
+            continue
+        if previous is None:
+            return False
+        return value is None or value > previous
+    return False
+
+
+class Snapshot:
+    """
+    the shows of the catalog at a catalog version, in id order
+    """
+    def __init__(self, version: int, rows):
+        self.version = version
+        self.types = Codes()
+        self.ratings = Codes()
+        self.genres = Codes()
+        # values repeated between shows, like directors, names and dates, are interned so each is stored once. A dict
+        # rather than sys.intern, whose table outlives the snapshot and costs more than the strings it saves
+        shared = {}
+
+        def share(value):
+            return shared.setdefault(value, value)
+
+        self.shows = []
+        for (show_id, show_version, show_type, title, director, country, date_added, release_year, rating, duration,
+             description, year, added_on, duration_value, duration_unit, cast, listed_in, _) in rows:
+            self.shows.append(ShowRecord(
+                show_id, show_version, self.types.code(show_type), title, share(director), share(country),
+                share(date_added), share(release_year), self.ratings.code(rating), share(duration), description,
+                share(year), share(added_on), duration_value, share(duration_unit),
+                tuple(sorted(share(name) for name in set(cast or []))),
+                tuple(self.genres.code(name) for name in sorted(set(listed_in or []))),
+            ))
+        self.ids = array('q', [s.id for s in self.shows])
+        self.summary = self.__summary()
+        self.__countries = {}
+        self.__orders = {}
+        self.__matching = {}
+        self.__facet_counts = {}
+        self.__size = None
+
+    def __summary(self) -> dict:
+        by_type = Counter(self.types.values[s.type] or '' for s in self.shows)
+        by_listed_in = Counter(self.genres.values[code] for s in self.shows for code in s.listed_in)
+        return {'total': len(self.shows), 'total_by_listed_in': dict(by_listed_in), 'total_by_type': dict(by_type)}
+
+    def value(self, show: ShowRecord, column: str):
+        if column in CODED_COLUMNS:
+            return getattr(self, CODED_COLUMNS[column]).values[getattr(show, column)]
+        return getattr(show, column)
+
+    def record(self, show: ShowRecord) -> dict:
+        """
+        return the fields of Show in order, as app.rest.routers.shows.to_show_record does
+        """
+        return {
+            'type': self.types.values[show.type],
+            'title': show.title,
+            'director': show.director,
+            'cast': list(show.cast),
+            'country': show.country,
+            'date_added': show.date_added,
+            'release_year': show.release_year,
+            'rating': self.ratings.values[show.rating],
+            'duration': show.duration,
+            'listed_in': [self.genres.values[code] for code in show.listed_in],
+            'description': show.description,
+            'id': show.id,
+            'uri': show_uri(show.id),
+        }
+
+    def get(self, show_id: int) -> Optional[ShowRecord]:
+        i = bisect.bisect_left(self.ids, show_id)
+        return self.shows[i] if i < len(self.ids) and self.ids[i] == show_id else None
+
+    def sort_values(self, show: ShowRecord, key_columns: List[str]) -> list:
+        """
+        return the values of the columns ordering shows sorted by key_columns, as a cursor holds them
+        """
+        return [self.value(show, c) for c in typed.sort_columns(key_columns)]
+
+    def order(self, key_columns: List[str]) -> List[ShowRecord]:
+        """
+        return the shows ordered by key_columns, sorted once per snapshot
+        """
+        key = tuple(key_columns)
+        order = self.__orders.get(key)
+        if order is None:
+            order = _keep(self.__orders, key, sorted(
+                self.shows, key=lambda s: tuple(_sort_value(v) for v in self.sort_values(s, key_columns))))
+        return order
+
+    def _predicate(self, f: Filter) -> Callable[[ShowRecord], bool]:
+        if f.operator in RANGE_OPERATORS:
+            return RANGE_COLUMNS[f.column](RANGE_OPERATORS[f.operator], f.value)
+        if f.column in DIMENSION_COLUMNS:
+            # a show matches ne when none of its names are equal to the value, as the NOT EXISTS of eq
+            match = _text_match('eq' if f.operator == 'ne' else f.operator, f.value)
+            if f.column == 'cast' and f.operator in ('eq', 'ne', 'in'):
+                matching = set(split_values(f.value)) if f.operator == 'in' else {f.value}
+            elif f.column == 'cast':
+                matching = {name for s in self.shows for name in s.cast if match(name)}
+            else:
+                matching = self.genres.matching(match)
+            if f.operator == 'ne':
+                return lambda show: matching.isdisjoint(getattr(show, f.column))
+            return lambda show: not matching.isdisjoint(getattr(show, f.column))
+        match = _text_match(f.operator, f.value)
+        if f.column in CODED_COLUMNS:
+            codes = getattr(self, CODED_COLUMNS[f.column]).matching(match)
+            return lambda show: getattr(show, f.column) in codes
+        return lambda show: match(getattr(show, f.column))
+
+    def matching(self, key_columns: List[str], filters: List[Filter]) -> List[ShowRecord]:
+        """
+        return the shows matching the filters ordered by key_columns, found once for the next requests with the same
+        filters and order
+        """
+        order = self.order(key_columns)
+        if not filters:
+            return order
+        key = (tuple(key_columns), tuple(filters))
+        matching = self.__matching.get(key)
+        if matching is None:
+            predicate = functools.reduce(_both, [self._predicate(f) for f in filters])
+            matching = _keep(self.__matching, key, [s for s in order if predicate(s)])
+        return matching
+
+    def page(
+            self, limit: int, offset: int, after: Optional[list], key_columns: List[str], filters: List[Filter],
+            count: bool = False) -> Tuple[List[ShowRecord], Optional[int]]:
+        """
+        return a page of the shows matching the filters as GET /shows selects it from the database, along with the
+        number of shows matching the filters when count is true
+        """
+        if limit < 0 or offset < 0:
+            raise ValueError('limit and offset cannot be negative')
+        shows = self.matching(key_columns, filters)
+        if after is not None:
+            following = (s for s in shows if _follows(self.sort_values(s, key_columns), after))
+            page = list(itertools.islice(following, limit))
+        else:
+            page = shows[offset:offset + limit]
+        return page, len(shows) if count else None
+
+    def _countries(self, country: Optional[str]) -> tuple:
+        # country holds a comma separated list like "United States, India", split once per distinct value
+        countries = self.__countries.get(country)
+        if countries is None:
+            countries = self.__countries[country] = tuple(
+                dict.fromkeys(c.strip(' ') for c in (country or '').split(',')))
+        return countries
+
+    def facet_counts(self, filters: List[Filter], facets: List[str]) -> Dict[str, Dict[str, int]]:
+        """
+        count the shows matching the filters per value of each facet, as app.rest.facets.facet_counts does
+        """
+        key = (tuple(filters), tuple(facets))
+        facet_counts = self.__facet_counts.get(key)
+        if facet_counts is not None:
+            return facet_counts
+        shows = self.matching(['id'], filters)
+        facet_counts = {}
+        for name in facets:
+            if name in CODED_COLUMNS:
+                values = getattr(self, CODED_COLUMNS[name]).values
+                counts = Counter(values[getattr(s, name)] for s in shows)
+            elif name == 'listed_in':
+                counts = Counter(self.genres.values[code] for s in shows for code in s.listed_in)
+            else:
+                counts = Counter(c for s in shows for c in self._countries(s.country))
+            facet_counts[name] = dict(sorted(
+                ((value, count) for value, count in counts.items() if value), key=lambda item: (-item[1], item[0])))
+        return _keep(self.__facet_counts, key, facet_counts)
+
+    def size(self) -> int:
+        """
+        return the bytes held by the snapshot's shows, counting values shared between shows once
+        """
+        if self.__size is None:
+            seen = set()
+            size = 0
+            objects = [self.shows, self.ids, self.types.values, self.genres.values, self.ratings.values]
+            objects.extend(self.shows)
+            objects.extend(getattr(s, c) for s in self.shows for c in ShowRecord.__slots__)
+            objects.extend(n for s in self.shows for n in s.cast)
+            for o in objects:
+                if id(o) not in seen:
+                    seen.add(id(o))
+                    size += sys.getsizeof(o)
+            self.__size = size
+        return self.__size
+
+
+def _names(junction, key, dimension):
+    # the names of each show's rows in a dimension, aggregated in one pass over the junction table rather than a
+    # subquery per show
+    return (
+        select(junction.id, func.array_agg(dimension.name).label('names'))
+        .join(dimension, dimension.id == key)
+        .group_by(junction.id)
+        .subquery()
+    )
+
+
+def load(session, version: int) -> Snapshot:
+    """
+    load a snapshot of the shows with one statement, so the catalog version read with them matches what they hold.
+    version is used when there are no shows to read it with
+    """
+    cast = _names(*DIMENSION_COLUMNS['cast'])
+    listed_in = _names(*DIMENSION_COLUMNS['listed_in'])
+    catalog_version = (
+        select(persistence.CatalogVersion.version).where(persistence.CatalogVersion.id == 1).scalar_subquery()
+    )
+    rows = session.execute(
+        select(
+            *[persistence.Show.__table__.c[c] for c in LOADED_COLUMNS], cast.c.names, listed_in.c.names,
+            func.coalesce(catalog_version, 0)
+        )
+        .outerjoin(cast, cast.c.id == persistence.Show.id)
+        .outerjoin(listed_in, listed_in.c.id == persistence.Show.id)
+        .order_by(persistence.Show.id)
+    ).all()
+    return Snapshot(rows[0][-1] if rows else version, rows)
+
+
+class Replica:
+    """
+    a snapshot of the catalog kept up to date by checking the catalog version at most every check_interval seconds,
+    and on the next request after a write handled by this worker
+    """
+    def __init__(self, enabled: bool, check_interval: float):
+        self.enabled = enabled
+        self.check_interval = check_interval
+        self.checks = 0
+        self.loads = 0
+        self.load_ms = 0.0
+        # bumped by every write so the next request checks the catalog version, as Cache.epoch is
+        self.epoch = 0
+        self.__snapshot = None
+        self.__checked = (None, 0.0)
+        self.__lock = None
+
+    def invalidate(self):
+        self.epoch += 1
+
+    def clear(self):
+        self.epoch += 1
+        self.__snapshot = None
+
+    async def snapshot(self) -> Snapshot:
+        """
+        return the snapshot, loading it first when the catalog version has changed since it was loaded
+        """
+        snapshot = self.__snapshot
+        checked_epoch, checked_at = self.__checked
+        if snapshot is not None and checked_epoch == self.epoch and time.monotonic() - checked_at < self.check_interval:
+            return snapshot
+        epoch, now = self.epoch, time.monotonic()
+        async with Engine.new_async_session() as session:
+            version = await session.run_sync(counters.catalog_version)
+        self.checks += 1
+        if snapshot is None or snapshot.version != version:
+            if self.__lock is None:
+                self.__lock = asyncio.Lock()
+            # one request loads the snapshot while the others wait for it
+            async with self.__lock:
+                if self.__snapshot is None or self.__snapshot.version != version:
+                    start = time.perf_counter()
+                    async with Engine.new_async_session() as session:
+                        self.__snapshot = await session.run_sync(load, version)
+                    self.loads += 1
+                    self.load_ms = (time.perf_counter() - start) * 1000
+                snapshot = self.__snapshot
+        if epoch == self.epoch:
+            self.__checked = (epoch, now)
+        return snapshot
+
+    def stats(self) -> dict:
+        stats = {
+            'enabled': self.enabled,
+            'check_interval': self.check_interval,
+            'checks': self.checks,
+            'loads': self.loads,
+            'load_ms': self.load_ms,
+        }
+        if self.__snapshot is not None:
+            stats.update({
+                'version': self.__snapshot.version,
+                'shows': len(self.__snapshot.shows),
+                'size_bytes': self.__snapshot.size(),
+            })
+        return stats
+
+
+show_replica = Replica(SHOW_REPLICA, SHOW_REPLICA_CHECK_INTERVAL)
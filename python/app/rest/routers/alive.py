@@ -1,14 +1,12 @@
-import os
-import sys
-
 from fastapi import APIRouter
 
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from app.rest.timing import TimedRoute
 
 alive_router = APIRouter(
     prefix='/alive',
     tags=['alive'],
     responses={404: {'description': 'Not found'}},
+    route_class=TimedRoute,
 )
 
 
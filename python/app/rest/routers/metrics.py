@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Response
+
+from app.metrics import request_metrics
+from app.rest.timing import TimedRoute
+
+PROMETHEUS_MEDIA_TYPE = 'text/plain; version=0.0.4'
+
+metrics_router = APIRouter(
+    prefix='/metrics',
+    tags=['stats'],
+    responses={404: {'description': 'Not found'}},
+    route_class=TimedRoute,
+)
+
+
+@metrics_router.get('', response_class=Response)
+async def metrics():
+    """
+    return this worker's request latency histograms and response counts in the Prometheus text format
+    """
+    return Response(request_metrics.render(), media_type=PROMETHEUS_MEDIA_TYPE)
@@ -1,212 +1,847 @@
+import base64
 import datetime
+import json
 import os
 
-import sys
+from typing import AsyncIterator, Optional, List, Tuple
 
-from typing import Optional, List
-
-from fastapi import APIRouter, HTTPException, Query
-
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import and_, false, func, literal, literal_column, or_, select, tuple_, union_all, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import aliased
 
 from app import Engine, persistence
-from app.persistence import SQL_COLUMNS, ListedIn, Actor
-from app.rest.models.shows import Show, ShowCreate
+from app.cache import show_cache
+from app.persistence import SQL_COLUMNS, counters, dimensions, search, typed
+from app.persistence.estimates import estimated_rows
+from app.rest import etags
+from app.rest.facets import facet_counts, parse_facets
+from app.rest.filters import Filter, apply_filters, parse_filters
+from app.rest.formats import RECORD_READERS, RECORD_WRITERS
+from app.rest.models.shows import Show, ShowCreate, ShowPatch
+from app.rest.replica import Snapshot, show_replica
+from app.rest.responses import json_response
+from app.rest.timing import TimedRoute
 from lib import show_uri
 
+COUNT_NONE = 'none'
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+# estimates below this are replaced by exact counts, which are cheap for few shows, where estimates are least accurate
+SHOW_COUNT_EXACT_BELOW = int(os.getenv('SHOW_COUNT_EXACT_BELOW', '1000'))
+# the media types shows can be exported as
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# the columns of shows exported along with their cast and listings
+EXPORT_COLUMNS = [
+    'id', 'type', 'title', 'director', 'country', 'date_added', 'release_year', 'rating', 'duration', 'description'
+]
+# shows fetched from the export's server-side cursor and written to the response at a time
+SHOW_EXPORT_BATCH_SIZE = int(os.getenv('SHOW_EXPORT_BATCH_SIZE', '1000'))
+# the most shows POST /shows/bulk inserts and commits together, which bounds the memory and locks of a batch
+MAX_BULK_BATCH_SIZE = 5000
+
 shows_router = APIRouter(
     prefix='/shows',
     tags=['shows'],
     responses={404: {'description': 'Not found'}},
+    route_class=TimedRoute,
 )
 
 
-def from_db_show(session, show_id: int) -> Show:
-    db_show = session.query(persistence.Show).filter(persistence.Show.id == show_id).one()
-    cast = session.query(persistence.Actor).filter(persistence.Actor.id == show_id).all()
-    listed_in = session.query(persistence.ListedIn).filter(persistence.ListedIn.id == show_id).all()
+def _cast_column(show=persistence.Show):
+    return func.array(
+        select(persistence.Person.name)
+        .where(persistence.Actor.person_id == persistence.Person.id)
+        .where(persistence.Actor.id == show.id)
+        .scalar_subquery()
+    ).label('cast')
+
+
+def _listed_in_column(show=persistence.Show):
+    return func.array(
+        select(persistence.Genre.name)
+        .where(persistence.ListedIn.genre_id == persistence.Genre.id)
+        .where(persistence.ListedIn.id == show.id)
+        .scalar_subquery()
+    ).label('listed_in')
+
+
+def hydrated_shows(session, show=persistence.Show):
+    """
+    query shows along with their cast and listings aggregated into arrays so a page of shows is loaded in one statement
+    """
+    return session.query(show, _cast_column(show), _listed_in_column(show))
+
+
+def to_show(db_show: persistence.Show, cast: List[str], listed_in: List[str]) -> Show:
     show = Show(type=db_show.type, title=db_show.title)
     show.director = db_show.director
-    show.cast = sorted([actor.name for actor in cast])
+    show.cast = sorted(cast or [])
     show.country = db_show.country
     show.date_added = db_show.date_added
     show.release_year = db_show.release_year
     show.rating = db_show.rating
     show.duration = db_show.duration
-    show.listed_in = sorted([listing.listed_in for listing in listed_in])
+    show.listed_in = sorted(listed_in or [])
     show.description = db_show.description
     show.id = db_show.id
     show.uri = show_uri(db_show.id)
     return show
 
 
-def to_db_show(show: ShowCreate) -> persistence.Show:
-    return persistence.Show(
-        type=show.type,
-        title=show.title,
-        director=show.director,
-        country=show.country,
-        date_added=show.date_added,
-        release_year=show.release_year,
-        rating=show.rating,
-        duration=show.duration,
-        description=show.description
-    )
+def to_show_record(db_show, cast: List[str], listed_in: List[str]) -> dict:
+    """
+    return the fields of Show in order, as to_show fills them, from a show or a row of its columns. Lists of shows are
+    serialized from these records without building a model for every show
+    """
+    return {
+        'type': db_show.type,
+        'title': db_show.title,
+        'director': db_show.director,
+        'cast': sorted(cast or []),
+        'country': db_show.country,
+        'date_added': db_show.date_added,
+        'release_year': db_show.release_year,
+        'rating': db_show.rating,
+        'duration': db_show.duration,
+        'listed_in': sorted(listed_in or []),
+        'description': db_show.description,
+        'id': db_show.id,
+        'uri': show_uri(db_show.id),
+    }
+
+
+def from_db_show(session, show_id: int) -> Show:
+    return to_show(*hydrated_shows(session).filter(persistence.Show.id == show_id).one())
+
+
+def to_db_values(show: ShowCreate) -> dict:
+    values = {
+        'type': show.type,
+        'title': show.title,
+        'director': show.director,
+        'country': show.country,
+        'date_added': show.date_added,
+        'release_year': show.release_year,
+        'rating': show.rating,
+        'duration': show.duration,
+        'description': show.description
+    }
+    return {**values, **typed.typed_values(values)}
+
+
+def default_date_added(show: ShowCreate) -> ShowCreate:
+    if not show.date_added:
+        show.date_added = datetime.datetime.utcnow().strftime('%B %d, %Y')
+    return show
+
+
+def insert_shows(session, shows: List[ShowCreate]) -> List[int]:
+    """
+    insert shows with one multi-row statement per table, split only where a statement would bind more parameters than
+    Postgres allows, and return their ids
+    """
+    # a row binds at most one parameter per column, including those filled with column defaults like version
+    show_ids = []
+    for batch in persistence.in_batches([to_db_values(s) for s in shows], len(persistence.Show.__table__.columns)):
+        show_ids.extend(session.execute(
+            insert(persistence.Show).values(batch).returning(persistence.Show.id)
+        ).scalars().all())
+    person_ids = dimensions.lookup(session, persistence.Person, [a for s in shows for a in s.cast])
+    actors = [{'id': i, 'person_id': person_ids[a]} for i, s in zip(show_ids, shows) for a in set(s.cast)]
+    for batch in persistence.in_batches(actors, len(persistence.Actor.__table__.columns)):
+        session.execute(insert(persistence.Actor).values(batch))
+    search.refresh(session, show_ids)
+    genre_ids = dimensions.lookup(session, persistence.Genre, [li for s in shows for li in s.listed_in])
+    listings = [{'id': i, 'genre_id': genre_ids[li]} for i, s in zip(show_ids, shows) for li in set(s.listed_in)]
+    for batch in persistence.in_batches(listings, len(persistence.ListedIn.__table__.columns)):
+        session.execute(insert(persistence.ListedIn).values(batch))
+    counters.adjust(session, counters.merge(*[counters.deltas(s.type, s.listed_in) for s in shows]))
+    counters.bump_catalog_version(session)
+    return show_ids
+
+
+def _replace_values(session, key, dimension, show_id: int, values: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    make a show's rows in the cast or listings junction table reference exactly these names with one DELETE and at
+    most one multi-row INSERT, and return the names added and removed
+    """
+    table = key.table
+    names = dimension.__table__.c.name
+    ids = dimensions.lookup(session, dimension, values)
+    removed = session.execute(
+        table.delete()
+        .where(table.c.id == show_id)
+        .where(key.not_in(list(ids.values())))
+        .where(key == dimension.__table__.c.id)
+        .returning(names)
+    ).scalars().all()
+    added = []
+    if ids:
+        added_ids = set(session.execute(
+            insert(table).values([{'id': show_id, key.key: i} for i in sorted(ids.values())])
+            .on_conflict_do_nothing()
+            .returning(key)
+        ).scalars().all())
+        added = [name for name, i in ids.items() if i in added_ids]
+    return sorted(added), removed
+
+
+def update_cast(session, show_id: int, cast: List[str]) -> Tuple[List[str], List[str]]:
+    return _replace_values(session, persistence.Actor.__table__.c.person_id, persistence.Person, show_id, cast)
+
 
+def update_listed_in(session, show_id: int, listed_in: List[str]) -> Tuple[List[str], List[str]]:
+    return _replace_values(
+        session, persistence.ListedIn.__table__.c.genre_id, persistence.Genre, show_id, listed_in)
 
-def update_cast(session, show_id: int, show: ShowCreate, db_show: persistence.Show = None):
-    actors = session.query(persistence.Actor).filter(persistence.Actor.id == show_id).all()
-    db_actors = [a.name for a in actors]
-    to_delete = list(set([a for a in db_actors if a not in show.cast]))
-    for d in to_delete:
-        actor = session.query(persistence.Actor).filter(
-            persistence.Actor.id == show_id).filter(
-            persistence.Actor.name == d).one()
-        session.delete(actor)
-
-    to_add = list(set([a for a in show.cast if a not in db_actors]))
-    for a in to_add:
-        actor = Actor()
-        actor.id = db_show.id
-        actor.name = a
-        session.add(actor)
-
-
-def update_listed_in(session, show_id: int, show: ShowCreate, db_show: persistence.Show = None):
-    listings = session.query(persistence.ListedIn).filter(persistence.ListedIn.id == show_id).all()
-    db_listed_in = [listing.listed_in for listing in listings]
-    to_delete = list(set([listing for listing in db_listed_in if listing not in show.listed_in]))
-    for d in to_delete:
-        listed_in = session.query(persistence.ListedIn).filter(
-            persistence.ListedIn.id == show_id).filter(
-            persistence.ListedIn.listed_in == d).one()
-        session.delete(listed_in)
-
-    to_add = list(set([listing for listing in show.listed_in if listing not in db_listed_in]))
-    for a in to_add:
-        listed_in = ListedIn()
-        listed_in.id = db_show.id
-        listed_in.listed_in = a
-        session.add(listed_in)
+
+def _key_columns(sort_list: List[str]) -> List[str]:
+    # id breaks ties between rows with equal sort values so every row has a unique position in the ordering
+    return sort_list if 'id' in sort_list else sort_list + ['id']
+
+
+def _encode_cursor(key_columns: List[str], values: list) -> str:
+    # cursors hold the values of the columns ordering a list, like the date a show was added, which JSON holds as text
+    values = [v.isoformat() if isinstance(v, datetime.date) else v for v in values]
+    cursor = {'sort': key_columns, 'values': values}
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+
+
+def _cursor_value(column: str, value):
+    """
+    return a cursor's value for a column ordering a list, raising ValueError when it can't be compared with the column
+    """
+    if column == 'rank':
+        # the search rank of a show, which JSON holds as a float or, when it is whole, as an int
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f'invalid cursor value {value!r} for {column}')
+        return value
+    table_column = persistence.Show.__table__.c[column]
+    if value is None and table_column.nullable:
+        return None
+    python_type = table_column.type.python_type
+    if python_type is datetime.date:
+        return datetime.date.fromisoformat(value)
+    # bool is an int, but JSON true is never a column's value
+    if type(value) is not python_type:
+        raise ValueError(f'invalid cursor value {value!r} for {column}')
+    return value
+
+
+def _decode_cursor(key_columns: List[str], cursor: str) -> list:
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        values = decoded['values']
+        columns = typed.sort_columns(key_columns)
+        if decoded['sort'] != key_columns or len(values) != len(columns):
+            raise ValueError('cursor does not match the sort parameters')
+        return [_cursor_value(c, v) for c, v in zip(columns, values)]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail=f'invalid cursor parameter {cursor}')
+
+
+def _seek(columns: list, values: list):
+    """
+    return the condition selecting the rows that follow values in the ascending order of columns, where nulls sort
+    last and equal each other as they do in Postgres orders. A row comparison is unknown once it meets a null, so it
+    only compares the non-null columns, keeping the (column, id) indexes usable for the common case
+    """
+    if not columns:
+        return false()
+    column, value = columns[0], values[0]
+    if value is None:
+        return and_(column.is_(None), _seek(columns[1:], values[1:]))
+    if len(columns) == 1:
+        following = column > value
+    elif not any(c.nullable for c in columns[1:]):
+        following = tuple_(*columns) > tuple_(*values)
+    else:
+        following = or_(column > value, and_(column == value, _seek(columns[1:], values[1:])))
+    return or_(following, column.is_(None)) if column.nullable else following
+
+
+def _count_query(filters: List[Filter]):
+    # never correlated with an enclosing query of shows, so it always counts every show matching the filters
+    return apply_filters(select(func.count()).select_from(persistence.Show), filters).correlate(None)
+
+
+def _count(session, filters: List[Filter]) -> int:
+    return session.execute(_count_query(filters)).scalar()
+
+
+def _list_shows(
+        session, response: Optional[Response], limit: int, offset: int, after: Optional[list], key_columns: List[str],
+        filters: List[Filter], count: str = COUNT_NONE) -> List[dict]:
+    if response is None:
+        # counts are returned in headers, so there's nothing to count without a response
+        count = COUNT_NONE
+    q = apply_filters(select(persistence.Show), filters)
+    if count == COUNT_ESTIMATE:
+        estimate = estimated_rows(session, q)
+        if estimate >= SHOW_COUNT_EXACT_BELOW:
+            response.headers['X-Total-Count-Estimate'] = str(estimate)
+        else:
+            count = COUNT_EXACT
+    if count == COUNT_EXACT:
+        # count in the statement selecting the page to save a round trip. Postgres runs the uncorrelated count once,
+        # where count(*) OVER () would read and sort every matching show before the page could be limited
+        q = q.add_columns(_count_query(filters).scalar_subquery().label('total'))
+    columns = typed.sort_columns(key_columns)
+    for c in columns:
+        q = q.order_by(persistence.Show.__dict__[c])
+    if after is not None:
+        q = q.filter(_seek([persistence.Show.__table__.c[c] for c in columns], after))
+    else:
+        q = q.offset(offset)
+    # select the page first so cast and listings are aggregated only for its shows and not for every show an offset
+    # skips over
+    page_query = q.limit(limit).subquery()
+    page = aliased(persistence.Show, page_query)
+    hydrated = hydrated_shows(session, page)
+    if count == COUNT_EXACT:
+        hydrated = hydrated.add_columns(page_query.c.total)
+    rows = hydrated.order_by(*[getattr(page, c) for c in columns]).all()
+    if count == COUNT_EXACT:
+        if rows:
+            total = rows[0][3]
+        else:
+            # a page past the end has no rows to carry the count
+            total = 0 if not offset and after is None else _count(session, filters)
+        response.headers['X-Total-Count'] = str(total)
+    if response is not None and rows and len(rows) == limit:
+        response.headers['X-Next-Cursor'] = _encode_cursor(key_columns, [getattr(rows[-1][0], c) for c in columns])
+    return [to_show_record(*row[:3]) for row in rows]
+
+
+def _replica_list_shows(
+        snapshot: Snapshot, response: Optional[Response], limit: int, offset: int, after: Optional[list],
+        key_columns: List[str], filters: List[Filter], count: str = COUNT_NONE) -> List[dict]:
+    """
+    select a page of shows from the replica's snapshot with the headers _list_shows returns
+    """
+    if response is None:
+        count = COUNT_NONE
+    page, total = snapshot.page(limit, offset, after, key_columns, filters, count != COUNT_NONE)
+    if count == COUNT_ESTIMATE and total >= SHOW_COUNT_EXACT_BELOW:
+        # the snapshot counts exactly at no cost, but large counts are still returned in the header clients asked for
+        response.headers['X-Total-Count-Estimate'] = str(total)
+    elif count != COUNT_NONE:
+        response.headers['X-Total-Count'] = str(total)
+    if response is not None and page and len(page) == limit:
+        response.headers['X-Next-Cursor'] = _encode_cursor(key_columns, snapshot.sort_values(page[-1], key_columns))
+    return [snapshot.record(s) for s in page]
 
 
 @shows_router.get('')
 async def list_shows(
+        request: Request = None,
+        response: Response = None,
         limit: Optional[int] = 50,
         offset: Optional[int] = 0,
+        cursor: Optional[str] = None,
         sort: Optional[List[str]] = Query(default=['title']),
-        filter: Optional[List[str]] = Query(default=[])):
+        filter: Optional[List[str]] = Query(default=[]),
+        facets: Optional[str] = None,
+        count: Optional[str] = COUNT_NONE):
     """
     list a set of shows
     - **limit**: the maximum number of shows to return
     - **offset**: return results starting at this offset
+    - **cursor**: return results following the last show of a previous page. Full pages return the cursor for the next
+      page in the X-Next-Cursor header. cursor cannot be combined with offset and must be used with the same sort
     - **sort**: sort results based on this list of fields. sort can be used more than once
-    - **filter**: filter results based on shows with fields like these filters. filter can be used more than once
+    - **filter**: filter results with filters like title=The% (LIKE), type[eq]=Movie or cast[in]=a,b. The operators are
+      eq, ne, in, prefix, contains, like and, for release_year, date_added and duration, gte, lte, gt and lt (also
+      written >=, <=, > and <). filter can be used more than once
+    - **facets**: count the shows matching the filters per value of these fields, from type, listed_in, rating and
+      country, like facets=type,listed_in. With facets the response is an object holding the page of shows and the
+      counts of each facet, like {"shows": [...], "facets": {"listed_in": {"Dramas": 312}}}
+    - **count**: none, exact or estimate. exact returns the number of shows matching the filters in the X-Total-Count
+      header. estimate returns the planner's estimate in the X-Total-Count-Estimate header instead when it is at least
+      SHOW_COUNT_EXACT_BELOW, saving a full count of large results
+
+    responses carry an ETag that changes whenever any show changes and If-None-Match is answered with 304
     """
     sort_list = [c.strip() for c in sort]
     invalid_sort_columns = [c for c in sort_list if c not in SQL_COLUMNS]
     if invalid_sort_columns:
         raise HTTPException(status_code=400, detail=f'invalid sort parameter {", ".join(sort_list)}')
 
-    filters = {}
-    if filter:
-        filters = {f.split('=', 1)[0].strip(): f.split('=', 1)[-1].strip() for f in filter}
-        invalid_filter_columns = [c for c in filters.keys() if c not in SQL_COLUMNS]
-        if invalid_filter_columns:
-            raise HTTPException(status_code=400, detail=f'invalid filters parameter {filter}')
+    key_columns = _key_columns(sort_list)
+    after = None
+    if cursor:
+        if offset:
+            raise HTTPException(status_code=400, detail='cursor cannot be combined with offset')
+        after = _decode_cursor(key_columns, cursor)
+
+    filters = parse_filters(filter)
+    facet_names = parse_facets(facets)
+    if count not in [COUNT_NONE, COUNT_EXACT, COUNT_ESTIMATE]:
+        raise HTTPException(status_code=400, detail=f'invalid count parameter {count}')
+
+    if show_replica.enabled:
+        snapshot = await show_replica.snapshot()
+        if response is not None:
+            etag = etags.catalog_etag(snapshot.version)
+            if etags.matches(etags.if_none_match(request), etag):
+                return etags.not_modified(etag)
+            response.headers['ETag'] = etag
+        shows = _replica_list_shows(snapshot, response, limit, offset, after, key_columns, filters, count)
+        if not facet_names:
+            return json_response(shows, response)
+        return json_response({'shows': shows, 'facets': snapshot.facet_counts(filters, facet_names)}, response)
 
-    with Engine.new_session() as session:
-        q = session.query(persistence.Show)
-        for s in sort_list:
-            q = q.order_by(persistence.Show.__dict__[s])
-        for k, v in filters.items():
-            q = q.filter(persistence.Show.__dict__[k].like(v))
-        shows = q.offset(offset).limit(limit).all()
-        return [from_db_show(session, s.id) for s in shows]
+    async with Engine.new_async_session() as session:
+        if response is not None:
+            # read the version before the shows so a page is never tagged with a version newer than its contents
+            etag = etags.catalog_etag(await session.run_sync(counters.catalog_version))
+            if etags.matches(etags.if_none_match(request), etag):
+                return etags.not_modified(etag)
+            response.headers['ETag'] = etag
+        shows = await session.run_sync(_list_shows, response, limit, offset, after, key_columns, filters, count)
+        if not facet_names:
+            return json_response(shows, response)
+        facets = await session.run_sync(facet_counts, filters, facet_names)
+    return json_response({'shows': shows, 'facets': facets}, response)
+
+
+# search results are ordered by rank, with id breaking ties, and search cursors hold both
+SEARCH_KEY = ['rank', 'id']
+
+
+def _search_shows(
+        session, response: Optional[Response], q: str, limit: int, offset: int, after: Optional[list],
+        filters: List[Filter]) -> List[dict]:
+    query = search.tsquery(q)
+    rank = search.rank(query).label('rank')
+    s = select(persistence.Show, rank).where(persistence.Show.search.op('@@')(query))
+    s = apply_filters(s, filters)
+    if after is not None:
+        s = s.where(or_(rank < after[0], and_(rank == after[0], persistence.Show.id > after[1])))
+    else:
+        s = s.offset(offset)
+    # rank only the matching shows and hydrate only the page, as _list_shows does
+    page_query = s.order_by(rank.desc(), persistence.Show.id).limit(limit).subquery()
+    page = aliased(persistence.Show, page_query)
+    rows = (
+        hydrated_shows(session, page)
+        .add_columns(page_query.c.rank)
+        .order_by(page_query.c.rank.desc(), page.id)
+        .all()
+    )
+    if response is not None and rows and len(rows) == limit:
+        response.headers['X-Next-Cursor'] = _encode_cursor(SEARCH_KEY, [rows[-1][3], rows[-1][0].id])
+    return [to_show_record(db_show, cast, listed_in) for db_show, cast, listed_in, _ in rows]
+
+
+@shows_router.get('/search', response_model=List[Show])
+async def search_shows(
+        q: str,
+        request: Request = None,
+        response: Response = None,
+        limit: Optional[int] = 50,
+        offset: Optional[int] = 0,
+        cursor: Optional[str] = None,
+        filter: Optional[List[str]] = Query(default=[])):
+    """
+    search the title, description, director and cast of shows, returning the best matches first
+    - **q**: the search query. Words must all match unless separated by or, "quoted phrases" match in order and -word
+      excludes shows matching word
+    - **limit**: the maximum number of shows to return
+    - **offset**: return results starting at this offset
+    - **cursor**: return results following the last show of a previous page. Full pages return the cursor for the next
+      page in the X-Next-Cursor header. cursor cannot be combined with offset
+    - **filter**: filter results as list_shows does. filter can be used more than once
+
+    responses carry an ETag that changes whenever any show changes and If-None-Match is answered with 304
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail='q cannot be empty')
+    after = None
+    if cursor:
+        if offset:
+            raise HTTPException(status_code=400, detail='cursor cannot be combined with offset')
+        after = _decode_cursor(SEARCH_KEY, cursor)
+
+    filters = parse_filters(filter)
+
+    async with Engine.new_async_session() as session:
+        if response is not None:
+            etag = etags.catalog_etag(await session.run_sync(counters.catalog_version))
+            if etags.matches(etags.if_none_match(request), etag):
+                return etags.not_modified(etag)
+            response.headers['ETag'] = etag
+        shows = await session.run_sync(_search_shows, response, q, limit, offset, after, filters)
+    return json_response(shows, response)
+
+
+def _export_query(filters: List[Filter]):
+    columns = [persistence.Show.__dict__[c] for c in EXPORT_COLUMNS]
+    return apply_filters(select(*columns, _cast_column(), _listed_in_column()), filters).order_by(persistence.Show.id)
+
+
+async def _export_batches(filters: List[Filter]) -> AsyncIterator[List[dict]]:
+    # one statement read through a server-side cursor sees a consistent snapshot of the catalog while only a batch of
+    # shows is held in memory at a time. Columns rather than entities are selected so the session keeps no shows
+    async with Engine.new_async_session() as session:
+        result = await session.stream(_export_query(filters))
+        async for rows in result.partitions(SHOW_EXPORT_BATCH_SIZE):
+            yield [to_show_record(row, row.cast, row.listed_in) for row in rows]
+
+
+@shows_router.get('/export')
+async def export(format: Optional[str] = 'ndjson', filter: Optional[List[str]] = Query(default=[])):
+    """
+    stream every show in id order
+    - **format**: ndjson for newline delimited JSON shows, or csv with a header row in the format of
+      datasource/netflix_titles.csv that can be posted to /shows/bulk. cast and listed_in are comma separated in csv
+    - **filter**: export shows matching filters as list_shows does. filter can be used more than once
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f'invalid format parameter {format}')
+    filters = parse_filters(filter)
+    media_type = EXPORT_FORMATS[format]
+    return StreamingResponse(RECORD_WRITERS[media_type](_export_batches(filters)), media_type=media_type)
+
+
+def _show_version(session, show_id: int) -> int:
+    version = session.query(persistence.Show.version).filter(persistence.Show.id == show_id).scalar()
+    if version is None:
+        raise HTTPException(status_code=404, detail='show not found')
+    return version
+
+
+def _get(session, show_id: int) -> Tuple[int, Show]:
+    shows = hydrated_shows(session).filter(persistence.Show.id == show_id).all()
+    if len(shows) > 1:
+        raise HTTPException(status_code=500, detail='unexpected number of shows found')
+    if len(shows) < 1:
+        raise HTTPException(status_code=404, detail='show not found')
+    return shows[0][0].version, to_show(*shows[0])
 
 
 @shows_router.get('/{show_id}', response_model=Show)
-async def get(show_id: int):
+async def get(show_id: int, request: Request = None, response: Response = None):
     """
     return the show with the given id
     - **show_id**: return the show with this show_id
+
+    responses carry the show's ETag and If-None-Match is answered with 304 without loading the show
     """
-    with Engine.new_session() as session:
-        shows = session.query(persistence.Show).filter_by(id=show_id).all()
-        if len(shows) > 1:
-            raise HTTPException(status_code=500, detail='unexpected number of shows found')
-        if len(shows) < 1:
+    if show_replica.enabled:
+        snapshot = await show_replica.snapshot()
+        db_show = snapshot.get(show_id)
+        if db_show is None:
             raise HTTPException(status_code=404, detail='show not found')
-        return from_db_show(session, shows[0].id)
+        etag = etags.show_etag(show_id, db_show.version)
+        if etags.matches(etags.if_none_match(request), etag):
+            return etags.not_modified(etag)
+        if response is not None:
+            response.headers['ETag'] = etag
+        return json_response(snapshot.record(db_show), response)
+
+    if_none_match = etags.if_none_match(request)
+    version = None
+    if if_none_match:
+        async with Engine.new_async_session() as session:
+            version = await session.run_sync(_show_version, show_id)
+        etag = etags.show_etag(show_id, version)
+        if etags.matches(if_none_match, etag):
+            return etags.not_modified(etag)
+
+    cached = show_cache.get(show_id)
+    if cached is None or (version is not None and cached[0] != version):
+        epoch = show_cache.epoch
+        async with Engine.new_async_session() as session:
+            cached = await session.run_sync(_get, show_id)
+        show_cache.set(show_id, cached, epoch)
+    version, show = cached
+    if response is not None:
+        response.headers['ETag'] = etags.show_etag(show_id, version)
+    return show
+
+
+def _check_if_match(if_match: Optional[str], db_show: persistence.Show):
+    if if_match is not None and not etags.matches(if_match, etags.show_etag(db_show.id, db_show.version), weak=False):
+        raise HTTPException(status_code=412, detail='show has been modified')
+
+
+def _put(session, show_id: int, show: Show, if_match: Optional[str] = None) -> Tuple[int, Show]:
+    # the row lock keeps concurrent updates of the show from reading the same version
+    shows = session.query(persistence.Show).filter_by(id=show_id).with_for_update().all()
+    if len(shows) > 1:
+        raise HTTPException(status_code=500, detail='unexpected number of shows found')
+    if len(shows) < 1:
+        raise HTTPException(status_code=404, detail='show not found')
+    _check_if_match(if_match, shows[0])
+
+    previous_type = shows[0].type
+    if show.type:
+        shows[0].type = show.type
+    if show.title:
+        shows[0].title = show.title
+    if show.director:
+        shows[0].director = show.director
+    if show.cast:
+        shows[0].cast = ','.join(show.cast)
+    if show.country:
+        shows[0].country = show.country
+    if show.date_added:
+        shows[0].date_added = show.date_added
+    if show.release_year:
+        shows[0].release_year = show.release_year
+    if show.rating:
+        shows[0].rating = show.rating
+    if show.duration:
+        shows[0].duration = show.duration
+    if show.description:
+        shows[0].description = show.description
+    db_values = {c: getattr(shows[0], c) for c in ['release_year', 'date_added', 'duration']}
+    for column, value in typed.typed_values(db_values).items():
+        setattr(shows[0], column, value)
+    update_cast(session, show_id, show.cast)
+    search.refresh(session, [show_id])
+    added, removed = update_listed_in(session, show_id, show.listed_in)
+    counters.adjust(session, counters.merge(
+        counters.deltas(previous_type, removed, -1),
+        counters.deltas(shows[0].type, added)
+    ))
+    shows[0].version = shows[0].version + 1
+    counters.bump_catalog_version(session)
+    session.commit()
+    return shows[0].version, from_db_show(session, shows[0].id)
 
 
 @shows_router.put('/{show_id}', response_model=Show)
-async def put(show_id: int, show: Show):
+async def put(show_id: int, show: Show, request: Request = None, response: Response = None):
     """
     update the show with the given show_id
     - **show_id**: the id of the show to update
     - **show**: body containing fields to update
+
+    an If-Match header that does not match the show's current ETag fails the update with 412
     """
-    with Engine.new_session() as session:
-        shows = session.query(persistence.Show).filter_by(id=show_id).all()
-        if len(shows) > 1:
-            raise HTTPException(status_code=500, detail='unexpected number of shows found')
-        if len(shows) < 1:
-            raise HTTPException(status_code=404, detail='show not found')
+    async with Engine.new_async_session() as session:
+        version, updated = await session.run_sync(_put, show_id, show, etags.if_match(request))
+    show_cache.invalidate(show_id)
+    show_replica.invalidate()
+    if response is not None:
+        response.headers['ETag'] = etags.show_etag(show_id, version)
+    return updated
+
+
+# the columns in a show's search document besides its cast
+SEARCHED_COLUMNS = {'title', 'director', 'description'}
 
-        if show.type:
-            shows[0].type = show.type
-        if show.title:
-            shows[0].title = show.title
-        if show.director:
-            shows[0].director = show.director
-        if show.cast:
-            shows[0].cast = ','.join(show.cast)
-        if show.country:
-            shows[0].country = show.country
-        if show.date_added:
-            shows[0].date_added = show.date_added
-        if show.release_year:
-            shows[0].release_year = show.release_year
-        if show.rating:
-            shows[0].rating = show.rating
-        if show.duration:
-            shows[0].duration = show.duration
-        if show.description:
-            shows[0].description = show.description
-        update_cast(session, show_id, show, shows[0])
-        update_listed_in(session, show_id, show, shows[0])
-        session.commit()
-        return from_db_show(session, shows[0].id)
+
+def _patch(session, show_id: int, patch: ShowPatch, if_match: Optional[str] = None) -> Tuple[int, Show]:
+    values = patch.dict(exclude_unset=True)
+    cast = values.pop('cast', None)
+    listed_in = values.pop('listed_in', None)
+    values.update(typed.typed_values(values))
+    # lock the show in a CTE so the previous type is read from the row version being updated
+    previous = select(persistence.Show.id, persistence.Show.type).where(
+        persistence.Show.id == show_id).with_for_update().cte('previous')
+    row = session.execute(
+        update(persistence.Show.__table__)
+        .where(persistence.Show.id == previous.c.id)
+        .values(**values, version=persistence.Show.version + 1)
+        .returning(persistence.Show.version, persistence.Show.type, previous.c.type)
+    ).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail='show not found')
+    version, show_type, previous_type = row
+    if if_match is not None and not etags.matches(if_match, etags.show_etag(show_id, version - 1), weak=False):
+        session.rollback()
+        raise HTTPException(status_code=412, detail='show has been modified')
+
+    if cast is not None:
+        update_cast(session, show_id, cast)
+    if cast is not None or SEARCHED_COLUMNS & values.keys():
+        search.refresh(session, [show_id])
+    added, removed = [], []
+    if listed_in is not None:
+        added, removed = update_listed_in(session, show_id, listed_in)
+    counters.adjust(session, counters.merge(
+        counters.deltas(previous_type, removed, -1),
+        counters.deltas(show_type, added)
+    ))
+    counters.bump_catalog_version(session)
+    session.commit()
+    return _get(session, show_id)
+
+
+@shows_router.patch('/{show_id}', response_model=Show)
+async def patch(show_id: int, show: ShowPatch, request: Request = None, response: Response = None):
+    """
+    update only the fields sent for the show with the given show_id
+    - **show_id**: the id of the show to update
+    - **show**: body containing only the fields to change. cast and listed_in replace the show's cast and listings
+
+    an If-Match header that does not match the show's current ETag fails the update with 412
+    """
+    async with Engine.new_async_session() as session:
+        version, updated = await session.run_sync(_patch, show_id, show, etags.if_match(request))
+    show_cache.invalidate(show_id)
+    show_replica.invalidate()
+    if response is not None:
+        response.headers['ETag'] = etags.show_etag(show_id, version)
+    return updated
+
+
+def _create(session, show: ShowCreate) -> Tuple[int, Show]:
+    show_id, = insert_shows(session, [show])
+    session.commit()
+    return _get(session, show_id)
 
 
 @shows_router.post('/', response_model=Show)
-async def create(show: ShowCreate):
+async def create(show: ShowCreate, response: Response = None):
     """
     create a show
     - **show**: create a show with these fields. The fields type and title are required.
     """
-    if not show.date_added:
-        show.date_added = datetime.datetime.utcnow().strftime('%B %m %Y')
-    db_show = to_db_show(show)
-    with Engine.new_session() as session:
-        session.add(db_show)
-        update_cast(session, db_show.id, show, db_show)
-        update_listed_in(session, db_show.id, show, db_show)
+    async with Engine.new_async_session() as session:
+        version, created = await session.run_sync(_create, default_date_added(show))
+    show_replica.invalidate()
+    if response is not None:
+        response.headers['ETag'] = etags.show_etag(created.id, version)
+    return created
+
+
+def _flush_batch(session, batch: List[Tuple[int, ShowCreate]], errors: List[dict]) -> int:
+    try:
+        insert_shows(session, [show for _, show in batch])
+        session.commit()
+        return len(batch)
+    except DBAPIError as e:
+        session.rollback()
+        errors.extend({'line': line, 'error': str(e.orig)} for line, _ in batch)
+        return 0
+
+
+@shows_router.post('/bulk')
+async def bulk_create(request: Request, batch_size: Optional[int] = 500):
+    """
+    create shows from a streamed request body and return the number of shows created along with per-line errors
+    - **body**: newline delimited JSON shows (application/x-ndjson) or csv with a header row in the format of
+      datasource/netflix_titles.csv (text/csv). cast and listed_in are comma separated in csv
+    - **batch_size**: the number of shows inserted and committed together, at most MAX_BULK_BATCH_SIZE
+    """
+    content_type = request.headers.get('content-type', 'application/x-ndjson').split(';')[0].strip()
+    if content_type not in RECORD_READERS:
+        raise HTTPException(status_code=415, detail=f'unsupported content type {content_type}')
+    if not 1 <= batch_size <= MAX_BULK_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400, detail=f'invalid batch_size parameter {batch_size}, it must be 1 to {MAX_BULK_BATCH_SIZE}')
+
+    created = 0
+    errors = []
+    batch = []
+    async with Engine.new_async_session() as session:
+        async for line, record, error in RECORD_READERS[content_type](request.stream()):
+            if error is None:
+                try:
+                    batch.append((line, default_date_added(ShowCreate(**record))))
+                except ValidationError as e:
+                    error = e
+            if error is not None:
+                errors.append({'line': line, 'error': str(error)})
+            if len(batch) >= batch_size:
+                created += await session.run_sync(_flush_batch, batch, errors)
+                batch = []
+        if batch:
+            created += await session.run_sync(_flush_batch, batch, errors)
+    show_replica.invalidate()
+    return {'created': created, 'errors': errors}
+
+
+def _bulk_delete_statement(filters: List[Filter]):
+    """
+    return one statement deleting the shows matching the filters and selecting the counter changes for them, the
+    number of shows deleted per type and of their listings per genre, so the shows' ids never leave the database
+    """
+    # lock the matching shows so the counters are adjusted for exactly the shows deleted
+    doomed = apply_filters(select(persistence.Show.id), filters).with_for_update().cte('doomed')
+    deleted = (
+        persistence.Show.__table__.delete().where(persistence.Show.id == doomed.c.id).returning(persistence.Show.type)
+        .cte('deleted')
+    )
+    # shows without a type share the counter of shows with an empty type, as in counters.deltas. The empty string is
+    # inlined so the grouped expression is the selected one, bound parameters never compare equal
+    show_type = func.coalesce(deleted.c.type, literal_column("''"))
+    # every part of the statement sees the shows as they were before it, so the listings are still there to count
+    return union_all(
+        select(literal(counters.TYPE), show_type, func.count()).group_by(show_type),
+        select(literal(counters.LISTED_IN), persistence.Genre.name, func.count())
+        .join_from(persistence.ListedIn, doomed, persistence.ListedIn.id == doomed.c.id)
+        .join(persistence.Genre, persistence.Genre.id == persistence.ListedIn.genre_id)
+        .group_by(persistence.Genre.name),
+    )
+
+
+def _bulk_delete(session, filters: List[Filter]) -> dict:
+    totals = session.execute(_bulk_delete_statement(filters)).all()
+    deleted = sum(total for kind, _, total in totals if kind == counters.TYPE)
+    if not deleted:
+        return {'deleted': 0}
+    counters.adjust(session, counters.merge(
+        {(counters.TOTAL, ''): -deleted}, *[{(kind, key): -total} for kind, key, total in totals]))
+    counters.bump_catalog_version(session)
+    session.commit()
+    return {'deleted': deleted}
+
+
+@shows_router.delete('')
+async def bulk_delete(filter: Optional[List[str]] = Query(default=[])):
+    """
+    delete every show matching the filters, or every show when there are no filters, and return the number deleted
+    - **filter**: delete shows with fields like these filters. filter can be used more than once
+    """
+    filters = parse_filters(filter)
+    async with Engine.new_async_session() as session:
+        deleted = await session.run_sync(_bulk_delete, filters)
+    show_cache.clear()
+    show_replica.invalidate()
+    return deleted
+
+
+def _delete(session, show_id: int, if_match: Optional[str] = None):
+    shows = session.query(persistence.Show).filter_by(id=show_id).with_for_update().all()
+    if len(shows) > 1:
+        raise HTTPException(status_code=500, detail='unexpected number of shows to delete')
+    if len(shows) < 1 and if_match is not None:
+        raise HTTPException(status_code=412, detail='show not found')
+    if len(shows) == 1:
+        _check_if_match(if_match, shows[0])
+        listings = (
+            session.query(persistence.Genre.name)
+            .join(persistence.ListedIn, persistence.ListedIn.genre_id == persistence.Genre.id)
+            .filter(persistence.ListedIn.id == show_id)
+            .all()
+        )
+        counters.adjust(session, counters.deltas(shows[0].type, [listing for listing, in listings], -1))
+        session.delete(shows[0])
+        counters.bump_catalog_version(session)
         session.commit()
-        return from_db_show(session, db_show.id)
 
 
 @shows_router.delete('/{show_id}')
-async def delete(show_id: int):
+async def delete(show_id: int, request: Request = None):
     """
     delete the show with the given id
     - **show_id**: the show with this id will be deleted
+
+    an If-Match header that does not match the show's current ETag fails the delete with 412
     """
-    with Engine.new_session() as session:
-        shows = session.query(persistence.Show).filter_by(id=show_id).all()
-        if len(shows) > 1:
-            raise HTTPException(status_code=500, detail='unexpected number of shows to delete')
-        if len(shows) == 1:
-            session.delete(shows[0])
-            session.commit()
+    async with Engine.new_async_session() as session:
+        await session.run_sync(_delete, show_id, etags.if_match(request))
+    show_cache.invalidate(show_id)
+    show_replica.invalidate()
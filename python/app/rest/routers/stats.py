@@ -0,0 +1,37 @@
+from fastapi import APIRouter
+
+from app import Engine
+from app.cache import show_cache
+from app.rest.replica import show_replica
+from app.rest.timing import TimedRoute
+
+stats_router = APIRouter(
+    prefix='/stats',
+    tags=['stats'],
+    responses={404: {'description': 'Not found'}},
+    route_class=TimedRoute,
+)
+
+
+@stats_router.get('/pool')
+async def pool_stats():
+    """
+    return the size, usage and checkout wait times of the database connection pools
+    """
+    return Engine.pool_stats()
+
+
+@stats_router.get('/cache')
+async def cache_stats():
+    """
+    return the hit, miss and eviction counts of this worker's cache of shows
+    """
+    return show_cache.stats()
+
+
+@stats_router.get('/replica')
+async def replica_stats():
+    """
+    return the version, size and load counts of this worker's snapshot of the catalog
+    """
+    return show_replica.stats()
@@ -1,57 +1,40 @@
-import os
-import sys
+from fastapi import APIRouter, Request, Response
 
-from fastapi import APIRouter
-
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-
-from app import Engine, persistence
+from app import Engine
+from app.persistence import counters
+from app.rest import etags
+from app.rest.replica import show_replica
+from app.rest.timing import TimedRoute
 
 summary_router = APIRouter(
     prefix='/summary',
     tags=['shows_summary'],
     responses={404: {'description': 'Not found'}},
+    route_class=TimedRoute,
 )
 
 
-def _total(session) -> int:
-    return session.query(persistence.Show).count()
-
-
-def _total_for_listed_in(session, listed_in: str) -> int:
-    return session.query(persistence.ListedIn).filter(persistence.ListedIn.listed_in == listed_in).count()
-
-
-def _listed_in_totals(session) -> dict:
-    return {
-        listing.listed_in: _total_for_listed_in(session, listing.listed_in)
-        for listing in session.query(persistence.ListedIn).distinct(persistence.ListedIn.listed_in).all()
-    }
-
-
-def _total_for_type(session, show_type: str) -> int:
-    return session.query(persistence.Show).filter(persistence.Show.type == show_type).count()
-
-
-def _type_totals(session) -> dict:
-    return {
-        show.type: _total_for_type(session, show.type)
-        for show in session.query(persistence.Show).distinct(persistence.Show.type).all()
-    }
-
-
 def _summarize(session) -> dict:
-    return {
-        'total': _total(session),
-        'total_by_listed_in': _listed_in_totals(session),
-        'total_by_type': _type_totals(session)
-    }
+    return counters.summary(session)
 
 
 @summary_router.get('')
-async def shows_summary():
+async def shows_summary(request: Request = None, response: Response = None):
     """
     return aggregated data for the shows managed by this service
     """
-    with Engine.new_session() as session:
-        return _summarize(session)
+    if show_replica.enabled:
+        snapshot = await show_replica.snapshot()
+        if response is not None:
+            etag = etags.catalog_etag(snapshot.version)
+            if etags.matches(etags.if_none_match(request), etag):
+                return etags.not_modified(etag)
+            response.headers['ETag'] = etag
+        return snapshot.summary
+    async with Engine.new_async_session() as session:
+        if response is not None:
+            etag = etags.catalog_etag(await session.run_sync(counters.catalog_version))
+            if etags.matches(etags.if_none_match(request), etag):
+                return etags.not_modified(etag)
+            response.headers['ETag'] = etag
+        return await session.run_sync(_summarize)
@@ -0,0 +1,67 @@
+import functools
+
+from fastapi.routing import APIRoute
+
+from app import metrics
+from app.metrics import request_metrics
+
+
+def _timed(endpoint):
+    @functools.wraps(endpoint)
+    async def timed_endpoint(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            timings = metrics.current_timings()
+            if timings is not None:
+                timings.endpoint_returned()
+    return timed_endpoint
+
+
+class TimedRoute(APIRoute):
+    """
+    a route that labels the current request's timings with its path template, and notes when its endpoint returns so
+    the time FastAPI then spends serializing the response can be told apart
+    """
+    def get_route_handler(self):
+        # the dependant was built from the endpoint itself, so only the call is wrapped
+        self.dependant.call = _timed(self.endpoint)
+        return super().get_route_handler()
+
+    async def handle(self, scope, receive, send):
+        timings = metrics.current_timings()
+        if timings is not None:
+            timings.route = self.path_format
+        await super().handle(scope, receive, send)
+
+
+class MetricsMiddleware:
+    """
+    times every http request, adds a Server-Timing header to its response and records it in this worker's metrics
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        timings, token = metrics.start_request()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                timings.response_started()
+                if metrics.SERVER_TIMING:
+                    headers = list(message.get('headers', []))
+                    headers.append((b'server-timing', timings.server_timing().encode('latin-1')))
+                    message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.end_request(token)
+            request_metrics.record(scope['method'], timings, status)
@@ -0,0 +1,2 @@
+# pytest puts the directory holding this file on sys.path, so tests import the app and lib packages without patching
+# sys.path themselves
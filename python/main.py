@@ -0,0 +1,19 @@
+# the cloud function that applies database migrations while deploying. It runs on the VPC connector, since the
+# database only has a private IP, and terraform calls it after creating a version of the app and before moving traffic
+# to that version
+import logging
+
+from app import Engine, init_logging
+from app.persistence import migrations
+
+
+def migrate(request) -> str:
+    init_logging()
+    Engine.get_engine()
+    try:
+        applied = migrations.migrate(Engine.engine())
+    finally:
+        Engine.shutdown()
+    message = f'applied migrations {applied}' if applied else 'the database schema is up to date'
+    logging.info(message)
+    return message
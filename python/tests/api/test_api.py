@@ -11,7 +11,6 @@ import unittest
 
 import uuid
 
-sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
 
 TEST_DIR = os.path.dirname(__file__)
 CSV_FILE = os.path.join(TEST_DIR, '../..', '..', 'datasource', 'netflix_titles.csv')
@@ -58,16 +57,9 @@ class TestApi(unittest.TestCase):
 
     @classmethod
     def delete_all(cls):
-        while True:
-            response = requests.get(SHOWS_API)
-            response.raise_for_status()
-            shows = response.json()
-            if not shows:
-                break
-            for s in response.json():
-                cls.logger.info(f'deleting show {s["title"]}')
-                requests.delete(cls.to_url(s)).raise_for_status()
-                cls.logger.info(f'deleted show {s["title"]}')
+        response = requests.delete(SHOWS_API)
+        response.raise_for_status()
+        cls.logger.info(f'deleted {response.json()["deleted"]} shows')
 
     @classmethod
     def setUpClass(cls) -> None:
@@ -162,6 +154,21 @@ class TestApi(unittest.TestCase):
         response = requests.get(show_url)
         assert response.status_code == 404
 
+    def test_patch(self):
+        show_url = self.to_url(self.create_for_test(TEST_SHOW))
+        etag = requests.get(show_url).headers['ETag']
+
+        response = requests.patch(show_url, json={'director': 'Someone Else'}, headers={'If-Match': etag})
+        expected = copy.deepcopy(TEST_SHOW)
+        expected['director'] = 'Someone Else'
+        self.assert_response(expected, response)
+        self.assertNotEqual(etag, response.headers['ETag'])
+
+        # the show changed since etag was read
+        response = requests.patch(show_url, json={'director': 'Nobody'}, headers={'If-Match': etag})
+        self.assertEqual(412, response.status_code)
+        self.assert_show(expected, self.get(show_url))
+
     def test_create_required_fields_only(self):
         show = {
             'type': 'TV Show',
@@ -185,6 +192,52 @@ class TestApi(unittest.TestCase):
         response_json = response.json()
         assert len(response_json) == 0
 
+    def test_filter_operators(self):
+        self.create_for_test(TEST_SHOW)
+
+        title = f'title[eq]={TEST_SHOW["title"]}'
+        for f, expected in [
+            ('cast[eq]=John Travolta', 1),
+            ('cast[ne]=John Travolta', 0),
+            ('cast[prefix]=John T', 1),
+            ('listed_in[in]=Dramas, TV Shows', 1),
+            ('release_year>=1976', 0),
+        ]:
+            response = requests.get(SHOWS_API, params={'filter': [title, f]})
+            response.raise_for_status()
+            response_json = response.json()
+            assert len(response_json) == expected, f'unexpected response for {f}:\n{json.dumps(response_json)}'
+
+    def test_search(self):
+        created_show = self.create_for_test(TEST_SHOW)
+
+        for q in ['kotter', 'travolta', 'sweathogs', '"welcome back" -zebra']:
+            response = requests.get(f'{SHOWS_API}/search', params={'q': q})
+            response.raise_for_status()
+            assert [s['id'] for s in response.json()] == [created_show['id']], f'unexpected response for {q}'
+
+        response = requests.patch(self.to_url(created_show), json={'title': 'Welcome Back, Zebra'})
+        response.raise_for_status()
+        response = requests.get(f'{SHOWS_API}/search', params={'q': '"welcome back" -zebra'})
+        response.raise_for_status()
+        assert response.json() == []
+
+    def test_export(self):
+        created_show = self.create_for_test(TEST_SHOW)
+        params = {'filter': f'title[eq]={TEST_SHOW["title"]}'}
+
+        response = requests.get(f'{SHOWS_API}/export', params=params)
+        response.raise_for_status()
+        assert [json.loads(line) for line in response.text.splitlines()] == [created_show]
+
+        response = requests.get(f'{SHOWS_API}/export', params={**params, 'format': 'csv'})
+        response.raise_for_status()
+        rows = list(csv.DictReader(response.text.splitlines()))
+        assert len(rows) == 1
+        assert rows[0]['show_id'] == str(created_show['id'])
+        assert rows[0]['cast'] == ', '.join(created_show['cast'])
+        assert rows[0]['description'] == created_show['description']
+
     def test_double_delete(self):
         created_show = self.create_for_test(TEST_SHOW)
 
@@ -192,6 +245,23 @@ class TestApi(unittest.TestCase):
         self.delete(show_url)
         self.delete(show_url)
 
+    def test_bulk_delete(self):
+        prefix = str(uuid.uuid4())
+        for i in range(3):
+            show = copy.deepcopy(TEST_SHOW)
+            show['title'] = f'{prefix} {i}'
+            self.create_for_test(show)
+
+        total = self.get_summary()['total']
+        response = requests.delete(SHOWS_API, params={'filter': f'title={prefix}%'})
+        response.raise_for_status()
+        self.assertDictEqual({'deleted': 3}, response.json())
+
+        response = requests.get(SHOWS_API, params={'filter': f'title={prefix}%'})
+        response.raise_for_status()
+        self.assertListEqual([], response.json())
+        self.assertEqual(total - 3, self.get_summary()['total'])
+
     def test_summary(self):
         summary_show = copy.deepcopy(TEST_SHOW)
         listings = [str(uuid.uuid4()), str(uuid.uuid4())]
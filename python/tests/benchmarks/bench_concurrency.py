@@ -0,0 +1,73 @@
+import os
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.append(os.path.dirname(__file__))
+
+from common import latency_stats, report
+
+TEST_URL = os.getenv('TEST_URL', 'http://localhost:8000')
+CLIENTS = int(os.getenv('BENCH_CLIENTS', '100'))
+REQUESTS_PER_CLIENT = int(os.getenv('BENCH_REQUESTS_PER_CLIENT', '20'))
+PATHS = ['/shows?limit=50', '/shows?limit=50&sort=release_year&filter=type=Movie', '/summary']
+# seconds between the requests of the client probing /alive while the others load the service
+PROBE_INTERVAL = float(os.getenv('BENCH_PROBE_INTERVAL', '0.05'))
+
+
+def _client(path: str) -> list:
+    samples = []
+    with requests.Session() as session:
+        for _ in range(REQUESTS_PER_CLIENT):
+            start = time.perf_counter()
+            session.get(f'{TEST_URL}{path}').raise_for_status()
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _probe(stop: threading.Event) -> list:
+    """
+    request /alive, which never touches the database, until stop is set. Its latency is the time the event loop takes
+    to get to a request, so it grows with the time handlers block the loop rather than with the database
+    """
+    samples = []
+    with requests.Session() as session:
+        while not stop.is_set():
+            start = time.perf_counter()
+            session.get(f'{TEST_URL}/alive').raise_for_status()
+            samples.append((time.perf_counter() - start) * 1000)
+            stop.wait(PROBE_INTERVAL)
+    return samples
+
+
+def main():
+    """
+    measure latency under CLIENTS parallel clients against a running service. Run it against the service before and
+    after a change, e.g. make run-app followed by python python/tests/benchmarks/bench_concurrency.py
+    """
+    try:
+        requests.get(f'{TEST_URL}/alive').raise_for_status()
+    except requests.RequestException:
+        print(f'skipping: no shows service is running at {TEST_URL}')
+        return
+    print(f'{CLIENTS} clients x {REQUESTS_PER_CLIENT} requests against {TEST_URL}')
+    with ThreadPoolExecutor(max_workers=CLIENTS) as executor, ThreadPoolExecutor(max_workers=1) as prober:
+        for path in PATHS:
+            stop = threading.Event()
+            probe = prober.submit(_probe, stop)
+            start = time.perf_counter()
+            results = list(executor.map(_client, [path] * CLIENTS))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            samples = [s for r in results for s in r]
+            report(path, latency_stats(samples))
+            print(f'{"":<40} {len(samples) / elapsed:9.1f} requests/s')
+            report('  /alive meanwhile', latency_stats(probe.result()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import sys
+
+from fastapi import Response
+
+sys.path.append(os.path.dirname(__file__))
+
+from common import report, seed_catalog, timed_async
+from app import Engine
+from app.rest.routers.shows import _count, list_shows
+from app.rest.filters import parse_filters
+
+REPEAT = int(os.getenv('BENCH_REPEAT', '20'))
+PAGE_SIZE = int(os.getenv('BENCH_PAGE_SIZE', '35'))
+FILTERS = {
+    'unfiltered': [],
+    'release_year>=2015': ['release_year>=2015'],
+    'cast[eq]=Tom Hanks': ['cast[eq]=Tom Hanks'],
+}
+
+
+async def _list(count: str, filter: list) -> Response:
+    response = Response()
+    await list_shows(response=response, limit=PAGE_SIZE, sort=['title'], filter=filter, count=count)
+    return response
+
+
+async def _list_then_count(filter: list):
+    """
+    a page followed by a separate COUNT(*), the second round trip exact counts replace
+    """
+    await _list('none', filter)
+    async with Engine.new_async_session() as session:
+        await session.run_sync(_count, parse_filters(filter))
+
+
+async def _benchmark():
+    Engine.get_async_engine()
+    for name, filter in FILTERS.items():
+        for count in ['none', 'exact', 'estimate']:
+            headers = (await _list(count, filter)).headers
+            total = headers.get('X-Total-Count') or headers.get('X-Total-Count-Estimate', '')
+            report(f'{name} (count={count}) {total}', await timed_async(lambda: _list(count, filter), REPEAT))
+        report(f'{name} (page then COUNT)', await timed_async(lambda: _list_then_count(filter), REPEAT))
+    await Engine.dispose_async_engine()
+
+
+def main():
+    print(f'seeded {seed_catalog()} shows, {PAGE_SIZE} shows per page')
+    asyncio.run(_benchmark())
+
+
+if __name__ == '__main__':
+    main()
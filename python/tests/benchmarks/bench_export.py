@@ -0,0 +1,81 @@
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+import orjson
+from fastapi import Response
+
+sys.path.append(os.path.dirname(__file__))
+
+from common import seed_catalog
+from app import Engine
+from app.rest.routers import shows
+from app.rest.routers.shows import _export_query, export, list_shows, to_show_record
+
+PAGE_SIZE = int(os.getenv('BENCH_PAGE_SIZE', '50'))
+
+
+async def _page_through() -> int:
+    """
+    every show read by following the cursors of GET /shows, the way the catalog was dumped before /shows/export
+    """
+    total = 0
+    cursor = None
+    while True:
+        response = Response()
+        page = orjson.loads(
+            (await list_shows(response=response, limit=PAGE_SIZE, cursor=cursor, sort=['id'], filter=[])).body)
+        total += len(page)
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return total
+
+
+async def _fetch_all() -> int:
+    """
+    every show fetched at once and serialized in one body, what the export avoids holding in memory
+    """
+    async with Engine.new_async_session() as session:
+        rows = (await session.execute(_export_query([]))).all()
+    return len(b''.join(orjson.dumps(to_show_record(row, row.cast, row.listed_in)) + b'\n' for row in rows))
+
+
+async def _export(format: str) -> int:
+    response = await export(format=format, filter=[])
+    return sum([len(chunk) async for chunk in response.body_iterator])
+
+
+async def _measure(name: str, fn):
+    start = time.perf_counter()
+    result = await fn()
+    elapsed = time.perf_counter() - start
+    # traced separately since tracing slows allocation down
+    tracemalloc.start()
+    await fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:45} {elapsed * 1000:8.1f}ms peak={peak / 1024 / 1024:6.2f}MiB ({result})')
+
+
+async def _benchmark():
+    Engine.get_async_engine()
+    # warm the pool and the catalog's pages in the database's cache
+    await _export('ndjson')
+    await _measure(f'GET /shows pages of {PAGE_SIZE} (shows)', _page_through)
+    await _measure('fetch all then serialize (bytes)', _fetch_all)
+    for batch_size in [100, 1000, 10000]:
+        shows.SHOW_EXPORT_BATCH_SIZE = batch_size
+        for format in ['ndjson', 'csv']:
+            await _measure(f'export {format}, batches of {batch_size} (bytes)', lambda: _export(format))
+    await Engine.dispose_async_engine()
+
+
+def main():
+    print(f'seeded {seed_catalog()} shows')
+    asyncio.run(_benchmark())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import os
+import sys
+
+from sqlalchemy import func
+
+sys.path.append(os.path.dirname(__file__))
+
+from common import report, seed_catalog, timed
+from app import Engine, persistence
+from app.rest.facets import facet_counts
+from app.rest.filters import apply_filters, parse_filters
+
+REPEAT = int(os.getenv('BENCH_REPEAT', '20'))
+FILTERS = parse_filters(['release_year>=2015'])
+
+
+def _per_value_counts(session) -> dict:
+    """
+    type, rating and listed_in counted the way the summary was before GROUP BY aggregation: one COUNT per value
+    """
+    def count(q):
+        return apply_filters(q, FILTERS).count()
+
+    shows = session.query(persistence.Show)
+    counts = {}
+    for name in ['type', 'rating']:
+        column = persistence.Show.__dict__[name]
+        values = [v for v, in apply_filters(session.query(column).distinct(), FILTERS).all() if v]
+        counts[name] = {v: count(shows.filter(column == v)) for v in values}
+    genres = session.query(persistence.Genre).all()
+    counts['listed_in'] = {
+        g.name: count(shows.join(persistence.ListedIn).filter(persistence.ListedIn.genre_id == g.id)) for g in genres
+    }
+    counts['listed_in'] = {k: v for k, v in counts['listed_in'].items() if v}
+    return counts
+
+
+def main():
+    print(f'seeded {seed_catalog()} shows, filtered by {FILTERS}')
+    with Engine.new_session() as session:
+        genres = session.query(func.count(persistence.Genre.id)).scalar()
+        print(f'{genres} listings')
+        facets = ['type', 'rating', 'listed_in']
+        grouped = facet_counts(session, FILTERS, facets)
+        assert grouped == _per_value_counts(session), 'facet counts differ'
+        report('type,rating,listed_in (per value)', timed(lambda: _per_value_counts(session), REPEAT))
+        report('type,rating,listed_in (GROUPING SETS)', timed(lambda: facet_counts(session, FILTERS, facets), REPEAT))
+        for facet in ['type', 'listed_in', 'country']:
+            report(f'{facet} (GROUPING SETS)', timed(lambda: facet_counts(session, FILTERS, [facet]), REPEAT))
+        facets = ['type', 'listed_in', 'rating', 'country']
+        report('all facets (GROUPING SETS)', timed(lambda: facet_counts(session, FILTERS, facets), REPEAT))
+        report('all facets, unfiltered (GROUPING SETS)', timed(lambda: facet_counts(session, [], facets), REPEAT))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import collections
+import os
+import statistics
+import subprocess
+import sys
+
+PYTHON_DIR = os.path.join(os.path.dirname(__file__), '..', '..')
+REPEAT = int(os.getenv('BENCH_REPEAT', '10'))
+# fail when importing the service takes longer than this, which it did while the Secret Manager client was imported
+# unconditionally
+IMPORT_LIMIT_MS = float(os.getenv('BENCH_IMPORT_LIMIT_MS', '1000'))
+# modules only needed on Google Cloud, which local runs and tests shouldn't import
+CLOUD_MODULES = ['google.cloud.secretmanager']
+
+IMPORT = f'''
+import sys
+import time
+start = time.perf_counter()
+import app.main
+print((time.perf_counter() - start) * 1000)
+print(','.join(m for m in {CLOUD_MODULES!r} if m in sys.modules))
+'''
+
+
+def _import_app() -> (float, str, str):
+    """
+    import app.main in a new interpreter and return the milliseconds it took, the cloud modules it imported and the
+    -X importtime report
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', IMPORT], cwd=PYTHON_DIR, capture_output=True, text=True, check=True)
+    import_ms, cloud_modules = result.stdout.splitlines()
+    return float(import_ms), cloud_modules, result.stderr
+
+
+def _self_time_by_package(importtime: str) -> dict:
+    """
+    sum the microseconds spent importing each top level package's modules, excluding the modules they import
+    """
+    totals = collections.Counter()
+    for line in importtime.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us)
+    return totals
+
+
+def main():
+    samples = [_import_app() for _ in range(REPEAT)]
+    import_ms = statistics.median(ms for ms, _, _ in samples)
+    print(f'import app.main median={import_ms:.1f}ms min={min(ms for ms, _, _ in samples):.1f}ms')
+    for package, us in _self_time_by_package(samples[-1][2]).most_common(10):
+        print(f'  {package:30} {us / 1000:7.1f}ms')
+
+    failures = []
+    if import_ms > IMPORT_LIMIT_MS:
+        failures.append(f'importing app.main took {import_ms:.1f}ms, more than {IMPORT_LIMIT_MS:.0f}ms')
+    cloud_modules = samples[-1][1]
+    if cloud_modules:
+        failures.append(f'importing app.main imported {cloud_modules}')
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
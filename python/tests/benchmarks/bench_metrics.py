@@ -0,0 +1,46 @@
+import asyncio
+import os
+import sys
+
+from fastapi import FastAPI
+
+sys.path.append(os.path.dirname(__file__))
+
+from common import asgi_get, report, seed_catalog, timed_async
+from app import Engine
+from app.main import app
+from app.metrics import request_metrics
+from app.rest.routers.shows import shows_router
+from app.rest.routers.summary import summary_router
+
+REPEAT = int(os.getenv('BENCH_REPEAT', '200'))
+
+# the same routes without the middleware timing requests
+uninstrumented = FastAPI()
+uninstrumented.include_router(shows_router)
+uninstrumented.include_router(summary_router)
+
+
+async def main():
+    print(f'seeded {seed_catalog()} shows')
+    Engine.get_async_engine()
+    show_id = (await asgi_get(app, '/shows', 'limit=1')).split(b'"id":')[1].split(b',')[0].decode()
+    requests = [
+        ('GET /shows?limit=50', '/shows', 'limit=50'),
+        ('GET /shows filtered, faceted', '/shows', 'limit=50&filter=type[eq]=Movie&facets=type,rating&count=exact'),
+        ('GET /shows/{show_id}', f'/shows/{show_id}', ''),
+        ('GET /shows/search', '/shows/search', 'q=zombie'),
+        ('GET /summary', '/summary', ''),
+    ]
+    for name, path, query_string in requests:
+        for label, target in [('', uninstrumented), (' timed', app)]:
+            await asgi_get(target, path, query_string)
+            report(f'{name}{label}', await timed_async(lambda: asgi_get(target, path, query_string), REPEAT))
+    print('statements per request')
+    for (method, route), metrics in sorted(request_metrics.routes.items()):
+        print(f'{method} {route:<30} {metrics.statements.sum / metrics.statements.count:5.1f}')
+    await Engine.dispose_async_engine()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+import asyncio
+import os
+import sys
+
+from fastapi import Response
+
+sys.path.append(os.path.dirname(__file__))
+
+from common import report, seed_catalog, timed_async
+from app import Engine
+from app.rest.routers.shows import list_shows
+
+REPEAT = int(os.getenv('BENCH_REPEAT', '20'))
+PAGE_SIZE = int(os.getenv('BENCH_PAGE_SIZE', '35'))
+DEEP_PAGE = 200
+SORT = ['title']
+
+
+async def _list(**kwargs) -> Response:
+    response = Response()
+    await list_shows(response=response, limit=PAGE_SIZE, sort=SORT, filter=[], **kwargs)
+    return response
+
+
+async def _cursor_for_page(page: int) -> str:
+    cursor = None
+    for _ in range(page - 1):
+        cursor = (await _list(cursor=cursor)).headers['X-Next-Cursor']
+    return cursor
+
+
+async def _benchmark():
+    Engine.get_async_engine()
+    deep_cursor = await _cursor_for_page(DEEP_PAGE)
+    report('page 1 (offset)', await timed_async(lambda: _list(offset=0), REPEAT))
+    report('page 1 (cursor)', await timed_async(lambda: _list(cursor=None), REPEAT))
+    report(f'page {DEEP_PAGE} (offset)', await timed_async(lambda: _list(offset=(DEEP_PAGE - 1) * PAGE_SIZE), REPEAT))
+    report(f'page {DEEP_PAGE} (cursor)', await timed_async(lambda: _list(cursor=deep_cursor), REPEAT))
+    await Engine.dispose_async_engine()
+
+
+def main():
+    shows = seed_catalog()
+    print(f'seeded {shows} shows, {PAGE_SIZE} shows per page')
+    assert shows >= DEEP_PAGE * PAGE_SIZE, f'page {DEEP_PAGE} is past the end of the catalog'
+    asyncio.run(_benchmark())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import asyncio
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(__file__))
+
+from common import asgi_get, seed_catalog
+from app import Engine
+from app.main import app
+from app.rest.replica import load, show_replica
+from app.rest.routers.shows import _export_query, to_show_record
+
+SECONDS = float(os.getenv('BENCH_SECONDS', '5'))
+CONCURRENCY = int(os.getenv('BENCH_CONCURRENCY', '10'))
+
+
+async def _memory():
+    """
+    the memory a worker holds for the snapshot, and for the same shows held as the dicts lists are serialized from
+    """
+    async with Engine.new_async_session() as session:
+        # load once first so statement caches aren't counted
+        await session.run_sync(load, 0)
+        (await session.execute(_export_query([]))).all()
+        gc.collect()
+        tracemalloc.start()
+        snapshot = await session.run_sync(load, 0)
+        gc.collect()
+        snapshot_bytes, snapshot_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        tracemalloc.start()
+        rows = (await session.execute(_export_query([]))).all()
+        records = [to_show_record(row, row.cast, row.listed_in) for row in rows]
+        del rows
+        gc.collect()
+        records_bytes, records_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f'{len(snapshot.shows)} shows, {len(records)} as dicts')
+    print(f'snapshot        {snapshot_bytes / 2 ** 20:7.2f}MiB, peak while loading {snapshot_peak / 2 ** 20:6.2f}MiB '
+          f'({snapshot.size() / 2 ** 20:.2f}MiB by getsizeof)')
+    print(f'shows as dicts  {records_bytes / 2 ** 20:7.2f}MiB, peak while loading {records_peak / 2 ** 20:6.2f}MiB')
+    return snapshot
+
+
+async def _throughput(requests) -> float:
+    """
+    send requests from CONCURRENCY clients for SECONDS and return the requests per second
+    """
+    done = 0
+    start = time.perf_counter()
+    deadline = start + SECONDS
+
+    async def client():
+        nonlocal done
+        while time.perf_counter() < deadline:
+            await asgi_get(app, *random.choice(requests))
+            done += 1
+    await asyncio.gather(*[client() for _ in range(CONCURRENCY)])
+    return done / (time.perf_counter() - start)
+
+
+async def main():
+    print(f'seeded {seed_catalog()} shows')
+    Engine.get_async_engine()
+    snapshot = await _memory()
+    ids = [str(s.id) for s in snapshot.shows]
+    endpoints = {
+        'GET /shows?limit=50': [('/shows', 'limit=50')],
+        'GET /shows filtered, counted': [
+            ('/shows', 'limit=50&filter=type[eq]=Movie&filter=release_year>=2015&count=exact')
+        ],
+        'GET /shows?facets': [('/shows', 'limit=20&facets=type,listed_in,rating,country')],
+        'GET /shows/{show_id}': [(f'/shows/{i}', '') for i in ids],
+        'GET /summary': [('/summary', '')],
+    }
+    modes = [
+        ('database', False, 0),
+        ('replica, version checked per request', True, 0),
+        ('replica, version checked every 1s', True, 1),
+    ]
+    print(f'requests/sec with {CONCURRENCY} concurrent clients for {SECONDS:.0f}s')
+    for name, requests in endpoints.items():
+        for mode, enabled, check_interval in modes:
+            show_replica.enabled = enabled
+            show_replica.check_interval = check_interval
+            await asgi_get(app, *requests[0])
+            print(f'{name:<30} {mode:<37} {await _throughput(requests):8.1f}')
+    print(f'replica {show_replica.stats()}')
+    await Engine.dispose_async_engine()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import sys
+
+from sqlalchemy import select, text
+
+sys.path.append(os.path.dirname(__file__))
+
+from common import report, seed_catalog, timed, timed_async
+from app import Engine, persistence
+from app.persistence import search
+from app.rest.filters import apply_filters, parse_filters
+from app.rest.routers.shows import list_shows, search_shows
+
+REPEAT = int(os.getenv('BENCH_REPEAT', '20'))
+PAGE_SIZE = int(os.getenv('BENCH_PAGE_SIZE', '50'))
+# a common word, a rarer one and a word that only appears in cast names
+WORDS = ['love', 'zombie', 'hanks']
+LIKE_COLUMNS = ['title', 'description']
+
+
+def _search_page(session, word: str):
+    """
+    the statement selecting a page of search results, without the cast and listings hydrated for the page
+    """
+    query = search.tsquery(word)
+    rank = search.rank(query)
+    return session.execute(
+        select(persistence.Show.id).where(persistence.Show.search.op('@@')(query))
+        .order_by(rank.desc(), persistence.Show.id).limit(PAGE_SIZE)
+    ).all()
+
+
+def _like_page(session, column: str, word: str):
+    return session.execute(
+        apply_filters(select(persistence.Show.id), parse_filters([f'{column}=%{word}%']))
+        .order_by(persistence.Show.title, persistence.Show.id).limit(PAGE_SIZE)
+    ).all()
+
+
+def _benchmark_statements():
+    with Engine.new_session() as session:
+        for word in WORDS:
+            report(f'{word} (search statement)', timed(lambda: _search_page(session, word), REPEAT))
+            for column in LIKE_COLUMNS:
+                report(f'{word} ({column} LIKE statement)', timed(lambda: _like_page(session, column, word), REPEAT))
+
+
+async def _benchmark_endpoints():
+    Engine.get_async_engine()
+    for word in WORDS:
+        found = len(await search_shows(q=word, limit=10000, filter=[]))
+        print(f'{word}: {found} shows found by search')
+        report(f'{word} (search)', await timed_async(lambda: search_shows(q=word, limit=PAGE_SIZE, filter=[]), REPEAT))
+        for column in LIKE_COLUMNS:
+            report(f'{word} ({column} LIKE)', await timed_async(
+                lambda: list_shows(limit=PAGE_SIZE, sort=['title'], filter=[f'{column}=%{word}%']), REPEAT))
+    await Engine.dispose_async_engine()
+
+
+def main():
+    print(f'seeded {seed_catalog()} shows, {PAGE_SIZE} shows per page')
+    with Engine.new_session() as session:
+        session.execute(text(f'ANALYZE {persistence.Show.__tablename__}'))
+        session.commit()
+    _benchmark_statements()
+    asyncio.run(_benchmark_endpoints())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.append(os.path.dirname(__file__))
+
+from common import asgi_get, report, seed_catalog, timed
+from app import Engine, persistence
+from app.main import app
+from app.rest.responses import json_response
+from app.rest.routers.shows import hydrated_shows, to_show, to_show_record
+
+REPEAT = int(os.getenv('BENCH_REPEAT', '50'))
+LIMITS = [50, 500]
+
+
+async def _requests():
+    Engine.get_async_engine()
+    for limit in LIMITS:
+        query_string = f'limit={limit}&sort=title'
+        for _ in range(5):
+            await asgi_get(app, '/shows', query_string)
+        cpu = []
+        wall = []
+        for _ in range(REPEAT):
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            await asgi_get(app, '/shows', query_string)
+            cpu.append((time.process_time() - cpu_start) * 1000)
+            wall.append((time.perf_counter() - wall_start) * 1000)
+        print(f'GET /shows?limit={limit:<4} cpu median={statistics.median(cpu):7.2f}ms '
+              f'wall median={statistics.median(wall):7.2f}ms')
+    await Engine.dispose_async_engine()
+
+
+def _models(rows) -> bytes:
+    """
+    the serialization list_shows replaced: a model per show, then FastAPI's jsonable_encoder and JSONResponse
+    """
+    return JSONResponse(jsonable_encoder([to_show(*row) for row in rows])).body
+
+
+def _records(rows) -> bytes:
+    return json_response([to_show_record(*row) for row in rows]).body
+
+
+def main():
+    print(f'seeded {seed_catalog()} shows')
+    asyncio.run(_requests())
+    with Engine.new_session() as session:
+        for limit in LIMITS:
+            rows = hydrated_shows(session).order_by(persistence.Show.title).limit(limit).all()
+            assert _models(rows) == _records(rows), 'serialized shows differ'
+            report(f'serialize {limit} shows (models, jsonable_encoder)', timed(lambda: _models(rows), REPEAT))
+            report(f'serialize {limit} shows (records, orjson)', timed(lambda: _records(rows), REPEAT))
+
+
+if __name__ == '__main__':
+    main()
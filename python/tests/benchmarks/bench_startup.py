@@ -0,0 +1,103 @@
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(__file__))
+
+from common import seed_catalog
+from app import Engine, SECRET_VERSION_ID_VARIABLES, SQL_PASS
+from app.persistence import Base
+from app.rest.routers.shows import list_shows
+
+REPEAT = int(os.getenv('BENCH_REPEAT', '10'))
+# the latency of a Secret Manager request from App Engine
+SECRET_LATENCY_MS = float(os.getenv('BENCH_SECRET_LATENCY_MS', '50'))
+
+
+class SecretManagerStandIn:
+    """
+    a local stand-in for secretmanager.SecretManagerServiceClient answering after SECRET_LATENCY_MS. The certificates
+    are placeholders since the engine's SSL context is replaced and the local database is connected to without SSL
+    """
+    def access_secret_version(self, name: str):
+        time.sleep(SECRET_LATENCY_MS / 1000)
+        data = SQL_PASS if name == 'SQL_PASS_SECRET_VERSION_ID' else f'placeholder for {name}'
+        return SimpleNamespace(payload=SimpleNamespace(data=data.encode('utf-8')))
+
+
+def _previous_startup():
+    """
+    startup before schema creation moved to migrations: the secrets fetched one after another by a new client each,
+    the password again for the async engine, and the sync engine connecting to create the tables
+    """
+    for v in SECRET_VERSION_ID_VARIABLES + ['SQL_PASS_SECRET_VERSION_ID']:
+        SecretManagerStandIn().access_secret_version(v)
+    Engine.get_engine()
+    Base.metadata.create_all(Engine.engine())
+    Engine.get_async_engine()
+
+
+async def _reset():
+    if Engine.engine():
+        Engine.engine().dispose()
+    await Engine.dispose_async_engine()
+    Engine.shutdown()
+    Engine._Engine__engine = None
+    Engine._Engine__session = None
+    Engine._Engine__async_engine = None
+    Engine._Engine__async_session = None
+
+
+async def _cold_start(startup) -> (float, float):
+    """
+    return the milliseconds startup takes and then the first request of a page of shows
+    """
+    await _reset()
+    start = time.perf_counter()
+    await startup()
+    started = time.perf_counter()
+    await list_shows(limit=35, sort=['title'], filter=[])
+    return (started - start) * 1000, (time.perf_counter() - started) * 1000
+
+
+async def _previous():
+    _previous_startup()
+
+
+async def _prewarmed():
+    with patch('app.SQL_POOL_PREWARM', 3):
+        await Engine.start_async_engine()
+
+
+async def _benchmark():
+    cases = {
+        'previous startup': _previous,
+        'startup': Engine.start_async_engine,
+        'startup, 3 connections prewarmed': _prewarmed,
+    }
+    for name, startup in cases.items():
+        samples = [await _cold_start(startup) for _ in range(REPEAT)]
+        startup_ms = statistics.median(s for s, _ in samples)
+        first_ms = statistics.median(f for _, f in samples)
+        print(f'{name:35} startup={startup_ms:7.1f}ms first request={first_ms:7.1f}ms '
+              f'total={startup_ms + first_ms:7.1f}ms')
+    await _reset()
+
+
+def main():
+    print(f'seeded {seed_catalog()} shows, {SECRET_LATENCY_MS}ms per secret')
+    Engine.shutdown()
+    environment = {v: v for v in SECRET_VERSION_ID_VARIABLES}
+    environment['SQL_SSL_MODE'] = 'allow'
+    with patch.dict(os.environ, environment), \
+            patch.object(Engine, 'secret_manager_client', SecretManagerStandIn), \
+            patch.object(Engine, 'ssl_context', return_value=None):
+        asyncio.run(_benchmark())
+
+
+if __name__ == '__main__':
+    main()
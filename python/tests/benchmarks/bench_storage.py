@@ -0,0 +1,63 @@
+import os
+import sys
+
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(__file__))
+
+from common import seed_catalog
+from app import Engine
+
+# the cast and listings tables as they were before names moved to the person and genre dimension tables
+DENORMALIZED = {
+    'actor': """
+        CREATE TABLE bench_actor_denormalized AS
+        SELECT a.id, p.name FROM actor a JOIN person p ON p.id = a.person_id;
+        ALTER TABLE bench_actor_denormalized ADD PRIMARY KEY (id, name);
+        CREATE INDEX ON bench_actor_denormalized (name)
+    """,
+    'listed_in': """
+        CREATE TABLE bench_listed_in_denormalized AS
+        SELECT l.id, g.name AS listed_in FROM listed_in l JOIN genre g ON g.id = l.genre_id;
+        ALTER TABLE bench_listed_in_denormalized ADD PRIMARY KEY (id, listed_in);
+        CREATE INDEX ON bench_listed_in_denormalized (listed_in)
+    """,
+}
+NORMALIZED = {
+    'actor': ['actor', 'person'],
+    'listed_in': ['listed_in', 'genre'],
+}
+
+
+def _sizes(connection, tables: list) -> tuple:
+    return tuple(
+        sum(connection.execute(text(f"SELECT {f}('{t}')")).scalar() for t in tables)
+        for f in ['pg_table_size', 'pg_indexes_size']
+    )
+
+
+def _report(name: str, before: tuple, after: tuple):
+    print(
+        f'{name:<24} table {before[0] / 1024:6.0f}kB -> {after[0] / 1024:6.0f}kB ({after[0] / before[0] - 1:+6.1%})  '
+        f'indexes {before[1] / 1024:6.0f}kB -> {after[1] / 1024:6.0f}kB ({after[1] / before[1] - 1:+6.1%})')
+
+
+def main():
+    print(f'seeded {seed_catalog()} shows')
+    with Engine.engine().connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        # reseeding leaves dead rows behind, so compact the tables to compare them with freshly built copies
+        connection.execute(text(f'VACUUM FULL ANALYZE {", ".join(t for ts in NORMALIZED.values() for t in ts)}'))
+        for table, ddl in DENORMALIZED.items():
+            for statement in ddl.split(';'):
+                connection.execute(text(statement))
+            try:
+                denormalized = _sizes(connection, [f'bench_{table}_denormalized'])
+                junction, dimension = NORMALIZED[table]
+                _report(f'{junction}', denormalized, _sizes(connection, [junction]))
+                _report(f'{junction} + {dimension}', denormalized, _sizes(connection, [junction, dimension]))
+            finally:
+                connection.execute(text(f'DROP TABLE bench_{table}_denormalized'))
+
+
+if __name__ == '__main__':
+    main()
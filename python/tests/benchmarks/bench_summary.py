@@ -0,0 +1,46 @@
+import os
+import sys
+
+from sqlalchemy import func
+
+sys.path.append(os.path.dirname(__file__))
+
+from common import report, seed_catalog, timed
+from app import Engine, persistence
+from app.persistence import counters
+from app.rest.routers.summary import _summarize
+
+REPEAT = int(os.getenv('BENCH_REPEAT', '20'))
+
+
+def _legacy_summarize(session) -> dict:
+    """
+    the summary as it was computed before GROUP BY aggregation: one COUNT(*) per listing and per type
+    """
+    return {
+        'total': session.query(persistence.Show).count(),
+        'total_by_listed_in': {
+            genre.name: session.query(persistence.ListedIn).filter(persistence.ListedIn.genre_id == genre.id).count()
+            for genre in session.query(persistence.Genre).filter(
+                persistence.Genre.id.in_(session.query(persistence.ListedIn.genre_id))).all()
+        },
+        'total_by_type': {
+            show.type: session.query(persistence.Show).filter(persistence.Show.type == show.type).count()
+            for show in session.query(persistence.Show).distinct(persistence.Show.type).all()
+        }
+    }
+
+
+def main():
+    print(f'seeded {seed_catalog()} shows')
+    with Engine.new_session() as session:
+        genres = session.query(func.count(func.distinct(persistence.ListedIn.genre_id))).scalar()
+        print(f'{genres} distinct listings')
+        assert _legacy_summarize(session) == counters.recount(session) == _summarize(session), 'summaries differ'
+        report('summary (per-value COUNT)', timed(lambda: _legacy_summarize(session), REPEAT))
+        report('summary (GROUP BY)', timed(lambda: counters.recount(session), REPEAT))
+        report('summary (counters)', timed(lambda: _summarize(session), REPEAT))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import csv
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy import delete, insert
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app import Engine, init_logging, persistence
+from app.persistence import counters, dimensions, migrations, search, typed
+
+BENCH_DIR = os.path.dirname(__file__)
+CSV_FILE = os.path.join(BENCH_DIR, '..', '..', '..', 'datasource', 'netflix_titles.csv')
+SEED_BATCH_SIZE = 500
+
+SHOW_FIELDS = [
+    'type', 'title', 'director', 'cast', 'country', 'date_added', 'release_year',
+    'rating', 'duration', 'listed_in', 'description'
+]
+
+
+def read_catalog(csv_file: str = CSV_FILE) -> list:
+    """
+    read the shows in a csv file in the format of datasource/netflix_titles.csv
+    """
+    shows = []
+    with open(csv_file) as handle:
+        reader = csv.reader(handle, delimiter=',', quotechar='"')
+        next(reader)
+        for row in reader:
+            show = {SHOW_FIELDS[i - 1]: row[i] for i in range(1, len(SHOW_FIELDS) + 1)}
+            show['cast'] = list(dict.fromkeys(a.strip() for a in show['cast'].split(',') if a.strip()))
+            show['listed_in'] = list(dict.fromkeys(s.strip() for s in show['listed_in'].split(',') if s.strip()))
+            shows.append(show)
+    return shows
+
+
+def _seed_batch(session, batch: list):
+    columns = [f for f in SHOW_FIELDS if f not in ('cast', 'listed_in')]
+    show_ids = session.execute(
+        insert(persistence.Show).values([
+            {**{c: s[c] for c in columns}, **typed.typed_values(s)} for s in batch
+        ]).returning(persistence.Show.id)
+    ).scalars().all()
+    person_ids = dimensions.lookup(session, persistence.Person, [a for s in batch for a in s['cast']])
+    genre_ids = dimensions.lookup(session, persistence.Genre, [li for s in batch for li in s['listed_in']])
+    actors = [{'id': i, 'person_id': person_ids[a]} for i, s in zip(show_ids, batch) for a in s['cast']]
+    listings = [{'id': i, 'genre_id': genre_ids[li]} for i, s in zip(show_ids, batch) for li in s['listed_in']]
+    if actors:
+        session.execute(insert(persistence.Actor).values(actors))
+    search.refresh(session, show_ids)
+    if listings:
+        session.execute(insert(persistence.ListedIn).values(listings))
+
+
+def seed_catalog(csv_file: str = CSV_FILE) -> int:
+    """
+    replace the contents of the database with the shows in the csv file and return the number of shows seeded
+    """
+    init_logging()
+    Engine.get_engine()
+    migrations.migrate(Engine.engine())
+    shows = read_catalog(csv_file)
+    with Engine.new_session() as session:
+        session.execute(delete(persistence.Show))
+        for i in range(0, len(shows), SEED_BATCH_SIZE):
+            _seed_batch(session, shows[i:i + SEED_BATCH_SIZE])
+        session.commit()
+        counters.rebuild(session)
+        session.commit()
+    return len(shows)
+
+
+def latency_stats(samples: list) -> dict:
+    """
+    return statistics for latency samples in milliseconds
+    """
+    samples = sorted(samples)
+    return {
+        'min': samples[0],
+        'median': statistics.median(samples),
+        'p99': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        'max': samples[-1]
+    }
+
+
+def timed(fn, repeat: int = 20) -> dict:
+    """
+    call fn repeat times and return latency statistics in milliseconds
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return latency_stats(samples)
+
+
+async def timed_async(fn, repeat: int = 20) -> dict:
+    """
+    await fn() repeat times and return latency statistics in milliseconds
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return latency_stats(samples)
+
+
+async def asgi_get(app, path: str, query_string: str = '') -> bytes:
+    """
+    send a GET request through an ASGI app, including routing, validation and serialization, and return the body
+    """
+    scope = {
+        'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http', 'path': path, 'root_path': '',
+        'raw_path': path.encode('utf-8'), 'query_string': query_string.encode('utf-8'), 'headers': [],
+        'client': ('127.0.0.1', 0), 'server': ('127.0.0.1', 80),
+    }
+    body = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.body':
+            body.append(message.get('body', b''))
+    await app(scope, receive, send)
+    return b''.join(body)
+
+
+def report(name: str, stats: dict):
+    print(f'{name:<40} ' + ' '.join(f'{k}={v:9.2f}ms' for k, v in stats.items()))
@@ -0,0 +1,68 @@
+import unittest
+
+from unittest.mock import patch
+
+from app.cache import Cache, CacheBackend, LRUBackend
+
+
+class TestCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        backend = LRUBackend(max_size=2, ttl=60)
+        backend.set(1, 'one')
+        backend.set(2, 'two')
+        backend.get(1)
+        backend.set(3, 'three')
+        self.assertEqual('one', backend.get(1))
+        self.assertIsNone(backend.get(2))
+        self.assertEqual('three', backend.get(3))
+        self.assertEqual(1, backend.stats()['evictions'])
+        self.assertEqual(2, backend.stats()['size'])
+
+    @patch('app.cache.time')
+    def test_ttl_expiration(self, time):
+        time.monotonic.return_value = 100
+        backend = LRUBackend(max_size=2, ttl=10)
+        backend.set(1, 'one')
+        time.monotonic.return_value = 109
+        self.assertEqual('one', backend.get(1))
+        time.monotonic.return_value = 110
+        self.assertIsNone(backend.get(1))
+        self.assertEqual(1, backend.stats()['expirations'])
+
+    def test_partial_backend_cannot_be_created(self):
+        class GetOnlyBackend(CacheBackend):
+            def get(self, key):
+                return None
+
+        with self.assertRaises(TypeError):
+            GetOnlyBackend()
+
+    def test_disabled(self):
+        backend = LRUBackend(max_size=0, ttl=10)
+        backend.set(1, 'one')
+        self.assertIsNone(backend.get(1))
+
+    def test_hits_and_misses(self):
+        cache = Cache(LRUBackend(max_size=2, ttl=60))
+        self.assertIsNone(cache.get(1))
+        cache.set(1, 'one', cache.epoch)
+        self.assertEqual('one', cache.get(1))
+        self.assertEqual(1, cache.stats()['hits'])
+        self.assertEqual(1, cache.stats()['misses'])
+
+    def test_invalidate(self):
+        cache = Cache(LRUBackend(max_size=2, ttl=60))
+        cache.set(1, 'one', cache.epoch)
+        cache.set(2, 'two', cache.epoch)
+        cache.invalidate(1)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual('two', cache.get(2))
+        cache.clear()
+        self.assertIsNone(cache.get(2))
+
+    def test_read_before_invalidation_is_not_cached(self):
+        cache = Cache(LRUBackend(max_size=2, ttl=60))
+        epoch = cache.epoch
+        cache.invalidate(1)
+        cache.set(1, 'stale', epoch)
+        self.assertIsNone(cache.get(1))
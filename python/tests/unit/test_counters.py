@@ -0,0 +1,70 @@
+import unittest
+
+from sqlalchemy.dialects import postgresql
+from unittest.mock import MagicMock
+
+from app.persistence import counters
+
+
+class TestCounters(unittest.TestCase):
+    def test_deltas(self):
+        self.assertDictEqual({
+            ('total', ''): -1,
+            ('type', 'Movie'): -1,
+            ('listed_in', 'Dramas'): -1,
+            ('listed_in', 'Comedies'): -1
+        }, counters.deltas('Movie', ['Dramas', 'Comedies', 'Dramas'], -1))
+
+    def test_merge_drops_unchanged_counters(self):
+        self.assertDictEqual(
+            {('listed_in', 'Dramas'): -1, ('listed_in', 'Comedies'): 1},
+            counters.merge(
+                counters.deltas('Movie', ['Dramas'], -1),
+                counters.deltas('Movie', ['Comedies'])
+            ))
+
+    def test_adjust_nothing_changed(self):
+        session = MagicMock()
+        counters.adjust(session, counters.merge(counters.deltas('Movie', [], -1), counters.deltas('Movie', [])))
+        session.execute.assert_not_called()
+
+    def test_adjust_increment(self):
+        session = MagicMock()
+        counters.adjust(session, counters.deltas('Movie', ['Dramas']))
+        self.assertEqual(1, session.execute.call_count)
+        sql = str(session.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+        self.assertIn('ON CONFLICT (kind, key) DO UPDATE', sql)
+
+    def test_adjust_locks_counters_in_key_order(self):
+        session = MagicMock()
+        counters.adjust(session, counters.merge(
+            counters.deltas('Movie', ['Dramas', 'Comedies'], -1), counters.deltas('TV Show', ['Thrillers', 'Action'])))
+        upsert, delete = [c.args[0].compile(dialect=postgresql.dialect()) for c in session.execute.call_args_list]
+        self.assertListEqual(
+            ['listed_in', 'Action', 'listed_in', 'Comedies', 'listed_in', 'Dramas', 'listed_in', 'Thrillers',
+             'type', 'Movie', 'type', 'TV Show'],
+            [v for k, v in upsert.params.items() if not k.startswith('total')])
+        self.assertListEqual(
+            [('listed_in', 'Comedies'), ('listed_in', 'Dramas'), ('type', 'Movie')], delete.params['param_1'])
+
+    def test_adjust_decrement_removes_empty_counters(self):
+        session = MagicMock()
+        counters.adjust(session, counters.deltas('Movie', ['Dramas'], -1))
+        self.assertEqual(2, session.execute.call_count)
+        sql = str(session.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+        self.assertTrue(sql.startswith('DELETE FROM summary_counter'))
+
+    def test_check(self):
+        session = MagicMock()
+        session.query.return_value.join.return_value = session.query.return_value
+        session.query.return_value.filter.return_value.all.return_value = [
+            ('total', '', 3), ('type', 'Movie', 3), ('listed_in', 'Dramas', 2)
+        ]
+        session.query.return_value.group_by.return_value.all.side_effect = [
+            [('Movie', 2)], [('Dramas', 2), ('Comedies', 1)]
+        ]
+        self.assertDictEqual({
+            ('total', ''): (3, 2),
+            ('type', 'Movie'): (3, 2),
+            ('listed_in', 'Comedies'): (0, 1)
+        }, counters.check(session))
@@ -0,0 +1,45 @@
+import unittest
+
+from sqlalchemy.dialects import postgresql
+from unittest.mock import patch, MagicMock
+
+from app.persistence import Genre, Person, dimensions
+
+
+class TestDimensions(unittest.TestCase):
+    def test_lookup_nothing(self):
+        session = MagicMock()
+        self.assertDictEqual({}, dimensions.lookup(session, Person, []))
+        session.execute.assert_not_called()
+
+    def test_lookup_existing_names(self):
+        session = MagicMock()
+        session.execute.return_value.all.return_value = [('Dramas', 1), ('Comedies', 2)]
+        self.assertDictEqual({'Dramas': 1, 'Comedies': 2}, dimensions.lookup(session, Genre, ['Dramas', 'Comedies']))
+        session.execute.assert_called_once()
+
+    def test_lookup_adds_missing_names(self):
+        session = MagicMock()
+        session.execute.return_value.all.side_effect = [[('A', 1)], [('B', 2), ('C', 3)]]
+        self.assertDictEqual({'A': 1, 'B': 2, 'C': 3}, dimensions.lookup(session, Person, ['C', 'A', 'B', 'A']))
+        self.assertEqual(2, session.execute.call_count)
+        insert_statement = session.execute.call_args.args[0].compile(dialect=postgresql.dialect())
+        self.assertIn('ON CONFLICT DO NOTHING RETURNING person.name, person.id', str(insert_statement))
+        self.assertListEqual(['B', 'C'], [insert_statement.params['name_m0'], insert_statement.params['name_m1']])
+
+    def test_lookup_names_added_concurrently(self):
+        session = MagicMock()
+        session.execute.return_value.all.side_effect = [[], [('A', 1)], [('B', 2)]]
+        self.assertDictEqual({'A': 1, 'B': 2}, dimensions.lookup(session, Person, ['A', 'B']))
+        self.assertEqual(3, session.execute.call_count)
+
+    @patch('app.persistence.MAX_BIND_PARAMETERS', 2)
+    def test_lookup_splits_statements_by_parameter_count(self):
+        session = MagicMock()
+        session.execute.return_value.all.side_effect = [[('A', 1), ('B', 2)], [], [('C', 3)]]
+        self.assertDictEqual({'A': 1, 'B': 2, 'C': 3}, dimensions.lookup(session, Person, ['C', 'A', 'B']))
+        insert_statement = session.execute.call_args.args[0].compile(dialect=postgresql.dialect())
+        self.assertListEqual([['A', 'B'], ['C']], [
+            c.args[0].compile(dialect=postgresql.dialect()).params['name_1'] for c in session.execute.call_args_list[:2]
+        ])
+        self.assertDictEqual({'name_m0': 'C'}, insert_statement.params)
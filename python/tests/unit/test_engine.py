@@ -1,11 +1,11 @@
+import asyncio
 import os
-import sys
 import unittest
-from unittest.mock import patch, MagicMock
-
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from unittest.mock import patch, AsyncMock, MagicMock
 
+import app
 from app import Engine, SQL_PORT, SQL_DB, SQL_USER, SQL_HOST, SQL_PASS, init_logging
+from app.pool import TimedAsyncAdaptedQueuePool, TimedQueuePool
 
 
 class TestEngine(unittest.TestCase):
@@ -14,30 +14,33 @@ class TestEngine(unittest.TestCase):
         init_logging()
 
     def tearDown(self) -> None:
+        Engine.shutdown()
         Engine._Engine__engine = None
         Engine._Engine__session = None
+        Engine._Engine__async_engine = None
+        Engine._Engine__async_session = None
 
     @patch('app.create_engine')
-    @patch('app.secretmanager')
+    @patch('app.Engine.secret_manager_client')
     @patch('app.sessionmaker')
-    @patch('app.Base')
-    def test_connect_to_cloud_sql(self, base, sessionmaker, secretmanager, create_engine):
+    def test_connect_to_cloud_sql(self, sessionmaker, secret_manager_client, create_engine):
         client = MagicMock()
         secret = MagicMock()
         secret_data = 'top-secret'
         secret.payload.data = secret_data.encode('utf-8')
         client.access_secret_version.return_value = secret
-        secretmanager.SecretManagerServiceClient.return_value = client
+        secret_manager_client.return_value = client
         with patch.dict(os.environ, {
             'PROJECT_ID': 'testing',
-            'SQL_SERVER_CA_CERT_SECRET_VERSION_ID': 'test-version',
-            'SQL_CLIENT_CERT_SECRET_VERSION_ID': 'test-version',
-            'SQL_PRIVATE_KEY_SECRET_VERSION_ID': 'test-version',
-            'SQL_PASS_SECRET_VERSION_ID': 'test-version',
+            'SQL_SERVER_CA_CERT_SECRET_VERSION_ID': 'ca-version',
+            'SQL_CLIENT_CERT_SECRET_VERSION_ID': 'cert-version',
+            'SQL_PRIVATE_KEY_SECRET_VERSION_ID': 'key-version',
+            'SQL_PASS_SECRET_VERSION_ID': 'pass-version',
             'SQL_SSL_MODE': 'require'
         }):
             Engine.get_engine()
             self.assertEqual(4, client.access_secret_version.call_count)
+            secret_manager_client.assert_called_once()
             args, kwargs = create_engine.call_args
             self.assertEqual(f'postgresql+psycopg2://{SQL_USER}:{secret_data}@{SQL_HOST}:{SQL_PORT}/{SQL_DB}', args[0])
             self.assertIn('connect_args', kwargs)
@@ -47,17 +50,111 @@ class TestEngine(unittest.TestCase):
             self.assertIsNotNone(connect_args['sslcert'])
             self.assertIsNotNone(connect_args['sslkey'])
             sessionmaker.assert_called_once()
-            base.metadata.create_all.assert_called_once()
 
     @patch('app.create_engine')
-    @patch('app.secretmanager')
+    @patch('app.Engine.secret_manager_client')
     @patch('app.sessionmaker')
-    @patch('app.Base')
-    def test_connect_to_sql(self, base, sessionmaker, secretmanager, create_engine):
+    def test_connect_to_sql(self, sessionmaker, secret_manager_client, create_engine):
         client = MagicMock()
-        secretmanager.SecretManagerServiceClient.return_value = client
+        secret_manager_client.return_value = client
         Engine.get_engine()
+        secret_manager_client.assert_not_called()
         client.access_secret_version.assert_not_called()
-        create_engine.assert_called_with(f'postgresql+psycopg2://{SQL_USER}:{SQL_PASS}@{SQL_HOST}:{SQL_PORT}/{SQL_DB}')
+        create_engine.assert_called_with(
+            f'postgresql+psycopg2://{SQL_USER}:{SQL_PASS}@{SQL_HOST}:{SQL_PORT}/{SQL_DB}',
+            connect_args={}, poolclass=TimedQueuePool, **Engine.pool_args())
         sessionmaker.assert_called_once()
-        base.metadata.create_all.assert_called_once()
+
+    @patch('app.create_async_engine')
+    @patch('app.sessionmaker')
+    def test_connect_async_to_sql(self, sessionmaker, create_async_engine):
+        Engine.get_async_engine()
+        create_async_engine.assert_called_with(
+            f'postgresql+asyncpg://{SQL_USER}:{SQL_PASS}@{SQL_HOST}:{SQL_PORT}/{SQL_DB}',
+            connect_args={}, poolclass=TimedAsyncAdaptedQueuePool, **Engine.pool_args())
+        sessionmaker.assert_called_once()
+
+    @patch('app.create_async_engine')
+    @patch('app.sessionmaker')
+    def test_connect_async_to_cloud_sql_socket(self, sessionmaker, create_async_engine):
+        with patch.dict(os.environ, {'CLOUD_SQL_CONNECTION_NAME': 'project:region:instance'}):
+            Engine.get_async_engine()
+        self.assertEqual(
+            f'postgresql+asyncpg://{SQL_USER}:{SQL_PASS}@/{SQL_DB}?host=/cloudsql/project:region:instance',
+            create_async_engine.call_args.args[0])
+
+    @patch('app.create_async_engine')
+    @patch('app.create_engine')
+    @patch('app.Engine.secret_manager_client')
+    @patch('app.sessionmaker')
+    @patch('app.Engine.ssl_context')
+    def test_engines_share_certificates(
+            self, ssl_context, sessionmaker, secret_manager_client, create_engine, create_async_engine):
+        secret_manager_client.return_value.access_secret_version.return_value.payload.data = \
+            b'top-secret'
+        with patch.dict(os.environ, {
+            'SQL_SERVER_CA_CERT_SECRET_VERSION_ID': 'test-version',
+            'SQL_CLIENT_CERT_SECRET_VERSION_ID': 'test-version',
+            'SQL_PRIVATE_KEY_SECRET_VERSION_ID': 'test-version',
+        }):
+            Engine.get_engine()
+            Engine.get_async_engine()
+        connect_args = create_engine.call_args.kwargs['connect_args']
+        self.assertTrue(os.path.exists(connect_args['sslrootcert']))
+        ssl_context.assert_called_once_with(
+            connect_args['sslrootcert'], connect_args['sslcert'], connect_args['sslkey'])
+        self.assertEqual({'ssl': ssl_context.return_value}, create_async_engine.call_args.kwargs['connect_args'])
+        # the secret is fetched once and reused by the second engine
+        secret_manager_client.return_value.access_secret_version.assert_called_once()
+
+    @patch('app.Engine.secret_manager_client')
+    def test_get_secrets_fetches_concurrently(self, secret_manager_client):
+        fetched = []
+
+        def access_secret_version(name):
+            fetched.append(name)
+            secret = MagicMock()
+            secret.payload.data = f'{name}-secret'.encode('utf-8')
+            return secret
+        secret_manager_client.return_value.access_secret_version.side_effect = access_secret_version
+        with patch('app.ThreadPoolExecutor', wraps=app.ThreadPoolExecutor) as executor:
+            self.assertListEqual(['a-secret', 'b-secret', 'a-secret'], Engine.get_secrets(['a', 'b', 'a']))
+        executor.assert_called_once_with(max_workers=2)
+        self.assertListEqual(['c-secret', 'b-secret'], Engine.get_secrets(['c', 'b']))
+        self.assertListEqual(['a', 'b', 'c'], sorted(fetched))
+
+    @patch('app.SQL_POOL_PREWARM', 3)
+    @patch('app.create_async_engine')
+    @patch('app.sessionmaker')
+    def test_start_async_engine_prewarms_pool(self, sessionmaker, create_async_engine):
+        connection = MagicMock()
+        connection.close = AsyncMock()
+        create_async_engine.return_value.connect.return_value.start = AsyncMock(return_value=connection)
+        asyncio.run(Engine.start_async_engine())
+        self.assertEqual(3, create_async_engine.return_value.connect.call_count)
+        self.assertEqual(3, connection.close.await_count)
+
+    @patch('app.create_async_engine')
+    @patch('app.sessionmaker')
+    def test_start_async_engine_connects_lazily(self, sessionmaker, create_async_engine):
+        asyncio.run(Engine.start_async_engine())
+        create_async_engine.return_value.connect.assert_not_called()
+
+    @patch('app.SQL_STATEMENT_TIMEOUT_MS', 5000)
+    @patch('app.create_async_engine')
+    @patch('app.create_engine')
+    @patch('app.sessionmaker')
+    def test_statement_timeout(self, sessionmaker, create_engine, create_async_engine):
+        Engine.get_engine()
+        Engine.get_async_engine()
+        self.assertEqual({'options': '-c statement_timeout=5000'}, create_engine.call_args.kwargs['connect_args'])
+        self.assertEqual(
+            {'server_settings': {'statement_timeout': '5000'}}, create_async_engine.call_args.kwargs['connect_args'])
+
+    @patch('app.SQL_POOL_SIZE', 2)
+    @patch('app.SQL_MAX_OVERFLOW', 0)
+    @patch('app.SQL_POOL_PRE_PING', True)
+    def test_pool_args(self):
+        self.assertEqual(2, Engine.pool_args()['pool_size'])
+        self.assertEqual(0, Engine.pool_args()['max_overflow'])
+        self.assertTrue(Engine.pool_args()['pool_pre_ping'])
@@ -0,0 +1,23 @@
+import unittest
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from unittest.mock import MagicMock
+
+from app import persistence
+from app.persistence.estimates import Explain, estimated_rows
+
+
+class TestEstimates(unittest.TestCase):
+    def test_explain_keeps_parameters(self):
+        statement = Explain(select(persistence.Show.id).where(persistence.Show.year >= 2015))
+        compiled = statement.compile(dialect=postgresql.dialect())
+        self.assertEqual(
+            'EXPLAIN (FORMAT JSON) SELECT shows.id \nFROM shows \nWHERE shows.year >= %(year_1)s', str(compiled))
+        self.assertDictEqual({'year_1': 2015}, compiled.params)
+
+    def test_estimated_rows(self):
+        session = MagicMock()
+        for plan in [[{'Plan': {'Plan Rows': 42}}], '[{"Plan": {"Plan Rows": 42}}]']:
+            session.execute.return_value.scalar.return_value = plan
+            self.assertEqual(42, estimated_rows(session, select(persistence.Show)))
@@ -0,0 +1,18 @@
+import unittest
+
+from app.rest import etags
+
+
+class TestEtags(unittest.TestCase):
+    def test_matches(self):
+        etag = etags.show_etag(1, 2)
+        self.assertTrue(etags.matches(etag, etag))
+        self.assertTrue(etags.matches(f'"other", {etag}', etag))
+        self.assertTrue(etags.matches('*', etag))
+        self.assertFalse(etags.matches(etags.show_etag(1, 3), etag))
+        self.assertFalse(etags.matches(None, etag))
+
+    def test_weak_comparison(self):
+        etag = etags.catalog_etag(4)
+        self.assertTrue(etags.matches(f'W/{etag}', etag))
+        self.assertFalse(etags.matches(f'W/{etag}', etag, weak=False))
@@ -0,0 +1,55 @@
+import unittest
+
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+from unittest.mock import MagicMock
+
+from app.rest.facets import facet_counts, parse_facets
+from app.rest.filters import parse_filters
+
+
+class TestFacets(unittest.TestCase):
+    @staticmethod
+    def statement(session: MagicMock) -> str:
+        return str(session.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+
+    def test_parse_facets(self):
+        self.assertListEqual(['type', 'listed_in'], parse_facets(' type, listed_in,type,'))
+        self.assertListEqual([], parse_facets(None))
+        with self.assertRaises(HTTPException) as e:
+            parse_facets('type,title')
+        self.assertEqual(400, e.exception.status_code)
+
+    def test_facets_are_counted_by_one_grouping_sets_query(self):
+        session = MagicMock()
+        session.execute.return_value.all.return_value = [
+            (0, 1, 'Movie', None, 3),
+            (0, 1, 'TV Show', None, 1),
+            (0, 1, None, None, 2),
+            (1, 0, None, 'Comedies', 1),
+            (1, 0, None, 'Dramas', 4),
+        ]
+        counts = facet_counts(session, parse_filters(['release_year>=2015']), ['type', 'listed_in'])
+        self.assertDictEqual({'type': {'Movie': 3, 'TV Show': 1}, 'listed_in': {'Dramas': 4, 'Comedies': 1}}, counts)
+        self.assertListEqual(['Dramas', 'Comedies'], list(counts['listed_in']))
+        session.execute.assert_called_once()
+        statement = self.statement(session)
+        self.assertIn('count(DISTINCT shows.id)', statement)
+        self.assertIn('WHERE shows.year >= %(year_1)s GROUP BY GROUPING SETS(shows.type, genre.name)', statement)
+
+    def test_single_valued_facets_count_rows(self):
+        session = MagicMock()
+        session.execute.return_value.all.return_value = []
+        self.assertDictEqual({'type': {}, 'rating': {}}, facet_counts(session, [], ['type', 'rating']))
+        statement = self.statement(session)
+        self.assertIn('count(*)', statement)
+        self.assertNotIn('JOIN', statement)
+
+    def test_countries_are_split(self):
+        session = MagicMock()
+        session.execute.return_value.all.return_value = [(0, 'India', 2), (0, 'United States', 5)]
+        self.assertDictEqual(
+            {'country': {'United States': 5, 'India': 2}}, facet_counts(session, [], ['country']))
+        statement = self.statement(session)
+        self.assertIn('LEFT OUTER JOIN LATERAL (SELECT DISTINCT trim(anon_1.name) AS name', statement)
+        self.assertIn('count(*)', statement)
@@ -0,0 +1,76 @@
+import unittest
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app import persistence
+from app.rest.filters import Filter, apply_filters, parse_filters, split_values
+
+
+class TestFilters(unittest.TestCase):
+    @staticmethod
+    def where(filter):
+        q = apply_filters(select(persistence.Show.id), parse_filters(filter))
+        return str(q.compile(dialect=postgresql.dialect())).split('WHERE ', 1)[1]
+
+    def test_parse_filters(self):
+        self.assertListEqual(
+            [Filter('title', 'like', 'The%'), Filter('release_year', 'gte', '2015'), Filter('duration', 'lt', '90')],
+            parse_filters(['title=The%', 'release_year >= 2015', 'duration<90']))
+        self.assertListEqual(
+            [Filter('type', 'eq', 'Movie'), Filter('cast', 'in', 'a, b'), Filter('release_year', 'lte', '2020')],
+            parse_filters(['type[eq]=Movie', 'cast [in]=a, b', 'release_year[lte]=2020']))
+        self.assertListEqual([], parse_filters(None))
+
+    def test_parse_invalid_filters(self):
+        for filter in [
+                'not valid', 'unknown=1', 'title>=a', 'release_year>=abc', 'date_added<soon', 'duration>1 week',
+                'title[between]=a', 'cast[gte]=a', 'unknown[eq]=1', 'version[eq]=1']:
+            with self.assertRaises(HTTPException) as e:
+                parse_filters([filter])
+            self.assertEqual(400, e.exception.status_code)
+
+    def test_like_filters_use_text_columns(self):
+        self.assertEqual('shows.release_year LIKE %(release_year_1)s', self.where(['release_year=20%']))
+
+    def test_range_filters_use_typed_columns(self):
+        self.assertEqual('shows.year >= %(year_1)s', self.where(['release_year>=2015']))
+        self.assertEqual('shows.added_on < %(added_on_1)s', self.where(['date_added<January 1, 2020']))
+        self.assertEqual(
+            'shows.duration_unit = %(duration_unit_1)s AND shows.duration_value < %(duration_value_1)s',
+            self.where(['duration<90']))
+
+    def test_text_operators(self):
+        self.assertEqual('shows.type = %(type_1)s', self.where(['type[eq]=Movie']))
+        self.assertEqual('shows.director IS DISTINCT FROM %(director_1)s', self.where(['director[ne]=unittest']))
+        self.assertEqual('shows.rating IN ([POSTCOMPILE_rating_1])', self.where(['rating[in]=PG, R']))
+        self.assertEqual("shows.title LIKE %(title_1)s ESCAPE '\\\\'", self.where(['title[prefix]=The']))
+        self.assertEqual(
+            "shows.description LIKE %(description_1)s ESCAPE '\\\\'", self.where(['description[contains]=x']))
+
+    def test_split_values(self):
+        self.assertListEqual(['PG', 'R', 'TV-MA'], split_values('PG, R ,TV-MA'))
+        self.assertListEqual(['Dramas'], split_values('Dramas'))
+
+    def test_prefix_and_contains_escape_wildcards(self):
+        q = apply_filters(select(persistence.Show.id), parse_filters(
+            ['rating[in]=PG, R', 'title[prefix]=100%_', 'title[contains]=a\\b']))
+        params = q.compile(dialect=postgresql.dialect()).params
+        self.assertListEqual(['PG', 'R'], params['rating_1'])
+        self.assertEqual('100\\%\\_%', params['title_1'])
+        self.assertEqual('%a\\\\b%', params['title_2'])
+
+    def test_dimension_filters_use_exists(self):
+        self.assertEqual(
+            'EXISTS (SELECT actor.id \nFROM actor JOIN person ON person.id = actor.person_id \n'
+            'WHERE actor.id = shows.id AND person.name = %(name_1)s)',
+            self.where(['cast[eq]=unittest']))
+        self.assertEqual(
+            'EXISTS (SELECT listed_in.id \nFROM listed_in JOIN genre ON genre.id = listed_in.genre_id \n'
+            'WHERE listed_in.id = shows.id AND genre.name LIKE %(name_1)s)',
+            self.where(['listed_in=Drama%']))
+        self.assertEqual(
+            'NOT (EXISTS (SELECT listed_in.id \nFROM listed_in JOIN genre ON genre.id = listed_in.genre_id \n'
+            'WHERE listed_in.id = shows.id AND genre.name = %(name_1)s))',
+            self.where(['listed_in[ne]=Dramas']))
@@ -0,0 +1,89 @@
+import unittest
+
+from app.rest.formats import csv_chunks, csv_records, ndjson_chunks, ndjson_records
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def collect(records) -> list:
+    return [r async for r in records]
+
+
+async def batches(*shows: list):
+    for batch in shows:
+        yield batch
+
+
+SHOW = {
+    'type': 'Movie', 'title': 'Unit, the "Test"', 'director': '', 'cast': ['Amy', 'Zed'], 'country': 'Brazil',
+    'date_added': 'August 14, 2020', 'release_year': '2020', 'rating': 'TV-MA', 'duration': '93 min',
+    'listed_in': ['Dramas'], 'description': 'two\nlines', 'id': 7, 'uri': '/shows/7',
+}
+
+
+class TestFormats(unittest.IsolatedAsyncioTestCase):
+    async def test_csv_records(self):
+        data = (
+            'show_id,type,title,director,cast,country,date_added,release_year,rating,duration,listed_in,description\r\n'
+            's1,TV Show,3%,,"João Miguel, Bianca Comparato",Brazil,"August 14, 2020",2020,TV-MA,4 Seasons,'
+            '"International TV Shows, TV Dramas","In a future where\nthe elite inhabit an island paradise"\r\n'
+            '\r\n'
+            's2,Movie,7:19\r\n'
+        ).encode('utf-8')
+        records = await collect(csv_records(chunked(data, 7)))
+        self.assertEqual(2, len(records))
+        line, show, error = records[0]
+        self.assertEqual(2, line)
+        self.assertIsNone(error)
+        self.assertEqual('3%', show['title'])
+        self.assertListEqual(['João Miguel', 'Bianca Comparato'], show['cast'])
+        self.assertListEqual(['International TV Shows', 'TV Dramas'], show['listed_in'])
+        self.assertEqual('In a future where\nthe elite inhabit an island paradise', show['description'])
+        self.assertNotIn('show_id', show)
+        line, show, error = records[1]
+        self.assertEqual(5, line)
+        self.assertIsNone(show)
+        self.assertIsInstance(error, ValueError)
+
+    async def test_csv_records_empty_lists(self):
+        data = b'type,title,cast,listed_in\nMovie,Unit the Test,,\n'
+        records = await collect(csv_records(chunked(data, 1024)))
+        self.assertListEqual(
+            [(2, {'type': 'Movie', 'title': 'Unit the Test', 'cast': [], 'listed_in': []}, None)], records)
+
+    async def test_csv_records_unterminated_quote(self):
+        data = b'type,title\nMovie,"Unit the Test\n'
+        records = await collect(csv_records(chunked(data, 1024)))
+        self.assertEqual(1, len(records))
+        self.assertIsInstance(records[0][2], ValueError)
+
+    async def test_ndjson_records(self):
+        data = b'{"type": "Movie", "title": "Unit the Test"}\n\nnot json\n["not", "an", "object"]\n{"type": "TV Show"}'
+        records = await collect(ndjson_records(chunked(data, 5)))
+        self.assertListEqual([1, 3, 4, 5], [line for line, _, _ in records])
+        self.assertDictEqual({'type': 'Movie', 'title': 'Unit the Test'}, records[0][1])
+        self.assertIsInstance(records[1][2], ValueError)
+        self.assertIsInstance(records[2][2], ValueError)
+        self.assertDictEqual({'type': 'TV Show'}, records[3][1])
+
+    async def test_csv_chunks_round_trip(self):
+        chunks = await collect(csv_chunks(batches([SHOW], [{**SHOW, 'id': 8, 'cast': []}])))
+        self.assertEqual(2, len(chunks))
+        self.assertTrue(chunks[0].startswith('show_id,type,title,director,cast,country,date_added,'))
+        records = await collect(csv_records(chunked(''.join(chunks).encode('utf-8'), 7)))
+        expected = {k: v for k, v in SHOW.items() if k not in ['id', 'uri']}
+        self.assertListEqual([(2, expected, None), (4, {**expected, 'cast': []}, None)], records)
+
+    async def test_csv_chunks_without_shows(self):
+        chunks = await collect(csv_chunks(batches()))
+        self.assertEqual(['show_id,type,title,director,cast,country,date_added,release_year,rating,duration,'
+                          'listed_in,description\n'], chunks)
+
+    async def test_ndjson_chunks_round_trip(self):
+        chunks = await collect(ndjson_chunks(batches([SHOW, SHOW], [SHOW])))
+        self.assertEqual(2, len(chunks))
+        records = await collect(ndjson_records(chunked(b''.join(chunks), 5)))
+        self.assertListEqual([(1, SHOW, None), (2, SHOW, None), (3, SHOW, None)], records)
@@ -0,0 +1,100 @@
+import unittest
+
+from fastapi import APIRouter, FastAPI
+from sqlalchemy import create_engine, text
+
+from app import metrics
+from app.metrics import Histogram, RequestMetrics, RequestTimings, request_metrics
+from app.rest.timing import MetricsMiddleware, TimedRoute
+
+
+async def get(app, path: str) -> dict:
+    """
+    send a GET for path straight to the app and return the response start message
+    """
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app({
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '', 'headers': [],
+        'client': ('127.0.0.1', 1234), 'server': ('localhost', 80),
+    }, receive, send)
+    return messages[0]
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram(self):
+        histogram = Histogram((1, 5))
+        for value in [0, 1, 2, 5, 6]:
+            histogram.observe(value)
+        self.assertListEqual([2, 4, 5], histogram.cumulative_counts())
+        self.assertEqual(14, histogram.sum)
+        self.assertEqual(5, histogram.count)
+
+    def test_render(self):
+        registry = RequestMetrics()
+        timings = RequestTimings()
+        timings.route = '/shows/{show_id}'
+        timings.statements = 2
+        registry.record('GET', timings, 200)
+        registry.record('GET', RequestTimings(), 404)
+        lines = registry.render().splitlines()
+        self.assertIn('# TYPE shows_http_request_duration_seconds histogram', lines)
+        self.assertIn('shows_http_request_sql_statements_bucket{method="GET",route="/shows/{show_id}",le="1"} 0', lines)
+        self.assertIn('shows_http_request_sql_statements_bucket{method="GET",route="/shows/{show_id}",le="2"} 1', lines)
+        self.assertIn('shows_http_request_sql_statements_sum{method="GET",route="/shows/{show_id}"} 2.0', lines)
+        self.assertIn('shows_http_request_db_seconds_bucket{method="GET",route="unmatched",le="+Inf"} 1', lines)
+        self.assertIn('shows_http_responses_total{method="GET",route="/shows/{show_id}",status="200"} 1', lines)
+        self.assertIn('shows_http_responses_total{method="GET",route="unmatched",status="404"} 1', lines)
+
+    def test_times_statements_of_the_current_request(self):
+        engine = create_engine('sqlite://')
+        with engine.connect() as connection:
+            connection.execute(text('select 1'))
+            timings, token = metrics.start_request()
+            try:
+                connection.execute(text('select 1'))
+                connection.execute(text('select 2'))
+            finally:
+                metrics.end_request(token)
+            connection.execute(text('select 3'))
+        self.assertEqual(2, timings.statements)
+        self.assertGreater(timings.db, 0)
+        self.assertIsNone(metrics.current_timings())
+
+
+class TestMetricsMiddleware(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        request_metrics.clear()
+        self.engine = create_engine('sqlite://')
+        router = APIRouter(prefix='/shows', route_class=TimedRoute)
+
+        @router.get('/{show_id}')
+        async def get_show(show_id: int):
+            with self.engine.connect() as connection:
+                return {'id': connection.execute(text('select :id'), {'id': show_id}).scalar()}
+
+        self.app = FastAPI()
+        self.app.include_router(router)
+        self.app.add_middleware(MetricsMiddleware)
+
+    async def test_server_timing(self):
+        start = await get(self.app, '/shows/7')
+        self.assertEqual(200, start['status'])
+        server_timing = dict(start['headers'])[b'server-timing'].decode()
+        self.assertRegex(
+            server_timing, r'^db;dur=[\d.]+;desc="1 statement", serialize;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertEqual(1, request_metrics.routes[('GET', '/shows/{show_id}')].statements.sum)
+        self.assertGreater(request_metrics.routes[('GET', '/shows/{show_id}')].serialization.sum, 0)
+
+    async def test_records_unmatched_and_invalid_requests(self):
+        self.assertEqual(404, (await get(self.app, '/nothing'))['status'])
+        self.assertEqual(422, (await get(self.app, '/shows/seven'))['status'])
+        self.assertDictEqual({('GET', 'unmatched', 404): 1, ('GET', '/shows/{show_id}', 422): 1},
+                             request_metrics.responses)
@@ -0,0 +1,81 @@
+import unittest
+
+from sqlalchemy.exc import ProgrammingError
+from unittest.mock import patch, MagicMock
+
+import main
+from app import persistence
+from app.persistence import migrations
+from app.persistence.migrations import Migration
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = MagicMock()
+        self.session = MagicMock()
+        session_patch = patch('app.persistence.migrations.Session')
+        self.addCleanup(session_patch.stop)
+        session_patch.start().return_value.__enter__.return_value = self.session
+
+    def test_migrate_applies_pending_migrations_in_order(self):
+        applied = []
+        self.session.execute.return_value.first.side_effect = [(1,), None, None]
+        self.assertListEqual([2, 3], migrations.migrate(self.engine, [
+            Migration(3, 'third', lambda s: applied.append(3)),
+            Migration(1, 'first', lambda s: applied.append(1)),
+            Migration(2, 'second', lambda s: applied.append(2)),
+        ]))
+        self.assertListEqual([2, 3], applied)
+        self.assertEqual(2, self.session.commit.call_count)
+
+    def test_migrate_skips_failed_optional_migration(self):
+        self.session.execute.return_value.first.return_value = None
+        self.assertListEqual([], migrations.migrate(self.engine, [
+            Migration(1, 'optional', MagicMock(side_effect=ProgrammingError('', {}, Exception())), optional=True)
+        ]))
+        self.session.rollback.assert_called_once()
+        self.session.commit.assert_not_called()
+
+    def test_migrate_raises_failed_migration(self):
+        self.session.execute.return_value.first.return_value = None
+        with self.assertRaises(ProgrammingError):
+            migrations.migrate(self.engine, [
+                Migration(1, 'required', MagicMock(side_effect=ProgrammingError('', {}, Exception())))
+            ])
+        self.session.commit.assert_not_called()
+
+    def test_migration_versions_are_unique(self):
+        versions = [m.version for m in migrations.MIGRATIONS]
+        self.assertListEqual(sorted(set(versions)), versions)
+
+    def test_show_indexes_are_created_by_one_migration(self):
+        names = migrations.SECONDARY_INDEXES + migrations.TYPED_INDEXES + migrations.SEARCH_INDEXES
+        self.assertEqual(len(set(names)), len(names))
+        self.assertSetEqual({i.name for i in persistence.Show.__table__.indexes}, set(names))
+
+    def test_drop_text_sort_indexes(self):
+        session = MagicMock()
+        migrations._drop_text_sort_indexes(session)
+        self.assertEqual(
+            'DROP INDEX IF EXISTS ix_shows_release_year_id, ix_shows_date_added_id',
+            str(session.execute.call_args.args[0]))
+        self.assertFalse(
+            set(migrations.DROPPED_INDEXES) & {i.name for i in persistence.Show.__table__.indexes})
+
+
+class TestMigrateFunction(unittest.TestCase):
+    @patch('main.Engine')
+    @patch('main.migrations')
+    def test_migrate_function(self, migrations_, engine):
+        migrations_.migrate.return_value = [7]
+        self.assertEqual('applied migrations [7]', main.migrate(MagicMock()))
+        migrations_.migrate.assert_called_once_with(engine.engine.return_value)
+        engine.shutdown.assert_called_once()
+
+    @patch('main.Engine')
+    @patch('main.migrations')
+    def test_migrate_function_fails_with_migration(self, migrations_, engine):
+        migrations_.migrate.side_effect = ProgrammingError('', {}, Exception())
+        with self.assertRaises(ProgrammingError):
+            main.migrate(MagicMock())
+        engine.shutdown.assert_called_once()
@@ -0,0 +1,22 @@
+import unittest
+
+from sqlalchemy.exc import TimeoutError
+from unittest.mock import MagicMock
+
+from app.pool import TimedQueuePool
+
+
+class TestPool(unittest.TestCase):
+    def test_checkout_stats(self):
+        pool = TimedQueuePool(MagicMock, pool_size=1, max_overflow=0, timeout=0.01)
+        connection = pool.connect()
+        with self.assertRaises(TimeoutError):
+            pool.connect()
+        stats = pool.stats()
+        self.assertEqual(1, stats['size'])
+        self.assertEqual(1, stats['checked_out'])
+        self.assertEqual(2, stats['checkouts'])
+        self.assertEqual(1, stats['timeouts'])
+        self.assertGreaterEqual(stats['max_wait_ms'], 10)
+        connection.close()
+        self.assertEqual(0, pool.stats()['checked_out'])
@@ -0,0 +1,181 @@
+import datetime
+import unittest
+
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from app.persistence import typed
+from app.rest.filters import parse_filters
+from app.rest.replica import Replica, Snapshot
+
+
+def row(show_id: int, title: str, show_type='Movie', director=None, country=None, date_added=None,
+        release_year=None, rating=None, duration=None, cast=None, listed_in=None, version=1, catalog_version=7):
+    values = {'release_year': release_year, 'date_added': date_added, 'duration': duration}
+    typed_values = typed.typed_values(values)
+    return (
+        show_id, version, show_type, title, director, country, date_added, release_year, rating, duration,
+        f'about {title}', typed_values['year'], typed_values['added_on'], typed_values['duration_value'],
+        typed_values['duration_unit'], cast, listed_in, catalog_version
+    )
+
+
+ROWS = [
+    row(1, 'Zombieland', director='Ruben Fleischer', country='United States', date_added='January 1, 2020',
+        release_year='2009', rating='R', duration='88 min', cast=['Woody Harrelson', 'Emma Stone'],
+        listed_in=['Comedies', 'Horror Movies']),
+    row(2, 'The Crown', show_type='TV Show', country='United Kingdom, United States', date_added='November 4, 2016',
+        release_year='2016', rating='TV-MA', duration='4 Seasons', cast=['Claire Foy'], listed_in=['Dramas']),
+    row(3, '50% Off', director='Ruben Fleischer', release_year='2019', rating='R', duration='93 min',
+        listed_in=['Comedies']),
+    row(4, 'The Crown', rating='PG', duration='120 min', cast=['Emma Stone'], listed_in=['Dramas', 'Comedies']),
+]
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self) -> None:
+        self.snapshot = Snapshot(7, ROWS)
+
+    def ids(self, filters, key_columns=None, **kwargs):
+        page, _ = self.snapshot.page(
+            kwargs.get('limit', 50), kwargs.get('offset', 0), kwargs.get('after'), key_columns or ['title', 'id'],
+            parse_filters(filters))
+        return [s.id for s in page]
+
+    def test_record(self):
+        self.assertDictEqual({
+            'type': 'Movie', 'title': 'Zombieland', 'director': 'Ruben Fleischer',
+            'cast': ['Emma Stone', 'Woody Harrelson'], 'country': 'United States', 'date_added': 'January 1, 2020',
+            'release_year': '2009', 'rating': 'R', 'duration': '88 min', 'listed_in': ['Comedies', 'Horror Movies'],
+            'description': 'about Zombieland', 'id': 1, 'uri': '/shows/1'
+        }, self.snapshot.record(self.snapshot.get(1)))
+        self.assertIsNone(self.snapshot.get(5))
+
+    def test_shares_repeated_values(self):
+        zombieland, fifty_percent_off = self.snapshot.get(1), self.snapshot.get(3)
+        self.assertIs(zombieland.director, fifty_percent_off.director)
+        self.assertEqual(zombieland.rating, fifty_percent_off.rating)
+        self.assertIs(zombieland.cast[0], self.snapshot.get(4).cast[0])
+
+    def test_orders_shows_without_values_last(self):
+        self.assertListEqual([3, 2, 4, 1], self.ids([]))
+        self.assertListEqual([1, 3, 2, 4], self.ids([], ['director', 'id']))
+        self.assertListEqual([4, 1, 3, 2], self.ids([], ['rating', 'id']))
+        self.assertListEqual([2, 4], self.ids([], offset=1, limit=2))
+
+    def test_orders_years_dates_and_durations_by_value(self):
+        self.assertListEqual([1, 2, 3, 4], self.ids([], ['release_year', 'id']))
+        self.assertListEqual([2, 1, 3, 4], self.ids([], ['date_added', 'id']))
+        # minutes before seasons, and 120 min after 93 min
+        self.assertListEqual([1, 3, 4, 2], self.ids([], ['duration', 'id']))
+        self.assertListEqual([3, 4], self.ids([], ['date_added', 'id'], after=[datetime.date(2020, 1, 1), 1]))
+        self.assertListEqual([4, 2], self.ids([], ['duration', 'id'], after=['min', 93, 3]))
+        self.assertListEqual(['min', 120, 4], self.snapshot.sort_values(self.snapshot.get(4), ['duration', 'id']))
+
+    def test_text_filters(self):
+        self.assertListEqual([2], self.ids(['type[eq]=TV Show']))
+        self.assertListEqual([2, 4], self.ids(['title=The%']))
+        self.assertListEqual([3], self.ids(['title=50\\% Off']))
+        self.assertListEqual([], self.ids(['title=50\\_ Off']))
+        # shows without a director match ne but not like
+        self.assertListEqual([3, 1], self.ids(['director=%']))
+        self.assertListEqual([2, 4], self.ids(['director[ne]=Ruben Fleischer']))
+        self.assertListEqual([3, 4, 1], self.ids(['rating[in]=R, PG']))
+        self.assertListEqual([2, 1], self.ids(['country[contains]=United States']))
+        self.assertListEqual([2], self.ids(['country[prefix]=United K']))
+
+    def test_dimension_filters(self):
+        self.assertListEqual([4, 1], self.ids(['cast[eq]=Emma Stone']))
+        self.assertListEqual([3, 2], self.ids(['cast[ne]=Emma Stone']))
+        self.assertListEqual([2, 4, 1], self.ids(['cast[in]=Claire Foy,Emma Stone']))
+        self.assertListEqual([3, 4, 1], self.ids(['listed_in=Com%']))
+        self.assertListEqual([3, 1], self.ids(['listed_in[ne]=Dramas']))
+
+    def test_range_filters(self):
+        self.assertListEqual([3, 2], self.ids(['release_year>=2010']))
+        self.assertListEqual([1], self.ids(['date_added<2020-02-01', 'date_added[gt]=2019-12-31']))
+        self.assertListEqual([3, 1], self.ids(['duration<100']))
+        self.assertListEqual([2], self.ids(['duration>=2 seasons']))
+
+    def test_cursor(self):
+        self.assertListEqual([4, 1], self.ids([], after=['The Crown', 2]))
+        # shows without a director sort last, so they follow every cursor on a director and each other by id
+        self.assertListEqual([3, 2, 4], self.ids([], ['director', 'id'], after=['Ruben Fleischer', 1]))
+        self.assertListEqual([4], self.ids([], ['director', 'id'], after=[None, 2]))
+        self.assertListEqual([], self.ids([], ['director', 'id'], after=[None, 4]))
+
+    def test_count(self):
+        page, total = self.snapshot.page(1, 0, None, ['id'], parse_filters(['rating=R']), count=True)
+        self.assertEqual([1], [s.id for s in page])
+        self.assertEqual(2, total)
+        self.assertEqual(4, self.snapshot.page(1, 0, None, ['id'], [], count=True)[1])
+
+    def test_facet_counts(self):
+        self.assertDictEqual({
+            'listed_in': {'Comedies': 1, 'Dramas': 1, 'Horror Movies': 1},
+            'country': {'United States': 2, 'United Kingdom': 1},
+            'type': {'Movie': 1, 'TV Show': 1},
+        }, self.snapshot.facet_counts(parse_filters(['country=United%']), ['listed_in', 'country', 'type']))
+        self.assertDictEqual({'R': 2, 'PG': 1, 'TV-MA': 1}, self.snapshot.facet_counts([], ['rating'])['rating'])
+
+    def test_summary(self):
+        self.assertDictEqual({
+            'total': 4,
+            'total_by_listed_in': {'Comedies': 3, 'Horror Movies': 1, 'Dramas': 2},
+            'total_by_type': {'Movie': 3, 'TV Show': 1},
+        }, self.snapshot.summary)
+
+    def test_typed_values(self):
+        self.assertEqual(datetime.date(2016, 11, 4), self.snapshot.get(2).added_on)
+        self.assertGreater(self.snapshot.size(), 0)
+
+
+class TestReplica(unittest.IsolatedAsyncioTestCase):
+    def mock_session(self, engine: MagicMock) -> MagicMock:
+        session = MagicMock()
+        async_session = MagicMock()
+        async_session.run_sync = AsyncMock(side_effect=lambda fn, *args, **kwargs: fn(session, *args, **kwargs))
+        engine.new_async_session.return_value.__aenter__.return_value = async_session
+        session.execute.return_value.all.return_value = ROWS
+        return session
+
+    @patch('app.rest.replica.Engine')
+    async def test_loads_when_the_catalog_version_changes(self, engine):
+        session = self.mock_session(engine)
+        version = session.query.return_value.filter.return_value.scalar
+        version.return_value = 7
+        replica = Replica(True, 0)
+        snapshot = await replica.snapshot()
+        self.assertEqual(7, snapshot.version)
+        self.assertIs(snapshot, await replica.snapshot())
+        self.assertEqual(1, replica.loads)
+
+        version.return_value = 8
+        session.execute.return_value.all.return_value = [row(1, 'Zombieland', catalog_version=8)]
+        snapshot = await replica.snapshot()
+        self.assertEqual(8, snapshot.version)
+        self.assertEqual(1, len(snapshot.shows))
+        self.assertDictEqual(
+            {'enabled': True, 'check_interval': 0, 'checks': 3, 'loads': 2, 'version': 8, 'shows': 1},
+            {k: v for k, v in replica.stats().items() if k not in ['load_ms', 'size_bytes']})
+
+    @patch('app.rest.replica.Engine')
+    async def test_checks_the_catalog_version_after_invalidation(self, engine):
+        session = self.mock_session(engine)
+        session.query.return_value.filter.return_value.scalar.return_value = 7
+        replica = Replica(True, 60)
+        await replica.snapshot()
+        await replica.snapshot()
+        self.assertEqual(1, replica.checks)
+        replica.invalidate()
+        await replica.snapshot()
+        self.assertEqual(2, replica.checks)
+        self.assertEqual(1, replica.loads)
+
+    @patch('app.rest.replica.Engine')
+    async def test_loads_an_empty_catalog(self, engine):
+        session = self.mock_session(engine)
+        session.query.return_value.filter.return_value.scalar.return_value = 3
+        session.execute.return_value.all.return_value = []
+        snapshot = await Replica(True, 0).snapshot()
+        self.assertEqual(3, snapshot.version)
+        self.assertDictEqual({'total': 0, 'total_by_listed_in': {}, 'total_by_type': {}}, snapshot.summary)
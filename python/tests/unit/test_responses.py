@@ -0,0 +1,24 @@
+import unittest
+
+from fastapi import Response
+
+from app.rest.responses import json_response
+
+
+class TestResponses(unittest.TestCase):
+    def test_json_response(self):
+        response = json_response([{'title': 'Zombieland', 'cast': ['Emma Stone'], 'release_year': 2009}])
+        self.assertEqual(b'[{"title":"Zombieland","cast":["Emma Stone"],"release_year":2009}]', response.body)
+        self.assertEqual('application/json', response.headers['content-type'])
+        self.assertEqual(str(len(response.body)), response.headers['content-length'])
+
+    def test_json_response_copies_headers(self):
+        injected = Response()
+        injected.headers['ETag'] = '"42"'
+        injected.headers['X-Total-Count'] = '7'
+        injected.headers['content-type'] = 'text/plain'
+        response = json_response({'shows': []}, injected)
+        self.assertEqual('"42"', response.headers['etag'])
+        self.assertEqual('7', response.headers['x-total-count'])
+        self.assertEqual(['application/json'], response.headers.getlist('content-type'))
+        self.assertEqual(['12'], response.headers.getlist('content-length'))
@@ -1,18 +1,37 @@
-import os
-import sys
+import base64
+import datetime
+import json
 import unittest
+from collections import namedtuple
 
-from fastapi import HTTPException
-from unittest.mock import patch, MagicMock, call
-
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from fastapi import HTTPException, Response
+from pydantic import ValidationError
+from sqlalchemy import inspect
+from sqlalchemy.dialects import postgresql
+from unittest.mock import patch, AsyncMock, MagicMock, call
 
 from app import persistence
-from app.rest.models.shows import Show, ShowCreate
-from app.rest.routers.shows import list_shows, get, put, create
+from app.persistence import counters
+from app.cache import show_cache
+from app.rest.filters import parse_filters
+from app.rest.models.shows import Show, ShowCreate, ShowPatch
+from app.rest.replica import Snapshot
+from app.rest.routers.shows import patch as patch_show
+from app.rest.routers.shows import (
+    list_shows, search_shows, export, get, put, create, delete, bulk_create, bulk_delete, update_cast, update_listed_in
+)
 
 
 class TestShowsApi(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        show_cache.clear()
+        dimensions_patch = patch('app.rest.routers.shows.dimensions')
+        self.addCleanup(dimensions_patch.stop)
+        # ids for person and genre names are assigned in name order
+        dimensions_patch.start().lookup.side_effect = lambda session, dimension, names: {
+            name: i for i, name in enumerate(sorted(set(names)), 1)
+        }
+
     async def test_list_invalid_sort_field(self):
         with self.assertRaises(HTTPException):
             await list_shows(sort=['not valid', 'also not valid'], filter=[])
@@ -22,9 +41,8 @@ class TestShowsApi(unittest.IsolatedAsyncioTestCase):
         session, query = self.mock_session(engine)
         sort_setting = ['title', 'description']
         await list_shows(sort=sort_setting, filter=[])
-        self.assertListEqual(
-            [call(persistence.Show.title), call(persistence.Show.description)],
-            query.order_by.call_args_list)
+        self.assertIn('ORDER BY shows.title, shows.description, shows.id', str(self.page_statement(session)))
+        self.assertEqual(3, len(query.order_by.call_args.args))
 
     async def test_list_invalid_filters_field(self):
         with self.assertRaises(HTTPException):
@@ -35,10 +53,290 @@ class TestShowsApi(unittest.IsolatedAsyncioTestCase):
         session, query = self.mock_session(engine)
         filters = ['title=unittest', 'type=TV Show']
         await list_shows(sort=['title'], filter=filters)
+        self.assertIn(
+            'WHERE shows.title LIKE %(title_1)s AND shows.type LIKE %(type_1)s', str(self.page_statement(session)))
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_range_filters(self, engine):
+        session, _ = self.mock_session(engine)
+        await list_shows(sort=['title'], filter=['release_year>=2015', 'duration<2 seasons'])
+        self.assertIn(
+            'WHERE shows.year >= %(year_1)s AND shows.duration_unit = %(duration_unit_1)s '
+            'AND shows.duration_value < %(duration_value_1)s', str(self.page_statement(session)))
+
+    @patch('app.rest.routers.shows.facet_counts')
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_with_facets(self, engine, facet_counts):
+        session, query = self.mock_session(engine)
+        query.all.return_value = [self.mock_row(1)]
+        facet_counts.return_value = {'listed_in': {'Dramas': 1}}
+        result = self.body(await list_shows(sort=['title'], filter=['type[eq]=Movie'], facets='listed_in'))
+        self.assertListEqual([1], [s['id'] for s in result['shows']])
+        self.assertDictEqual({'listed_in': {'Dramas': 1}}, result['facets'])
+        facet_counts.assert_called_once_with(session, parse_filters(['type[eq]=Movie']), ['listed_in'])
+
+    async def test_list_invalid_facets(self):
+        with self.assertRaises(HTTPException):
+            await list_shows(sort=['title'], filter=[], facets='title')
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_search_ranks_matches(self, engine):
+        session, query = self.mock_session(engine)
+        query.all.return_value = [(*self.mock_row(i), 1.0 / i) for i in range(1, 3)]
+        response = Response()
+        shows = self.body(await search_shows(q='unit test', response=response, limit=2, filter=['type[eq]=Movie']))
+        self.assertListEqual([1, 2], [s['id'] for s in shows])
+        statement = str(self.page_statement(session))
+        self.assertIn(
+            "WHERE (shows.search @@ websearch_to_tsquery('english'::regconfig, %(websearch_to_tsquery_1)s)) "
+            "AND shows.type = %(type_1)s ORDER BY rank DESC, shows.id", statement)
+
+        # the next page follows the rank and id of the last show
+        session, query = self.mock_session(engine)
+        await search_shows(q='unit test', cursor=response.headers['X-Next-Cursor'], limit=2, filter=[])
+        self.assertIn(
+            'ts_rank(shows.search, websearch_to_tsquery(\'english\'::regconfig, %(websearch_to_tsquery_1)s)) < '
+            '%(param_1)s OR ts_rank', str(self.page_statement(session)))
+        params = self.page_statement(session).params
+        self.assertEqual((0.5, 0.5, 2), (params['param_1'], params['param_2'], params['id_1']))
+
+        # a whole rank is written as an int
+        session, _ = self.mock_session(engine)
+        await search_shows(q='unit test', cursor=self.cursor(['rank', 'id'], [1, 2]), limit=2, filter=[])
+        self.assertEqual(1, self.page_statement(session).params['param_1'])
+
+    async def test_search_invalid_parameters(self):
+        for kwargs in [
+                {'q': ' '}, {'q': 'unit', 'cursor': 'abc', 'offset': 1}, {'q': 'unit', 'cursor': 'abc'},
+                {'q': 'unit', 'cursor': self.cursor(['rank', 'id'], ['0.5', 2])},
+                {'q': 'unit', 'cursor': self.cursor(['rank', 'id'], [None, 2])},
+                {'q': 'unit', 'cursor': self.cursor(['rank', 'id'], [0.5, 2.0])},
+                {'q': 'unit', 'cursor': self.cursor(['rank', 'id'], [0.5, '2'])}]:
+            with self.assertRaises(HTTPException) as e:
+                await search_shows(filter=[], **kwargs)
+            self.assertEqual(400, e.exception.status_code)
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_query_count_independent_of_limit(self, engine):
+        statement_counts = []
+        for limit in [1, 10, 100]:
+            session, query = self.mock_session(engine)
+            query.all.return_value = [
+                self.mock_row(i) for i in range(limit)
+            ]
+            shows = self.body(await list_shows(limit=limit, sort=['title'], filter=[]))
+            self.assertEqual(limit, len(shows))
+            statement_counts.append(session.query.call_count + session.execute.call_count)
+        self.assertListEqual([1, 1, 1], statement_counts)
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_hydrates_cast_and_listings(self, engine):
+        _, query = self.mock_session(engine)
+        query.all.return_value = [
+            (self.mock_db_show(7), ['Zed', 'Amy'], ['Dramas', 'Comedies'])
+        ]
+        shows = self.body(await list_shows(sort=['title'], filter=[]))
+        self.assertEqual(1, len(shows))
+        self.assertDictEqual(
+            Show(**{**self.mock_db_show(7).__dict__, 'cast': ['Amy', 'Zed'], 'listed_in': ['Comedies', 'Dramas'],
+                    'uri': '/shows/7'}).dict(), shows[0])
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_returns_next_cursor_for_full_page(self, engine):
+        _, query = self.mock_session(engine)
+        query.all.return_value = [self.mock_row(i) for i in range(2)]
+        response = Response()
+        await list_shows(response=response, limit=2, sort=['title'], filter=[])
+        self.assertIn('X-Next-Cursor', response.headers)
+
+        response = Response()
+        await list_shows(response=response, limit=3, sort=['title'], filter=[])
+        self.assertNotIn('X-Next-Cursor', response.headers)
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_seeks_past_cursor(self, engine):
+        _, query = self.mock_session(engine)
+        query.all.return_value = [self.mock_row(1), self.mock_row(2)]
+        response = Response()
+        await list_shows(response=response, limit=2, sort=['title'], filter=[])
+
+        session, query = self.mock_session(engine)
+        query.all.return_value = [self.mock_row(3)]
+        shows = self.body(
+            await list_shows(cursor=response.headers['X-Next-Cursor'], limit=2, sort=['title'], filter=[]))
+        self.assertListEqual([3], [s['id'] for s in shows])
+        page = self.page_statement(session)
+        self.assertNotIn('OFFSET', str(page))
+        self.assertIn(
+            'WHERE (shows.title, shows.id) > (%(param_1)s, %(param_2)s) OR shows.title IS NULL ORDER BY', str(page))
+        self.assertListEqual(['Show 2', 2, 2], [page.params[k] for k in ['param_1', 'param_2', 'param_3']])
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_seeks_past_cursor_with_null_sort_value(self, engine):
+        _, query = self.mock_session(engine)
+        show = self.mock_db_show(2)
+        show.director = None
+        query.all.return_value = [self.mock_row(1), (show, [], [])]
+        response = Response()
+        await list_shows(response=response, limit=2, sort=['director'], filter=[])
+
+        # shows without a director sort last, so the next page holds the rest of them
+        session, query = self.mock_session(engine)
+        query.all.return_value = [self.mock_row(3)]
+        await list_shows(cursor=response.headers['X-Next-Cursor'], limit=2, sort=['director'], filter=[])
+        page = self.page_statement(session)
+        self.assertIn('WHERE shows.director IS NULL AND shows.id > %(id_1)s ORDER BY', str(page))
+        self.assertEqual(2, page.params['id_1'])
+
+        session, query = self.mock_session(engine)
+        await list_shows(cursor=self.cursor(['director', 'id'], ['Ruben Fleischer', 1]), sort=['director'], filter=[])
+        self.assertIn(
+            'WHERE (shows.director, shows.id) > (%(param_1)s, %(param_2)s) OR shows.director IS NULL ORDER BY',
+            str(self.page_statement(session)))
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_seeks_past_cursor_on_nullable_columns(self, engine):
+        session, _ = self.mock_session(engine)
+        cursor = self.cursor(['director', 'country', 'id'], ['Ruben Fleischer', None, 4])
+        await list_shows(cursor=cursor, sort=['director', 'country'], filter=[])
+        self.assertIn(
+            'WHERE shows.director > %(director_1)s OR shows.director = %(director_2)s AND shows.country IS NULL AND '
+            'shows.id > %(id_1)s OR shows.director IS NULL ORDER BY', str(self.page_statement(session)))
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_sorts_dates_by_value(self, engine):
+        _, query = self.mock_session(engine)
+        show = self.mock_db_show(2)
+        show.added_on = datetime.date(2021, 4, 1)
+        query.all.return_value = [self.mock_row(1), (show, [], [])]
+        response = Response()
+        await list_shows(response=response, limit=2, sort=['date_added'], filter=[])
+
+        session, query = self.mock_session(engine)
+        await list_shows(cursor=response.headers['X-Next-Cursor'], limit=2, sort=['date_added'], filter=[])
+        page = self.page_statement(session)
+        self.assertIn(
+            'WHERE (shows.added_on, shows.id) > (%(param_1)s, %(param_2)s) OR shows.added_on IS NULL '
+            'ORDER BY shows.added_on, shows.id', str(page))
+        self.assertListEqual([datetime.date(2021, 4, 1), 2], [page.params['param_1'], page.params['param_2']])
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_sorts_durations_by_unit_and_value(self, engine):
+        session, _ = self.mock_session(engine)
+        await list_shows(sort=['duration'], filter=[])
+        self.assertIn(
+            'ORDER BY shows.duration_unit, shows.duration_value, shows.id', str(self.page_statement(session)))
+
+    async def test_list_invalid_cursor(self):
+        with self.assertRaises(HTTPException):
+            await list_shows(cursor='not a cursor', sort=['title'], filter=[])
+
+    async def test_list_cursor_with_values_of_the_wrong_type(self):
+        for sort, values in [
+                (['title'], [1, 2]), (['title'], ['Show 1', '2']), (['title'], ['Show 1', None]),
+                (['title'], ['Show 1', True]), (['release_year'], ['2020', 1]), (['date_added'], [20200101, 1]),
+                (['date_added'], ['January 1, 2020', 1]), (['duration'], ['min', '90', 1])]:
+            with self.assertRaises(HTTPException) as e:
+                await list_shows(cursor=self.cursor(sort + ['id'], values), sort=sort, filter=[])
+            self.assertEqual(400, e.exception.status_code)
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_cursor_with_null_values(self, engine):
+        session, _ = self.mock_session(engine)
+        await list_shows(cursor=self.cursor(['duration', 'id'], [None, None, 3]), sort=['duration'], filter=[])
+        self.assertIn(
+            'WHERE shows.duration_unit IS NULL AND shows.duration_value IS NULL AND shows.id > %(id_1)s',
+            str(self.page_statement(session)))
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_cursor_for_different_sort(self, engine):
+        _, query = self.mock_session(engine)
+        query.all.return_value = [self.mock_row(1)]
+        response = Response()
+        await list_shows(response=response, limit=1, sort=['title'], filter=[])
+        with self.assertRaises(HTTPException):
+            await list_shows(cursor=response.headers['X-Next-Cursor'], sort=['release_year'], filter=[])
+
+    async def test_list_cursor_with_offset(self):
+        with self.assertRaises(HTTPException):
+            await list_shows(cursor='e30=', offset=10, sort=['title'], filter=[])
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_exact_count(self, engine):
+        session, query = self.mock_session(engine)
+        query.all.return_value = [(*self.mock_row(1), 12)]
+        response = Response()
+        result = await list_shows(response=response, sort=['title'], filter=['type[eq]=Movie'], count='exact')
+        self.assertListEqual([1], [s['id'] for s in self.body(result)])
+        self.assertEqual('12', result.headers['X-Total-Count'])
+        # counted in the statement selecting the page
+        self.assertIn(
+            '(SELECT count(*) AS count_1 \nFROM shows \nWHERE shows.type = %(type_1)s) AS total',
+            str(self.page_statement(session)))
+        session.execute.assert_not_called()
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_exact_count_past_the_end(self, engine):
+        session, query = self.mock_session(engine)
+        query.all.return_value = []
+        session.execute.return_value.scalar.return_value = 12
+        response = Response()
+        await list_shows(response=response, offset=20, sort=['title'], filter=[], count='exact')
+        self.assertEqual('12', response.headers['X-Total-Count'])
+
+    @patch('app.rest.routers.shows.estimated_rows')
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_estimated_count(self, engine, estimated_rows):
+        _, query = self.mock_session(engine)
+        query.all.return_value = [(*self.mock_row(1), 12)]
+        estimated_rows.return_value = 5000
+        response = Response()
+        await list_shows(response=response, sort=['title'], filter=[], count='estimate')
+        self.assertEqual('5000', response.headers['X-Total-Count-Estimate'])
+        self.assertNotIn('X-Total-Count', response.headers)
+
+        # small estimates are replaced by exact counts
+        estimated_rows.return_value = 10
+        response = Response()
+        await list_shows(response=response, sort=['title'], filter=[], count='estimate')
+        self.assertEqual('12', response.headers['X-Total-Count'])
+        self.assertNotIn('X-Total-Count-Estimate', response.headers)
+
+    async def test_list_invalid_count(self):
+        with self.assertRaises(HTTPException) as e:
+            await list_shows(sort=['title'], filter=[], count='all')
+        self.assertEqual(400, e.exception.status_code)
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_export_streams_batches(self, engine):
+        row = namedtuple('Row', [
+            'id', 'type', 'title', 'director', 'country', 'date_added', 'release_year', 'rating', 'duration',
+            'description', 'cast', 'listed_in'])
+
+        async def partitions(size):
+            yield [row(1, 'Movie', 'Show 1', '', '', '', '2021', '', '', '', ['Zed', 'Amy'], None)]
+            yield [row(2, 'Movie', 'Show 2', '', '', '', '2021', '', '', '', [], ['Dramas'])]
+
+        async_session = engine.new_async_session.return_value.__aenter__.return_value
+        async_session.stream = AsyncMock()
+        async_session.stream.return_value.partitions = partitions
+        response = await export(format='ndjson', filter=['type[eq]=Movie'])
+        self.assertEqual('application/x-ndjson', response.media_type)
+        chunks = [chunk async for chunk in response.body_iterator]
+        self.assertEqual(2, len(chunks))
+        self.assertTrue(chunks[0].endswith(b'\n'))
         self.assertEqual(
-            [str(persistence.Show.title.like('unittest')), str(persistence.Show.type.like('TV Show'))],
-            [str(al.args[0]) for al in query.filter.call_args_list]
-        )
+            {'type': 'Movie', 'title': 'Show 1', 'director': '', 'cast': ['Amy', 'Zed'], 'country': '',
+             'date_added': '', 'release_year': '2021', 'rating': '', 'duration': '', 'listed_in': [],
+             'description': '', 'id': 1, 'uri': '/shows/1'}, json.loads(chunks[0]))
+        statement = str(async_session.stream.call_args.args[0].compile(dialect=postgresql.dialect()))
+        self.assertIn('WHERE shows.type = %(type_1)s ORDER BY shows.id', statement)
+
+    async def test_export_invalid_parameters(self):
+        for kwargs in [{'format': 'xml', 'filter': []}, {'format': 'csv', 'filter': ['not valid']}]:
+            with self.assertRaises(HTTPException) as e:
+                await export(**kwargs)
+            self.assertEqual(400, e.exception.status_code)
 
     @patch('app.rest.routers.shows.Engine')
     async def test_get_not_found(self, engine):
@@ -54,6 +352,75 @@ class TestShowsApi(unittest.IsolatedAsyncioTestCase):
         with self.assertRaises(HTTPException):
             await get(1)
 
+    @patch('app.rest.routers.shows.Engine')
+    async def test_get_cached(self, engine):
+        session, query = self.mock_session(engine)
+        query.all.return_value = [self.mock_row(1)]
+        show = await get(1)
+        self.assertEqual(show, await get(1))
+        self.assertEqual(1, session.query.call_count)
+
+    @patch('app.rest.routers.shows.counters')
+    @patch('app.rest.routers.shows.Engine')
+    async def test_put_invalidates_cache(self, engine, counters):
+        session, query = self.mock_session(engine)
+        misses = show_cache.misses
+        query.all.return_value = [self.mock_row(1)]
+        await get(1)
+        query.all.side_effect = [[self.mock_db_show(1)], [self.mock_row(1)]]
+        query.one.return_value = (self.mock_db_show(1), [], [])
+        await put(1, Show(title='Unit the Test', type='Movie'))
+        await get(1)
+        self.assertEqual(misses + 2, show_cache.misses)
+
+    @patch('app.rest.routers.shows.counters')
+    @patch('app.rest.routers.shows.Engine')
+    async def test_delete_invalidates_cache(self, engine, counters):
+        session, query = self.mock_session(engine)
+        query.all.return_value = [self.mock_row(1)]
+        await get(1)
+        query.all.side_effect = [[self.mock_db_show(1)], []]
+        await delete(1)
+        self.assertIsNone(show_cache.get(1))
+
+    @patch('app.rest.routers.shows.show_replica')
+    @patch('app.rest.routers.shows.counters')
+    @patch('app.rest.routers.shows.Engine')
+    async def test_delete_invalidates_replica(self, engine, counters, replica):
+        _, query = self.mock_session(engine)
+        query.all.side_effect = [[self.mock_db_show(1)], []]
+        await delete(1)
+        replica.invalidate.assert_called_once_with()
+
+    @patch('app.rest.routers.shows.show_replica')
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_from_replica(self, engine, replica):
+        replica.snapshot = AsyncMock(return_value=self.mock_snapshot(3))
+        response = Response()
+        result = self.body(await list_shows(
+            response=response, limit=2, sort=['title'], filter=['type[eq]=Movie'], facets='listed_in', count='exact'))
+        self.assertListEqual([1, 2], [s['id'] for s in result['shows']])
+        self.assertDictEqual({'listed_in': {'Dramas': 3}}, result['facets'])
+        self.assertEqual('"catalog-7"', response.headers['ETag'])
+        self.assertEqual('3', response.headers['X-Total-Count'])
+        cursor = response.headers['X-Next-Cursor']
+        result = self.body(await list_shows(limit=2, cursor=cursor, sort=['title'], filter=['type[eq]=Movie']))
+        self.assertListEqual([3], [s['id'] for s in result])
+        engine.new_async_session.assert_not_called()
+
+    @patch('app.rest.routers.shows.show_replica')
+    @patch('app.rest.routers.shows.Engine')
+    async def test_get_from_replica(self, engine, replica):
+        replica.snapshot = AsyncMock(return_value=self.mock_snapshot(2))
+        response = Response()
+        self.assertEqual('Show 2', self.body(await get(2, response=response))['title'])
+        self.assertEqual('"show-2-1"', response.headers['ETag'])
+        response = await get(2, request=self.mock_headers({'if-none-match': '"show-2-1"'}))
+        self.assertEqual(304, response.status_code)
+        with self.assertRaises(HTTPException):
+            await get(3)
+        engine.new_async_session.assert_not_called()
+
     @patch('app.rest.routers.shows.Engine')
     async def test_put_not_found(self, engine):
         _, query = self.mock_session(engine)
@@ -72,27 +439,354 @@ class TestShowsApi(unittest.IsolatedAsyncioTestCase):
 
     @patch('app.rest.routers.shows.Engine')
     async def test_create(self, engine):
-        title = 'Unit the Test'
-        type = 'TV Show'
-        _, query = self.mock_session(engine)
-        filter = MagicMock()
-        db_show = MagicMock()
-        db_show.id = 1
-        db_show.title = title
-        db_show.type = type
-        filter.one.return_value = db_show
-        query.filter.return_value = filter
-        show = ShowCreate.construct(title=title, type=type)
-        created_show = await create(show)
+        session, query = self.mock_session(engine)
+        session.execute.return_value.scalars.return_value.all.return_value = [1]
+        query.all.return_value = [self.mock_row(1)]
+        show = ShowCreate(title='Unit the Test', type='TV Show', cast=['A'], listed_in=['Dramas'])
+        response = Response()
+        created_show = await create(show, response=response)
         self.assertIsNotNone(created_show.date_added)
-        self.assertIsNotNone(created_show.id)
+        self.assertEqual(1, created_show.id)
+        self.assertEqual('"show-1-1"', response.headers['ETag'])
+        # the show, its cast, its search document, its listings, the counters and the catalog version are each one
+        # statement
+        self.assertEqual(6, session.execute.call_count)
+        session.commit.assert_called_once()
+
+    def test_update_cast_is_set_based(self):
+        session = MagicMock()
+        cast = [f'New {i}' for i in range(40)]
+        new_id = sorted(cast).index('New 39') + 1
+        session.execute.return_value.scalars.return_value.all.side_effect = [['Old'], [new_id]]
+        added, removed = update_cast(session, 1, cast + ['New 0'])
+        self.assertListEqual(['New 39'], added)
+        self.assertListEqual(['Old'], removed)
+        self.assertEqual(2, session.execute.call_count)
+        delete_statement = session.execute.call_args_list[0].args[0].compile(dialect=postgresql.dialect())
+        self.assertIn(
+            'DELETE FROM actor USING person WHERE actor.id = %(id_1)s AND (actor.person_id NOT IN',
+            str(delete_statement))
+        self.assertIn('RETURNING person.name', str(delete_statement))
+        insert_statement = session.execute.call_args_list[1].args[0].compile(dialect=postgresql.dialect())
+        self.assertIn('ON CONFLICT DO NOTHING RETURNING actor.person_id', str(insert_statement))
+        self.assertListEqual(
+            [(1, i) for i in range(1, 41)],
+            [(insert_statement.params[f'id_m{i}'], insert_statement.params[f'person_id_m{i}']) for i in range(40)])
+
+    def test_update_listed_in_removes_everything(self):
+        session = MagicMock()
+        session.execute.return_value.scalars.return_value.all.return_value = ['Dramas', 'Comedies']
+        added, removed = update_listed_in(session, 1, [])
+        self.assertListEqual([], added)
+        self.assertListEqual(['Dramas', 'Comedies'], removed)
+        session.execute.assert_called_once()
+
+    @patch('app.rest.routers.shows.counters')
+    @patch('app.rest.routers.shows.Engine')
+    async def test_delete_adjusts_counters(self, engine, counters):
+        session, query = self.mock_session(engine)
+        query.all.side_effect = [[self.mock_db_show(1)], [('Dramas',), ('Comedies',)]]
+        await delete(1)
+        counters.deltas.assert_called_once_with('Movie', ['Dramas', 'Comedies'], -1)
+        counters.adjust.assert_called_once_with(session, counters.deltas.return_value)
+        session.commit.assert_called_once()
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_bulk_create(self, engine):
+        session, _ = self.mock_session(engine)
+        session.execute.return_value.scalars.return_value.all.side_effect = lambda: [1, 2]
+        body = '\n'.join([
+            '{"type": "Movie", "title": "One", "cast": ["A", "B"], "listed_in": ["Dramas"]}',
+            '{"type": "Movie"}',
+            '{"type": "TV Show", "title": "Two"}',
+            '{"type": "Movie", "title": "Three", "listed_in": ["Dramas"]}',
+        ])
+        result = await bulk_create(self.mock_request(body, 'application/x-ndjson'), batch_size=2)
+        self.assertEqual(3, result['created'])
+        self.assertListEqual([2], [e['line'] for e in result['errors']])
+        self.assertEqual(2, session.commit.call_count)
+        # batch one inserts shows, actors, search documents, listings, counters and the catalog version, batch two has
+        # no actors
+        self.assertEqual(11, session.execute.call_count)
+
+    @patch('app.persistence.MAX_BIND_PARAMETERS', 32)
+    @patch('app.rest.routers.shows.Engine')
+    async def test_bulk_create_splits_statements_by_parameter_count(self, engine):
+        session, _ = self.mock_session(engine)
+        session.execute.return_value.scalars.return_value.all.side_effect = [[1, 2], [3]]
+        session.execute.return_value.all.return_value = []
+        body = '\n'.join(f'{{"type": "Movie", "title": "{title}"}}' for title in ['One', 'Two', 'Three'])
+        result = await bulk_create(self.mock_request(body, 'application/x-ndjson'), batch_size=3)
+        self.assertEqual(3, result['created'])
+        # shows have 16 columns, so at most two shows are inserted per statement
+        inserts = [
+            c.args[0].compile(dialect=postgresql.dialect()) for c in session.execute.call_args_list
+            if str(c.args[0]).startswith('INSERT INTO shows')
+        ]
+        self.assertListEqual([28, 14], [len(i.params) for i in inserts])
+
+    async def test_bulk_create_invalid_batch_size(self):
+        for batch_size in [0, 5001]:
+            with self.assertRaises(HTTPException) as e:
+                await bulk_create(self.mock_request('', 'application/x-ndjson'), batch_size=batch_size)
+            self.assertEqual(400, e.exception.status_code)
+
+    async def test_bulk_create_unsupported_content_type(self):
+        with self.assertRaises(HTTPException) as e:
+            await bulk_create(self.mock_request('', 'application/xml'))
+        self.assertEqual(415, e.exception.status_code)
+
+    @patch('app.rest.routers.shows.counters.adjust')
+    @patch('app.rest.routers.shows.Engine')
+    async def test_bulk_delete(self, engine, adjust):
+        session, _ = self.mock_session(engine)
+        session.execute.return_value.all.return_value = [
+            ('type', 'Movie', 2), ('type', '', 1), ('listed_in', 'Dramas', 2)
+        ]
+        result = await bulk_delete(filter=['title=Unit%'])
+        self.assertDictEqual({'deleted': 3}, result)
+        statement = str(session.execute.call_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+        self.assertIn('WITH doomed AS \n(SELECT shows.id AS id \nFROM shows \nWHERE shows.title LIKE', statement)
+        self.assertIn('FOR UPDATE)', statement)
+        self.assertIn('DELETE FROM shows USING doomed WHERE shows.id = doomed.id RETURNING shows.type', statement)
+        self.assertIn('FROM listed_in JOIN doomed ON listed_in.id = doomed.id', statement)
+        self.assertNotIn(' IN ', statement)
+        self.assertDictEqual({
+            ('total', ''): -3, ('type', 'Movie'): -2, ('type', ''): -1, ('listed_in', 'Dramas'): -2
+        }, adjust.call_args.args[1])
+        session.commit.assert_called_once()
+
+    @patch('app.rest.routers.shows.counters.adjust')
+    @patch('app.rest.routers.shows.Engine')
+    async def test_bulk_delete_shows_without_a_type_and_with_an_empty_type(self, engine, adjust):
+        session, _ = self.mock_session(engine)
+        # the rows a show with a null type and one with an empty type would return if they were grouped apart
+        session.execute.return_value.all.return_value = [('type', '', 1), ('type', '', 1)]
+        self.assertDictEqual({'deleted': 2}, await bulk_delete(filter=[]))
+        statement = str(session.execute.call_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+        self.assertIn("GROUP BY coalesce(deleted.type, '') UNION ALL", statement)
+
+        stored = {('total', ''): 3, ('type', ''): 2, ('type', 'Movie'): 1}
+        deltas = adjust.call_args.args[1]
+        self.assertDictEqual({('total', ''): -2, ('type', ''): -2}, deltas)
+        check_session = MagicMock()
+        check_session.query.return_value.join.return_value = check_session.query.return_value
+        check_session.query.return_value.filter.return_value.all.return_value = [
+            (kind, key, total) for (kind, key), total in counters.merge(stored, deltas).items()
+        ]
+        check_session.query.return_value.group_by.return_value.all.side_effect = [[('Movie', 1)], []]
+        self.assertDictEqual({}, counters.check(check_session))
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_bulk_delete_nothing_matches(self, engine):
+        session, _ = self.mock_session(engine)
+        session.execute.return_value.all.return_value = []
+        self.assertDictEqual({'deleted': 0}, await bulk_delete(filter=[]))
+        session.execute.assert_called_once()
+        session.commit.assert_not_called()
+
+    async def test_bulk_delete_invalid_filters_field(self):
+        with self.assertRaises(HTTPException):
+            await bulk_delete(filter=['not valid=x'])
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_get_returns_etag(self, engine):
+        _, query = self.mock_session(engine)
+        query.all.return_value = [self.mock_row(1)]
+        response = Response()
+        await get(1, response=response)
+        self.assertEqual('"show-1-1"', response.headers['ETag'])
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_get_not_modified_without_hydrating(self, engine):
+        session, query = self.mock_session(engine)
+        query.scalar.return_value = 3
+        response = await get(1, request=self.mock_headers({'if-none-match': '"show-1-3"'}))
+        self.assertEqual(304, response.status_code)
+        self.assertEqual('"show-1-3"', response.headers['ETag'])
+        self.assertEqual(1, session.query.call_count)
+        self.assertEqual(call(persistence.Show.version), session.query.call_args)
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_get_modified_since_cached(self, engine):
+        session, query = self.mock_session(engine)
+        query.all.return_value = [self.mock_row(1)]
+        await get(1)
+        updated = self.mock_db_show(1)
+        updated.version = 2
+        query.all.return_value = [(updated, [], [])]
+        query.scalar.return_value = 2
+        response = Response()
+        await get(1, request=self.mock_headers({'if-none-match': '"show-1-1"'}), response=response)
+        self.assertEqual('"show-1-2"', response.headers['ETag'])
+        self.assertEqual(3, session.query.call_count)
+
+    @patch('app.rest.routers.shows.counters')
+    @patch('app.rest.routers.shows.Engine')
+    async def test_put_if_match_mismatch(self, engine, counters):
+        session, query = self.mock_session(engine)
+        query.all.return_value = [self.mock_db_show(1)]
+        with self.assertRaises(HTTPException) as e:
+            await put(
+                1, Show(title='Unit the Test', type='Movie'), request=self.mock_headers({'if-match': '"show-1-0"'}))
+        self.assertEqual(412, e.exception.status_code)
+        query.with_for_update.assert_called_once()
+        session.commit.assert_not_called()
+
+    @patch('app.rest.routers.shows.counters')
+    @patch('app.rest.routers.shows.Engine')
+    async def test_put_bumps_versions(self, engine, counters):
+        session, query = self.mock_session(engine)
+        query.all.return_value = [self.mock_db_show(1)]
+        query.one.return_value = (self.mock_db_show(1), [], [])
+        response = Response()
+        await put(
+            1, Show(title='Unit the Test', type='Movie'), request=self.mock_headers({'if-match': '"show-1-1"'}),
+            response=response)
+        self.assertEqual('"show-1-2"', response.headers['ETag'])
+        counters.bump_catalog_version.assert_called_once_with(session)
+        session.commit.assert_called_once()
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_patch_only_changed_columns(self, engine):
+        session, query = self.mock_session(engine)
+        session.execute.return_value.first.return_value = (2, 'Movie', 'Movie')
+        updated = self.mock_db_show(1)
+        updated.version = 2
+        query.all.return_value = [(updated, [], [])]
+        response = Response()
+        await patch_show(1, ShowPatch(title='Unit the Test'), response=response)
+        update_statement = str(session.execute.call_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+        self.assertIn('UPDATE shows SET title=%(title)s, version=(shows.version + %(version_1)s)', update_statement)
+        self.assertIn('FOR UPDATE', update_statement)
+        # the update, the search document and the catalog version, without cast, listing or counter statements
+        self.assertEqual(3, session.execute.call_count)
+        search_statement = str(session.execute.call_args_list[1].args[0].compile(dialect=postgresql.dialect()))
+        self.assertIn('UPDATE shows SET search=', search_statement)
+        session.commit.assert_called_once()
+        self.assertEqual(1, session.query.call_count)
+        self.assertEqual('"show-1-2"', response.headers['ETag'])
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_patch_unsearched_columns_keeps_search_document(self, engine):
+        session, query = self.mock_session(engine)
+        session.execute.return_value.first.return_value = (2, 'Movie', 'Movie')
+        query.all.return_value = [(self.mock_db_show(1), [], [])]
+        await patch_show(1, ShowPatch(rating='PG'))
+        # the update and the catalog version
+        self.assertEqual(2, session.execute.call_count)
+
+    @patch('app.rest.routers.shows.counters')
+    @patch('app.rest.routers.shows.Engine')
+    async def test_patch_listings_adjusts_counters(self, engine, counters):
+        session, query = self.mock_session(engine)
+        session.execute.return_value.first.return_value = (2, 'TV Show', 'Movie')
+        session.execute.return_value.scalars.return_value.all.side_effect = [['Comedies'], [1]]
+        query.all.return_value = [self.mock_row(1)]
+        await patch_show(1, ShowPatch(type='TV Show', listed_in=['Dramas']))
+        self.assertListEqual(
+            [call('Movie', ['Comedies'], -1), call('TV Show', ['Dramas'])], counters.deltas.call_args_list)
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_patch_not_found(self, engine):
+        session, _ = self.mock_session(engine)
+        session.execute.return_value.first.return_value = None
+        with self.assertRaises(HTTPException) as e:
+            await patch_show(1, ShowPatch(title='Unit the Test'))
+        self.assertEqual(404, e.exception.status_code)
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_patch_if_match_mismatch(self, engine):
+        session, _ = self.mock_session(engine)
+        session.execute.return_value.first.return_value = (3, 'Movie', 'Movie')
+        with self.assertRaises(HTTPException) as e:
+            await patch_show(1, ShowPatch(title='Unit the Test'), request=self.mock_headers({'if-match': '"show-1-1"'}))
+        self.assertEqual(412, e.exception.status_code)
+        session.rollback.assert_called_once()
+        session.commit.assert_not_called()
+
+    def test_patch_rejects_null_title(self):
+        with self.assertRaises(ValidationError):
+            ShowPatch(title=None)
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_delete_if_match_not_found(self, engine):
+        session, query = self.mock_session(engine)
+        query.all.return_value = []
+        with self.assertRaises(HTTPException) as e:
+            await delete(1, request=self.mock_headers({'if-match': '*'}))
+        self.assertEqual(412, e.exception.status_code)
+
+    @patch('app.rest.routers.shows.Engine')
+    async def test_list_not_modified(self, engine):
+        session, query = self.mock_session(engine)
+        query.scalar.return_value = 9
+        response = await list_shows(
+            request=self.mock_headers({'if-none-match': '"catalog-9"'}), response=Response(), sort=['title'],
+            filter=[])
+        self.assertEqual(304, response.status_code)
+        query.offset.assert_not_called()
+
+    @classmethod
+    def page_statement(cls, session: MagicMock):
+        """
+        compile the statement selecting the page of shows that the last list query hydrated
+        """
+        return inspect(session.query.call_args.args[0]).selectable.element.compile(dialect=postgresql.dialect())
+
+    @classmethod
+    def cursor(cls, key_columns: list, values: list) -> str:
+        return base64.urlsafe_b64encode(json.dumps({'sort': key_columns, 'values': values}).encode()).decode()
+
+    @classmethod
+    def body(cls, response: Response):
+        return json.loads(response.body)
+
+    @classmethod
+    def mock_headers(cls, headers: dict) -> MagicMock:
+        request = MagicMock()
+        request.headers = headers
+        return request
+
+    @classmethod
+    def mock_request(cls, body: str, content_type: str) -> MagicMock:
+        async def stream():
+            yield body.encode('utf-8')
+        request = MagicMock()
+        request.headers = {'content-type': content_type}
+        request.stream = stream
+        return request
+
+    @classmethod
+    def mock_db_show(cls, show_id: int) -> persistence.Show:
+        return persistence.Show(
+            id=show_id, type='Movie', title=f'Show {show_id}', director='', country='', date_added='',
+            release_year='2021', rating='', duration='', description='', version=1)
+
+    @classmethod
+    def mock_row(cls, show_id: int) -> tuple:
+        return cls.mock_db_show(show_id), [f'Actor {show_id}'], ['Dramas']
+
+    @classmethod
+    def mock_snapshot(cls, shows: int) -> Snapshot:
+        return Snapshot(7, [
+            (i, 1, 'Movie', f'Show {i}', '', '', '', '2021', '', '', '', 2021, None, None, None, [f'Actor {i}'],
+             ['Dramas'], 7)
+            for i in range(1, shows + 1)
+        ])
 
     @classmethod
     def mock_session(cls, engine: MagicMock) -> (MagicMock, MagicMock):
         session = MagicMock()
         query = MagicMock()
-        engine.new_session.return_value.__enter__.return_value = session
+        async_session = MagicMock()
+        async_session.run_sync = AsyncMock(side_effect=lambda fn, *args, **kwargs: fn(session, *args, **kwargs))
+        engine.new_async_session.return_value.__aenter__.return_value = async_session
         session.query.return_value = query
         query.filter.return_value = query
+        query.filter_by.return_value = query
         query.order_by.return_value = query
+        query.with_for_update.return_value = query
+        query.join.return_value = query
+        query.add_columns.return_value = query
         return session, query
@@ -0,0 +1,46 @@
+import unittest
+
+from fastapi import Response
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from app.rest.replica import Snapshot
+from app.rest.routers.summary import shows_summary
+
+
+class TestSummaryApi(unittest.IsolatedAsyncioTestCase):
+    @patch('app.rest.routers.summary.Engine')
+    async def test_summary(self, engine):
+        session = MagicMock()
+        async_session = MagicMock()
+        async_session.run_sync = AsyncMock(side_effect=lambda fn, *args, **kwargs: fn(session, *args, **kwargs))
+        engine.new_async_session.return_value.__aenter__.return_value = async_session
+        session.query.return_value.filter.return_value.all.return_value = [
+            ('total', '', 5), ('type', 'Movie', 3), ('type', 'TV Show', 2),
+            ('listed_in', 'Dramas', 4), ('listed_in', 'Comedies', 1)
+        ]
+
+        summary = await shows_summary()
+
+        self.assertDictEqual({
+            'total': 5,
+            'total_by_listed_in': {'Dramas': 4, 'Comedies': 1},
+            'total_by_type': {'Movie': 3, 'TV Show': 2}
+        }, summary)
+        self.assertEqual(1, session.query.call_count)
+
+    @patch('app.rest.routers.summary.show_replica')
+    @patch('app.rest.routers.summary.Engine')
+    async def test_summary_from_replica(self, engine, replica):
+        replica.snapshot = AsyncMock(return_value=Snapshot(3, [
+            (1, 1, 'Movie', 'Zombieland', None, None, None, None, None, None, None, None, None, None, None, [],
+             ['Comedies', 'Horror Movies'], 3)
+        ]))
+        response = Response()
+        summary = await shows_summary(response=response)
+        self.assertDictEqual({
+            'total': 1,
+            'total_by_listed_in': {'Comedies': 1, 'Horror Movies': 1},
+            'total_by_type': {'Movie': 1}
+        }, summary)
+        self.assertEqual('"catalog-3"', response.headers['ETag'])
+        engine.new_async_session.assert_not_called()
@@ -0,0 +1,37 @@
+import datetime
+import unittest
+
+from app.persistence import typed
+
+
+class TestTyped(unittest.TestCase):
+    def test_year(self):
+        self.assertEqual(2020, typed.year(' 2020 '))
+        self.assertIsNone(typed.year('twenty'))
+        self.assertIsNone(typed.year(None))
+
+    def test_date_added(self):
+        self.assertEqual(datetime.date(2020, 8, 14), typed.date_added('August 14, 2020'))
+        self.assertEqual(datetime.date(2020, 8, 14), typed.date_added(' Aug 14,  2020'))
+        self.assertEqual(datetime.date(2020, 8, 14), typed.date_added('2020-08-14'))
+        self.assertIsNone(typed.date_added(''))
+        self.assertIsNone(typed.date_added('someday'))
+
+    def test_duration(self):
+        self.assertEqual((93, typed.MINUTES), typed.duration('93 min'))
+        self.assertEqual((90, typed.MINUTES), typed.duration('90'))
+        self.assertEqual((4, typed.SEASONS), typed.duration('4 Seasons'))
+        self.assertEqual((1, typed.SEASONS), typed.duration('1 Season'))
+        self.assertEqual((None, None), typed.duration('4 fortnights'))
+        self.assertEqual((None, None), typed.duration(None))
+
+    def test_typed_values_only_includes_columns_present(self):
+        self.assertDictEqual({'year': 2019}, typed.typed_values({'title': 'unittest', 'release_year': '2019'}))
+        self.assertDictEqual(
+            {'added_on': None, 'duration_value': 2, 'duration_unit': typed.SEASONS},
+            typed.typed_values({'date_added': '', 'duration': '2 Seasons'}))
+
+    def test_sort_columns(self):
+        self.assertListEqual(
+            ['title', 'year', 'added_on', 'duration_unit', 'duration_value', 'id'],
+            typed.sort_columns(['title', 'release_year', 'date_added', 'duration', 'id']))
@@ -2,6 +2,19 @@
 
 locals {
   python_dir = join("/", [path.root, "..", "..", "python"])
+
+  env_variables = {
+    PROJECT_ID                           = var.project
+    SQL_SERVER_CA_CERT_SECRET_VERSION_ID = module.secrets["database_server_ca_cert"].secret_version_id
+    SQL_CLIENT_CERT_SECRET_VERSION_ID    = module.secrets["database_client_cert"].secret_version_id
+    SQL_PRIVATE_KEY_SECRET_VERSION_ID    = module.secrets["database_private_key"].secret_version_id
+    SQL_PASS_SECRET_VERSION_ID           = module.secrets["database_password"].secret_version_id
+    SQL_DB                               = google_sql_database.shows.name
+    SQL_HOST                             = google_sql_database_instance.shows.private_ip_address
+    SQL_USER                             = google_sql_user.shows.name
+    SQL_SSL_MODE                         = "require"
+    SQL_PASS                             = google_sql_user.shows.password
+  }
 }
 
 data "archive_file" "app" {
@@ -30,12 +43,33 @@ resource "google_storage_bucket_object" "app" {
 //  project     = var.project
 //}
 
+// applies the database migrations from inside the VPC connector, the database only has a private IP
+resource "google_cloudfunctions_function" "migrate" {
+  name    = join("-", [local.name_prefix, "migrate"])
+  project = var.project
+  region  = var.region
+
+  runtime               = "python39"
+  entry_point           = "migrate"
+  source_archive_bucket = google_storage_bucket.app.name
+  source_archive_object = google_storage_bucket_object.app.name
+  trigger_http          = true
+  timeout               = 540
+  service_account_email = data.google_app_engine_default_service_account.default.email
+
+  environment_variables = local.env_variables
+
+  vpc_connector                 = google_vpc_access_connector.shows.id
+  vpc_connector_egress_settings = "PRIVATE_RANGES_ONLY"
+}
+
 resource "google_app_engine_standard_app_version" "app" {
   depends_on = [google_sql_database.shows]
 
-  runtime    = "python39"
-  service    = "default"
-  version_id = "v1"
+  runtime = "python39"
+  service = "default"
+  // each archive is a new version, so the previous version serves traffic until the migrations have been applied
+  version_id = join("-", ["v", substr(data.archive_file.app.output_md5, 0, 12)])
 
   basic_scaling {
     idle_timeout = "300s"
@@ -52,24 +86,26 @@ resource "google_app_engine_standard_app_version" "app" {
     shell = "uvicorn main:app --app-dir app --host 0.0.0.0 --port $${PORT}"
   }
 
-  env_variables = {
-    PROJECT_ID                           = var.project
-    SQL_SERVER_CA_CERT_SECRET_VERSION_ID = module.secrets["database_server_ca_cert"].secret_version_id
-    SQL_CLIENT_CERT_SECRET_VERSION_ID    = module.secrets["database_client_cert"].secret_version_id
-    SQL_PRIVATE_KEY_SECRET_VERSION_ID    = module.secrets["database_private_key"].secret_version_id
-    SQL_PASS_SECRET_VERSION_ID           = module.secrets["database_password"].secret_version_id
-    SQL_DB                               = google_sql_database.shows.name
-    SQL_HOST                             = google_sql_database_instance.shows.private_ip_address
-    SQL_USER                             = google_sql_user.shows.name
-    SQL_SSL_MODE                         = "require"
-    SQL_PASS                             = google_sql_user.shows.password
-  }
+  env_variables = local.env_variables
 
   vpc_access_connector {
     name = google_vpc_access_connector.shows.self_link
   }
 
   noop_on_destroy = false
+
+  // the previous version is deleted once traffic has moved to this one
+  lifecycle {
+    create_before_destroy = true
+  }
+
+  // the traffic split below waits for this, and a failed migration fails the apply before traffic moves
+  provisioner "local-exec" {
+    command = join(" ", [
+      "gcloud functions call", google_cloudfunctions_function.migrate.name,
+      "--project", var.project, "--region", var.region,
+    ])
+  }
 }
 
 resource "google_app_engine_service_split_traffic" "app" {